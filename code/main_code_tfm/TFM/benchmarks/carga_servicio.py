@@ -0,0 +1,286 @@
+"""
+Prueba de carga del servicio de simulación con un cliente HTTP local.
+
+Uso (desde este directorio):
+    python carga_servicio.py                         # servicio con modelos sintéticos
+    python carga_servicio.py --url http://127.0.0.1:8765
+    python carga_servicio.py -c 128 -n 50            # 128 clientes, 50 peticiones cada uno
+
+Sin --url se entrena un registro sintético (panel_sintetico.py), se arranca el servicio en otro
+proceso y se detiene al terminar. Devuelve código 1 si no se cumplen los objetivos de
+rendimiento declarados en servicio_simulacion.py.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import statistics
+import subprocess
+from urllib.parse import urlsplit
+
+FUNCIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions")
+sys.path.insert(0, FUNCIONES)
+
+import servicio_simulacion as ss  # noqa: E402
+
+
+class Cliente:
+    """
+    Cliente HTTP/1.1 mínimo sobre una conexión persistente.
+    """
+
+    def __init__(self, host, puerto):
+        self.host = host
+        self.puerto = puerto
+        self.lector = None
+        self.escritor = None
+
+    async def conectar(self):
+        self.lector, self.escritor = await asyncio.open_connection(self.host, self.puerto)
+
+    async def cerrar(self):
+        self.escritor.close()
+        await self.escritor.wait_closed()
+
+    async def peticion(self, metodo, ruta, datos=None):
+        """
+        Devuelve (código, cuerpo, segundos hasta el primer trozo de la respuesta).
+        """
+        cuerpo = json.dumps(datos).encode() if datos is not None else b""
+        inicio = time.perf_counter()
+        self.escritor.write(
+            (
+                f"{metodo} {ruta} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(cuerpo)}\r\n\r\n"
+            ).encode()
+            + cuerpo
+        )
+        await self.escritor.drain()
+
+        codigo = int((await self.lector.readline()).split()[1])
+        cabeceras = {}
+        while True:
+            linea = await self.lector.readline()
+            if linea in (b"\r\n", b""):
+                break
+            nombre, _, valor = linea.decode("latin-1").partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip()
+
+        if cabeceras.get("transfer-encoding") == "chunked":
+            trozos = []
+            primero = None
+            while True:
+                longitud = int((await self.lector.readline()).strip(), 16)
+                trozo = await self.lector.readexactly(longitud + 2)
+                if primero is None:
+                    primero = time.perf_counter() - inicio
+                if longitud == 0:
+                    break
+                trozos.append(trozo[:-2])
+            return codigo, b"".join(trozos), primero
+        respuesta = await self.lector.readexactly(int(cabeceras["content-length"]))
+        return codigo, respuesta, time.perf_counter() - inicio
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def carga_prediccion(host, puerto, estados, clientes, peticiones):
+    # Cada cliente envía sus peticiones de una en una por su conexión; entre todos los
+    # clientes hay `clientes` peticiones concurrentes
+    latencias = []
+
+    async def cliente(semilla):
+        rng = random.Random(semilla)
+        c = Cliente(host, puerto)
+        await c.conectar()
+        try:
+            for _ in range(peticiones):
+                ccaa, periodo = rng.choice(estados)
+                inicio = time.perf_counter()
+                codigo, cuerpo, _ = await c.peticion(
+                    "POST",
+                    "/prediccion",
+                    {"ccaa": ccaa, "periodo": periodo, "inc": rng.uniform(-0.05, 0.15)},
+                )
+                if codigo != 200:
+                    raise RuntimeError(cuerpo.decode())
+                latencias.append(time.perf_counter() - inicio)
+        finally:
+            await c.cerrar()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(i) for i in range(clientes)))
+    return latencias, time.perf_counter() - inicio
+
+
+async def carga_barrido(host, puerto, estados, clientes, n_puntos):
+    primeros = []
+    totales = []
+
+    async def cliente(semilla):
+        ccaa, periodo = random.Random(semilla).choice(estados)
+        c = Cliente(host, puerto)
+        await c.conectar()
+        try:
+            inicio = time.perf_counter()
+            codigo, cuerpo, primero = await c.peticion(
+                "POST",
+                "/barrido",
+                {"ccaa": ccaa, "periodo": periodo, "n_puntos": n_puntos},
+            )
+            if codigo != 200 or len(cuerpo.splitlines()) != n_puntos:
+                raise RuntimeError(cuerpo.decode())
+            primeros.append(primero)
+            totales.append(time.perf_counter() - inicio)
+        finally:
+            await c.cerrar()
+
+    await asyncio.gather(*(cliente(i) for i in range(clientes)))
+    return primeros, totales
+
+
+async def ejecutar_carga(host, puerto, estados, clientes, peticiones, n_puntos):
+    c = Cliente(host, puerto)
+    await c.conectar()
+    _, salud, _ = await c.peticion("GET", "/salud")
+    await c.cerrar()
+    print(f"Servicio en {host}:{puerto}: {json.loads(salud)}")
+
+    latencias, duracion = await carga_prediccion(
+        host, puerto, estados, clientes, peticiones
+    )
+    primeros, totales = await carga_barrido(host, puerto, estados, clientes, n_puntos)
+
+    c = Cliente(host, puerto)
+    await c.conectar()
+    _, estadisticas, _ = await c.peticion("GET", "/estadisticas")
+    await c.cerrar()
+
+    medidas = {
+        "prediccion_p50_ms": percentil(latencias, 50) * 1000,
+        "prediccion_p95_ms": percentil(latencias, 95) * 1000,
+        "prediccion_p99_ms": percentil(latencias, 99) * 1000,
+        "prediccion_peticiones_s": len(latencias) / duracion,
+        "barrido_primer_bloque_ms": statistics.median(primeros) * 1000,
+        "barrido_total_ms": statistics.median(totales) * 1000,
+        "peticiones_por_lote": json.loads(estadisticas)["peticiones_por_lote"],
+    }
+    objetivos = [
+        ("prediccion_p95_ms", medidas["prediccion_p95_ms"] <= ss.OBJETIVO_P95_MS),
+        (
+            "prediccion_peticiones_s",
+            medidas["prediccion_peticiones_s"] >= ss.OBJETIVO_PETICIONES_S,
+        ),
+        (
+            "barrido_primer_bloque_ms",
+            medidas["barrido_primer_bloque_ms"] <= ss.OBJETIVO_PRIMER_BLOQUE_MS,
+        ),
+        ("barrido_total_ms", medidas["barrido_total_ms"] <= ss.OBJETIVO_BARRIDO_MS),
+    ]
+    for nombre, valor in medidas.items():
+        print(f"{nombre:28s} {valor:10.2f}")
+    fallos = [nombre for nombre, cumple in objetivos if not cumple]
+    for nombre in fallos:
+        print(f"Objetivo no cumplido: {nombre}")
+    return medidas, fallos
+
+
+def servicio_sintetico(directorio, n_estimadores=100):
+    """
+    Entrena un registro sintético, guarda el panel y arranca el servicio en otro proceso.
+    Devuelve el proceso, el puerto y la lista de estados (ccaa, periodo) del panel.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+    from panel_sintetico import generar_panel, OBJETIVOS
+    import registro_modelos as rm
+
+    panel = generar_panel().dropna()
+    predictores = [c for c in panel.columns if c not in ["ccaa", "periodo"] + OBJETIVOS]
+    best_models = {
+        o: RandomForestRegressor(n_estimators=n_estimadores, random_state=42).fit(
+            panel[predictores], panel[o]
+        )
+        for o in OBJETIVOS
+    }
+    registro = os.path.join(directorio, "registro")
+    rm.guardar_registro(registro, best_models, {o: predictores for o in OBJETIVOS})
+    ruta_panel = os.path.join(directorio, "panel.csv")
+    panel[["ccaa", "periodo"] + predictores].to_csv(ruta_panel, index=False)
+    estados = [(c, int(p)) for c, p in panel[["ccaa", "periodo"]].values]
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        puerto = s.getsockname()[1]
+    proceso = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(FUNCIONES, "servicio_simulacion.py"),
+            "--registro",
+            registro,
+            "--panel",
+            ruta_panel,
+            "--puerto",
+            str(puerto),
+        ],
+        cwd=FUNCIONES,
+    )
+    # Esperar a que el servicio acepte conexiones
+    for _ in range(300):
+        try:
+            socket.create_connection(("127.0.0.1", puerto), timeout=1).close()
+            break
+        except OSError:
+            if proceso.poll() is not None:
+                raise RuntimeError("El servicio ha terminado al arrancar")
+            time.sleep(0.1)
+    return proceso, puerto, estados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="servicio ya en marcha")
+    parser.add_argument("--panel", help="CSV con los estados a consultar (con --url)")
+    parser.add_argument("-c", "--clientes", type=int, default=64)
+    parser.add_argument("-n", "--peticiones", type=int, default=20)
+    parser.add_argument("--puntos", type=int, default=150, help="puntos por barrido")
+    args = parser.parse_args()
+
+    proceso = None
+    if args.url:
+        if not args.panel:
+            parser.error("con --url hay que indicar --panel")
+        import pandas as pd
+
+        panel = pd.read_csv(args.panel, usecols=["ccaa", "periodo"])
+        estados = [(c, int(p)) for c, p in panel.values]
+        url = urlsplit(args.url)
+        host, puerto = url.hostname, url.port
+    else:
+        proceso, puerto, estados = servicio_sintetico(tempfile.mkdtemp())
+        host = "127.0.0.1"
+
+    try:
+        _, fallos = asyncio.run(
+            ejecutar_carga(
+                host, puerto, estados, args.clientes, args.peticiones, args.puntos
+            )
+        )
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait()
+    if fallos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Ejecuta la batería de benchmarks y guarda los resultados por commit.
+
+Uso (desde este directorio):
+    python ejecutar.py                       # todas las escalas
+    python ejecutar.py --rapido              # solo la escala más pequeña
+    python ejecutar.py -b simulacion_smi     # un benchmark concreto
+    python ejecutar.py --comparar abc1234    # compara con los resultados de otro commit
+    python ejecutar.py --importaciones       # comprueba las dependencias de cada módulo
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+from suite import (
+    BENCHMARKS,
+    escalas_rapidas,
+    parametros_texto,
+    comprobar_importaciones,
+)
+
+RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+
+
+def commit_actual():
+    # Commit actual del repositorio; se marca con -dirty si hay cambios sin confirmar
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+
+    try:
+        commit = git("rev-parse", "--short", "HEAD")
+        if git("status", "--porcelain", "--untracked-files=no"):
+            commit += "-dirty"
+        return commit
+    except (OSError, subprocess.CalledProcessError):
+        return "sin-git"
+
+
+def medir(ejecutar, repeticiones):
+    """
+    Mide una función: tiempo mínimo y mediana de `repeticiones` ejecuciones (tras una de
+    calentamiento) y pico de memoria de Python en una ejecución adicional.
+    """
+    ejecutar()
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        propio = ejecutar()
+        transcurrido = time.perf_counter() - inicio
+        tiempos.append(propio if isinstance(propio, float) else transcurrido)
+
+    tracemalloc.start()
+    try:
+        ejecutar()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "tiempo_min": min(tiempos),
+        "tiempo_mediana": statistics.median(tiempos),
+        "repeticiones": repeticiones,
+        "memoria_pico_mb": pico / 2**20,
+    }
+
+
+def ejecutar_suite(benchmarks, repeticiones):
+    resultados = []
+    for nombre, (preparar, escalas) in benchmarks.items():
+        for parametros in escalas:
+            medida = medir(preparar(**parametros), repeticiones)
+            medida.update({"benchmark": nombre, "parametros": parametros})
+            resultados.append(medida)
+            print(
+                f"{nombre:28s} {parametros_texto(parametros):45s} "
+                f"{medida['tiempo_mediana'] * 1000:10.1f} ms "
+                f"{medida['memoria_pico_mb']:8.1f} MB"
+            )
+    return resultados
+
+
+def guardar(resultados, commit):
+    os.makedirs(RESULTADOS, exist_ok=True)
+    fichero = os.path.join(RESULTADOS, f"{commit}.json")
+    with open(fichero, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "maquina": platform.platform(),
+                "resultados": resultados,
+            },
+            f,
+            indent=2,
+            ensure_ascii=False,
+        )
+    return fichero
+
+
+def comparar(resultados, referencia, umbral):
+    """
+    Compara la mediana de cada benchmark con la de otro commit. Devuelve el número de
+    regresiones (más de `umbral` veces más lento).
+    """
+    with open(os.path.join(RESULTADOS, f"{referencia}.json"), encoding="utf-8") as f:
+        previos = {
+            (r["benchmark"], parametros_texto(r["parametros"])): r
+            for r in json.load(f)["resultados"]
+        }
+    regresiones = 0
+    print(f"\nComparación con {referencia} (cociente de medianas):")
+    for r in resultados:
+        clave = (r["benchmark"], parametros_texto(r["parametros"]))
+        if clave not in previos:
+            continue
+        cociente = r["tiempo_mediana"] / previos[clave]["tiempo_mediana"]
+        estado = ""
+        if cociente > umbral:
+            estado = "REGRESIÓN"
+            regresiones += 1
+        elif cociente < 1 / umbral:
+            estado = "mejora"
+        print(f"{clave[0]:28s} {clave[1]:45s} {cociente:6.2f}x {estado}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-b", "--benchmark", action="append", help="benchmark a ejecutar"
+    )
+    parser.add_argument("--rapido", action="store_true", help="solo la escala menor")
+    parser.add_argument("-r", "--repeticiones", type=int, default=3)
+    parser.add_argument("--comparar", help="commit con el que comparar")
+    parser.add_argument("--umbral", type=float, default=1.2)
+    parser.add_argument(
+        "--importaciones",
+        action="store_true",
+        help="solo comprueba que los módulos no cargan dependencias pesadas",
+    )
+    args = parser.parse_args()
+
+    if args.importaciones:
+        fallos = comprobar_importaciones()
+        for modulo, cargadas in fallos:
+            print(f"{modulo}: carga {', '.join(cargadas)} al importarse")
+        if fallos:
+            sys.exit(1)
+        print("Importaciones correctas")
+        return
+
+    benchmarks = escalas_rapidas() if args.rapido else dict(BENCHMARKS)
+    if args.benchmark:
+        benchmarks = {k: v for k, v in benchmarks.items() if k in args.benchmark}
+
+    commit = commit_actual()
+    resultados = ejecutar_suite(benchmarks, args.repeticiones)
+    print(f"\nResultados guardados en {guardar(resultados, commit)}")
+    if args.comparar and comparar(resultados, args.comparar, args.umbral):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import os
+import itertools
+import pandas as pd
+import numpy as np
+
+# Generador de datos sintéticos con la misma estructura que las tablas de entrada de
+# data_format.combinar_tablas y que el panel de modelización (ccaa × periodo), para medir el
+# rendimiento a distintas escalas sin depender de los ficheros originales.
+
+CCAA = [
+    "Andalucía",
+    "Aragón",
+    "Asturias, Principado de",
+    "Balears, Illes",
+    "Canarias",
+    "Cantabria",
+    "Castilla - La Mancha",
+    "Castilla y León",
+    "Cataluña",
+    "Comunitat Valenciana",
+    "Extremadura",
+    "Galicia",
+    "Madrid, Comunidad de",
+    "Murcia, Región de",
+    "Navarra, Comunidad Foral de",
+    "País Vasco",
+    "Rioja, La",
+]
+
+RIESGO_POBREZA = (
+    "Tasa de riesgo de pobreza (con alquiler imputado) "
+    "(renta del año anterior a la entrevista)"
+)
+CARENCIA = (
+    "No puede permitirse una comida de carne, pollo o pescado al menos cada dos días"
+)
+
+# Variables de estado del panel de modelización y las que se usan como objetivo (_delta1)
+VARIABLES_ESTADO = [
+    "PARO",
+    "PARO_25",
+    "PARO_1_AÑO",
+    "PIB_CAPITA",
+    "PROD_HORA",
+    "IPC",
+    "CARENCIA",
+    "RIESGO_POBREZA",
+    "DESIGUALDAD",
+    "EMP_1_5",
+    "SMI_VIDA",
+    "SMI_MEDIO",
+]
+OBJETIVOS = ["PARO_delta1", "PARO_25_delta1", "PIB_CAPITA_delta1", "IPC_delta1"]
+
+
+def nombres_regiones(n_regiones):
+    """
+    Nombres de las regiones: las comunidades autónomas del trabajo y, si se piden más,
+    regiones numeradas.
+    """
+    if n_regiones <= len(CCAA):
+        return CCAA[:n_regiones]
+    return CCAA + [f"Región {i}" for i in range(len(CCAA), n_regiones)]
+
+
+def _tabla(regiones, años, categorias, valor, rng, prop_faltantes, nacional=None):
+    # Producto cartesiano región × periodo × categorías con un valor positivo aleatorio. Las
+    # faltas imitan las de las fuentes reales: series que empiezan más tarde en algunas
+    # regiones y celdas sueltas sin dato.
+    if nacional is not None:
+        regiones = list(regiones) + [nacional]
+    nombres = ["ccaa", "periodo"] + list(categorias)
+    filas = list(itertools.product(regiones, años, *categorias.values()))
+    df = pd.DataFrame(filas, columns=nombres)
+    df[valor] = rng.lognormal(mean=3, sigma=0.5, size=len(df))
+
+    inicio = {r: años[0] for r in regiones}
+    for r in rng.choice(regiones, int(len(regiones) * prop_faltantes), replace=False):
+        inicio[r] = años[0] + int(rng.integers(1, max(2, len(años) // 4)))
+    df = df[df["periodo"] >= df["ccaa"].map(inicio)]
+    df.loc[rng.random(len(df)) < prop_faltantes / 2, valor] = np.nan
+    return df.reset_index(drop=True)
+
+
+def generar_tablas(
+    n_regiones=17,
+    n_años=13,
+    prop_faltantes=0.05,
+    semilla=0,
+    año_inicio=2008,
+):
+    """
+    Genera las 15 tablas de entrada de data_format.combinar_tablas (como diccionario con los
+    nombres de sus argumentos) y la tabla de ocupados por sector que la función lee de disco.
+
+    Returns
+    -------
+    dict
+        Diccionario {argumento: DataFrame}.
+    pandas.DataFrame
+        Tabla ocupados_sector.
+    """
+    rng = np.random.default_rng(semilla)
+    regiones = nombres_regiones(n_regiones)
+    años = list(range(año_inicio, año_inicio + n_años))
+    nac = "Total Nacional"
+
+    def tabla(categorias, valor, nacional=nac):
+        return _tabla(regiones, años, categorias, valor, rng, prop_faltantes, nacional)
+
+    smi_14 = 600 * np.cumprod(1 + rng.uniform(0, 0.08, n_años))
+    smi = pd.DataFrame({"periodo": años, "smi_14": smi_14})
+    ipc = tabla(
+        {
+            "tipo_dato": ["Índice"],
+            "grupo_indice": ["Índice general"],
+            "mes": list(range(1, 13)),
+        },
+        "Total",
+        nacional="Nacional",
+    ).rename(columns={"periodo": "año"})
+    # combinar_tablas toma el IPC de 2015 como base, que debe existir
+    ipc["Total"] = ipc["Total"].fillna(100.0)
+
+    tablas = {
+        "gasto_basico": tabla({"grupo": ["Alimentos", "Vivienda"]}, "Total"),
+        "smi": smi,
+        "pobreza": tabla({"riesgo_pobreza": [RIESGO_POBREZA]}, "total"),
+        "desigualdad": tabla(
+            {"desigualdad": ["Distribución de la renta S80/S20"]}, "total"
+        ),
+        "salarios_ocupacion": tabla(
+            {"sexo": ["Ambos sexos"], "ocupacion": ["Todas las ocupaciones"]},
+            "salario_año",
+        ),
+        "salarios_smis": tabla(
+            {"smi": ["Total", "0-0.5", "0.5-1", "1-1.5", "1.5-2"]},
+            "asalariados",
+            nacional="Total",
+        ),
+        "empresas": tabla(
+            {
+                "estrato_asalariados": [
+                    "Total",
+                    "De 1 a 2",
+                    "De 3 a 5",
+                    "De 6 a 9",
+                    "De 10 a 19",
+                    "De 20 a 49",
+                ],
+                "actividad_principal": ["Total CNAE"],
+            },
+            "total_empresas",
+        ),
+        "ipc": ipc,
+        "pib_per_capita": tabla({"tipo_dato": ["Valor"]}, "valor"),
+        "productividad_hora": tabla({}, "total"),
+        "carencia": tabla({"carencia_material": [CARENCIA]}, "total"),
+        "empleo_hora": tabla({}, "empleo_hora"),
+        "paro": tabla(
+            {"sexo": ["Ambos sexos"], "edad": ["Total", "Menores de 25 años"]},
+            "tasa_paro_total",
+        ),
+        "paro_duracion": tabla(
+            {
+                "sexo": ["Ambos sexos"],
+                "tiempo_busqueda": [
+                    "Menos de 1 año",
+                    "De 1 año a menos de 2 años",
+                    "2 años o más",
+                ],
+            },
+            "porcentaje_tipo_paro",
+        ),
+        "ocupados_jornada": tabla(
+            {
+                "sexo": ["Ambos sexos"],
+                "unidad": ["Porcentaje"],
+                "tipo_jornada": ["Jornada a tiempo parcial"],
+            },
+            "Total",
+        ),
+    }
+    ocupados_sector = tabla(
+        {
+            "sexo": ["Ambos sexos"],
+            "edad": ["Total"],
+            "sector_economico": ["Total", "Construcción", "Servicios"],
+        },
+        "Total",
+    )
+    return tablas, ocupados_sector
+
+
+def preparar_directorio(ocupados_sector, raiz):
+    """
+    combinar_tablas lee ../../processed_data/trabajo/ocupados_sector.csv relativo al
+    directorio de trabajo. Escribe la tabla en raiz/processed_data/trabajo y devuelve el
+    directorio (raiz/a/b) desde el que hay que llamar a la función.
+    """
+    trabajo = os.path.join(raiz, "processed_data", "trabajo")
+    os.makedirs(trabajo, exist_ok=True)
+    ocupados_sector.to_csv(os.path.join(trabajo, "ocupados_sector.csv"), index=False)
+    directorio = os.path.join(raiz, "a", "b")
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def generar_panel(
+    n_regiones=17,
+    n_años=13,
+    n_indicadores=0,
+    prop_faltantes=0.05,
+    semilla=0,
+    año_inicio=2008,
+):
+    """
+    Genera un panel de modelización (una fila por región y periodo) con las variables de
+    estado del trabajo, `n_indicadores` indicadores adicionales, INC_SMI_REAL y las variables
+    objetivo _delta1 calculadas como en data_format.atrasar_año.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Panel con las columnas ccaa, periodo, variables de estado, indicadores X_i,
+        INC_SMI_REAL y objetivos (la última fila de cada región no tiene objetivo).
+    """
+    rng = np.random.default_rng(semilla)
+    regiones = nombres_regiones(n_regiones)
+    años = np.arange(año_inicio, año_inicio + n_años)
+    columnas = VARIABLES_ESTADO + [f"X_{i}" for i in range(n_indicadores)]
+
+    inc = rng.normal(0.02, 0.04, size=(n_regiones, n_años))
+    nivel = rng.lognormal(mean=2, sigma=0.5, size=(n_regiones, 1, len(columnas)))
+    efecto = rng.normal(0, 0.2, size=len(columnas))
+    variacion = rng.normal(0, 0.03, size=(n_regiones, n_años, len(columnas)))
+    variacion += inc[:, :, None] * efecto
+    valores = nivel * np.cumprod(1 + variacion, axis=1)
+
+    panel = pd.DataFrame(
+        valores.reshape(n_regiones * n_años, len(columnas)), columns=columnas
+    )
+    panel.insert(0, "periodo", np.tile(años, n_regiones))
+    panel.insert(0, "ccaa", np.repeat(regiones, n_años))
+    panel["INC_SMI_REAL"] = inc.ravel()
+    for objetivo in OBJETIVOS:
+        var = objetivo[: -len("_delta1")]
+        siguiente = panel.groupby("ccaa")[var].shift(-1)
+        panel[objetivo] = siguiente / panel[var] - 1
+
+    # Celdas sin dato en las variables predictoras
+    faltan = rng.random((len(panel), len(columnas))) < prop_faltantes
+    panel[columnas] = panel[columnas].mask(faltan)
+    return panel
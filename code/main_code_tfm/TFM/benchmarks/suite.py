@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import tempfile
+import contextlib
+import subprocess
+
+FUNCIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions")
+sys.path.insert(0, FUNCIONES)
+
+from panel_sintetico import (  # noqa: E402
+    generar_tablas,
+    generar_panel,
+    preparar_directorio,
+    VARIABLES_ESTADO,
+    OBJETIVOS,
+)
+
+# Registro de benchmarks. Cada benchmark es una función que recibe los parámetros de una
+# escala, prepara los datos (fuera de la medición) y devuelve la función que se mide. Si esa
+# función devuelve un número, se toma como el tiempo medido (por ejemplo, cuando la medición
+# se hace en otro proceso).
+BENCHMARKS = {}
+
+ESCALAS_PANEL = [
+    {"n_regiones": 17, "n_años": 13},
+    {"n_regiones": 50, "n_años": 30},
+    {"n_regiones": 200, "n_años": 50},
+]
+ESCALAS_MODELO = [
+    {"n_regiones": 17, "n_años": 13, "n_indicadores": 0},
+    {"n_regiones": 17, "n_años": 13, "n_indicadores": 50},
+    {"n_regiones": 100, "n_años": 30, "n_indicadores": 50},
+]
+
+
+def benchmark(nombre, escalas):
+    def decorador(preparar):
+        BENCHMARKS[nombre] = (preparar, escalas)
+        return preparar
+
+    return decorador
+
+
+@contextlib.contextmanager
+def _directorio_trabajo(directorio):
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        yield
+    finally:
+        os.chdir(anterior)
+
+
+def _datos_modelo(n_regiones, n_años, n_indicadores):
+    panel = generar_panel(n_regiones, n_años, n_indicadores).dropna()
+    predictores = [c for c in panel.columns if c not in ["ccaa", "periodo"] + OBJETIVOS]
+    variables_importantes = {o: predictores for o in OBJETIVOS}
+    return panel, predictores, variables_importantes
+
+
+@benchmark("combinar_tablas", ESCALAS_PANEL)
+def combinar_tablas(n_regiones, n_años):
+    import data_format as dformat
+
+    tablas, ocupados_sector = generar_tablas(n_regiones, n_años)
+    directorio = preparar_directorio(ocupados_sector, tempfile.mkdtemp())
+
+    def ejecutar():
+        with _directorio_trabajo(directorio):
+            dformat.combinar_tablas(**tablas)
+
+    return ejecutar
+
+
+@benchmark("format_total_merge", ESCALAS_PANEL)
+def format_total_merge(n_regiones, n_años):
+    import data_format as dformat
+
+    tablas, ocupados_sector = generar_tablas(n_regiones, n_años)
+    directorio = preparar_directorio(ocupados_sector, tempfile.mkdtemp())
+    with _directorio_trabajo(directorio):
+        total_merge = dformat.combinar_tablas(**tablas)
+    variables = ["ccaa", "periodo", "INC_SMI_REAL", "SMI_VIDA", "SMI_MEDIO", "PARO"]
+
+    def ejecutar():
+        dformat.format_total_merge(total_merge.copy(), variables)
+
+    return ejecutar
+
+
+@benchmark("atrasar_año", ESCALAS_PANEL)
+def atrasar_año(n_regiones, n_años):
+    import data_format as dformat
+
+    panel = generar_panel(n_regiones, n_años)
+
+    def ejecutar():
+        df = panel
+        for var in VARIABLES_ESTADO:
+            df = dformat.atrasar_año(df, var, "periodo", "ccaa")
+
+    return ejecutar
+
+
+@benchmark("evaluacion_modelo_simple", ESCALAS_MODELO)
+def evaluacion_modelo_simple(n_regiones, n_años, n_indicadores):
+    import evaluacion_modelo as em
+    from sklearn.ensemble import RandomForestRegressor
+
+    panel, predictores, variables_importantes = _datos_modelo(
+        n_regiones, n_años, n_indicadores
+    )
+    model = RandomForestRegressor(n_estimators=50, random_state=42, n_jobs=-1)
+
+    def ejecutar():
+        em.evaluacion_modelo_simple(
+            panel[predictores], panel[OBJETIVOS], variables_importantes, model
+        )
+
+    return ejecutar
+
+
+@benchmark("simulacion_smi", ESCALAS_MODELO)
+def simulacion_smi(n_regiones, n_años, n_indicadores):
+    import simulacion as sim
+    from sklearn.ensemble import RandomForestRegressor
+
+    panel, predictores, variables_importantes = _datos_modelo(
+        n_regiones, n_años, n_indicadores
+    )
+    best_models = {
+        o: RandomForestRegressor(n_estimators=100, random_state=42).fit(
+            panel[predictores], panel[o]
+        )
+        for o in OBJETIVOS
+    }
+    df = panel[predictores].iloc[[0]]
+
+    def fun(inc, data, best_models, variables_importantes):
+        pred = sim.model_prediction(inc, data, best_models, variables_importantes)
+        return 0.5 * pred["PIB_CAPITA_delta1"] - 0.5 * pred["PARO_delta1"]
+
+    def ejecutar():
+        sim.simulacion_smi(
+            -0.05, 0.15, df, fun, best_models, variables_importantes, pasos=2
+        )
+
+    return ejecutar
+
+
+@benchmark("consulta_estados", ESCALAS_PANEL)
+def consulta_estados(n_regiones, n_años):
+    # Estado de cada comunidad y año leído del almacén del panel, como en la simulación
+    from panel import AlmacenPanel
+
+    panel = AlmacenPanel.desde_dataframe(generar_panel(n_regiones, n_años)).instantanea()
+    claves = [(r, p) for r in panel.regiones for p in panel.periodos if panel.existe(r, p)]
+
+    def ejecutar():
+        for ccaa, periodo in claves:
+            panel.estado(ccaa, periodo)
+
+    return ejecutar
+
+
+@benchmark("render_figuras", [{"n_figuras": 12}, {"n_figuras": 48}])
+def render_figuras(n_figuras):
+    # Dibujo en paralelo con la caché de imágenes vacía (cada ejecución usa una nueva)
+    import render_figuras as rf
+
+    panel = generar_panel(n_regiones=17, n_años=13)
+    directorio = tempfile.mkdtemp()
+    especificaciones = [
+        rf.especificacion(
+            "create_multi_category_plot",
+            os.path.join(directorio, f"figura_{i}.png"),
+            data=panel,
+            x_col="periodo",
+            y_col=VARIABLES_ESTADO[i % len(VARIABLES_ESTADO)],
+            category_col="ccaa",
+            title=f"Figura {i}",
+        )
+        for i in range(n_figuras)
+    ]
+
+    def ejecutar():
+        rf.renderizar_figuras(especificaciones, ruta_cache=tempfile.mkdtemp())
+
+    return ejecutar
+
+
+MODULOS = [
+    "data_format",
+    "evaluacion_modelo",
+    "seleccion_modelo",
+    "simulacion",
+    "registro_modelos",
+    "plots",
+    "utils",
+]
+# utils.py está en main_code_tfm, no en functions
+MAIN = os.path.join(FUNCIONES, "..", "..")
+
+# Dependencias pesadas que no debe cargar la importación de cada módulo. Un proceso que solo
+# simula o carga el registro no necesita sklearn, scipy, matplotlib ni statsmodels.
+PESADAS = ["sklearn", "scipy", "matplotlib", "seaborn", "statsmodels"]
+PROHIBIDAS = {
+    "data_format": PESADAS,
+    "simulacion": PESADAS,
+    "registro_modelos": PESADAS,
+    "seleccion_modelo": ["matplotlib", "seaborn", "statsmodels"],
+    "evaluacion_modelo": ["matplotlib", "seaborn", "statsmodels"],
+    "plots": PESADAS,
+    "utils": PESADAS,
+}
+
+
+def importar(modulo):
+    """
+    Importa el módulo en un proceso nuevo (sin módulos ya cargados) y devuelve el tiempo de
+    importación y las dependencias pesadas que ha cargado.
+    """
+    codigo = (
+        "import sys, time, json; sys.path[:0] = sys.argv[1:]; t = time.perf_counter(); "
+        f"import {modulo}; t = time.perf_counter() - t; "
+        "print(json.dumps([t, sorted({m.split('.')[0] for m in sys.modules})]))"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo, FUNCIONES, MAIN],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    tiempo, cargados = json.loads(salida.stdout.strip().splitlines()[-1])
+    return tiempo, [m for m in PESADAS if m in cargados]
+
+
+def comprobar_importaciones():
+    """
+    Comprueba que ningún módulo carga al importarse las dependencias que tiene prohibidas.
+    Devuelve la lista de incumplimientos (módulo, dependencias).
+    """
+    fallos = []
+    for modulo, prohibidas in PROHIBIDAS.items():
+        _, pesadas = importar(modulo)
+        cargadas = [m for m in pesadas if m in prohibidas]
+        if cargadas:
+            fallos.append((modulo, cargadas))
+    return fallos
+
+
+@benchmark("importacion", [{"modulo": m} for m in MODULOS])
+def importacion(modulo):
+    # Tiempo de importación en un proceso nuevo; falla si se cargan dependencias prohibidas
+    def ejecutar():
+        tiempo, pesadas = importar(modulo)
+        cargadas = [m for m in pesadas if m in PROHIBIDAS.get(modulo, [])]
+        if cargadas:
+            raise RuntimeError(f"Importar {modulo} carga {', '.join(cargadas)}")
+        return tiempo
+
+    return ejecutar
+
+
+def parametros_texto(parametros):
+    return ",".join(f"{k}={v}" for k, v in parametros.items())
+
+
+def escalas_rapidas():
+    # Solo la escala más pequeña de cada benchmark
+    return {nombre: (p, escalas[:1]) for nombre, (p, escalas) in BENCHMARKS.items()}
+
@@ -0,0 +1,405 @@
+import os
+import copy
+import time
+import joblib
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+_ESTADISTICOS = "estadisticos.joblib"
+
+
+def estadisticos_suficientes(X, y, variables_importantes):
+    """
+    Calcula los estadísticos suficientes de la regresión lineal (n, sumas, XᵀX y Xᵀy) para cada
+    variable objetivo. Permiten reajustar modelos lineales y Lasso al añadir nuevas filas sin
+    volver a recorrer los datos anteriores.
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    y : pandas.DataFrame
+        Conjunto de datos con las variables objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+
+    Returns
+    -------
+    dict
+        Diccionario {variable objetivo: estadísticos}.
+    """
+    estadisticos = {}
+    for target_variable, predictors in variables_importantes.items():
+        A = X[predictors].to_numpy(dtype=float)
+        b = y[target_variable].to_numpy(dtype=float)
+        estadisticos[target_variable] = {
+            "n": A.shape[0],
+            "suma_x": A.sum(axis=0),
+            "suma_y": b.sum(),
+            "xtx": A.T @ A,
+            "xty": A.T @ b,
+        }
+    return estadisticos
+
+
+def combinar_estadisticos(previos, nuevos):
+    """
+    Suma los estadísticos suficientes de dos bloques de filas.
+    """
+    return {
+        target_variable: {
+            k: previos[target_variable][k] + nuevos[target_variable][k]
+            for k in previos[target_variable]
+        }
+        for target_variable in previos
+        if target_variable in nuevos
+    }
+
+
+def _centrados(est, fit_intercept=True):
+    # Matrices de covarianza (sin normalizar) a partir de los estadísticos suficientes
+    n = est["n"]
+    if not fit_intercept:
+        return n, np.zeros_like(est["suma_x"]), 0.0, est["xtx"], est["xty"]
+    media_x = est["suma_x"] / n
+    media_y = est["suma_y"] / n
+    sxx = est["xtx"] - n * np.outer(media_x, media_x)
+    sxy = est["xty"] - n * media_x * media_y
+    return n, media_x, media_y, sxx, sxy
+
+
+def _ajustar_lineal(model, est):
+    n, media_x, media_y, sxx, sxy = _centrados(est, model.fit_intercept)
+    coef = np.linalg.lstsq(sxx, sxy, rcond=None)[0]
+    model.coef_ = coef
+    model.intercept_ = media_y - media_x @ coef
+    return model
+
+
+def _ajustar_lasso(model, est):
+    # Descenso por coordenadas sobre la matriz de Gram, con el mismo objetivo que sklearn:
+    # (1 / 2n) ||y - Xw - b||² + alpha ||w||₁
+    n, media_x, media_y, sxx, sxy = _centrados(est, model.fit_intercept)
+    umbral = n * model.alpha
+    coef = np.array(getattr(model, "coef_", np.zeros(len(sxy))), dtype=float)
+    if coef.shape != sxy.shape:
+        coef = np.zeros(len(sxy))
+    diagonal = np.diag(sxx)
+    iteracion = 0
+    for iteracion in range(model.max_iter):
+        cambio_max = 0.0
+        for j in range(len(coef)):
+            if diagonal[j] <= 0:
+                continue
+            rho = sxy[j] - sxx[j] @ coef + diagonal[j] * coef[j]
+            nuevo = np.sign(rho) * max(abs(rho) - umbral, 0.0) / diagonal[j]
+            if getattr(model, "positive", False):
+                nuevo = max(nuevo, 0.0)
+            cambio_max = max(cambio_max, abs(nuevo - coef[j]))
+            coef[j] = nuevo
+        if cambio_max <= model.tol * max(np.abs(coef).max(), 1e-12):
+            break
+    model.coef_ = coef
+    model.intercept_ = media_y - media_x @ coef
+    model.n_iter_ = iteracion + 1
+    return model
+
+
+def _r2(y_real, y_pred):
+    y_real = np.asarray(y_real, dtype=float)
+    total = ((y_real - y_real.mean()) ** 2).sum()
+    if total == 0:
+        return np.nan
+    return 1 - ((y_real - y_pred) ** 2).sum() / total
+
+
+def actualizar_modelos(
+    best_models,
+    variables_importantes,
+    X_nuevo,
+    y_nuevo,
+    X_previo,
+    y_previo,
+    estadisticos=None,
+    arboles_extra=50,
+    r2_referencia=None,
+    umbral_deriva=0.1,
+    reseleccionar=False,
+    parametros_seleccion=None,
+    familias=None,
+):
+    """
+    Actualiza los mejores modelos cuando llegan nuevos periodos de datos sin repetir la
+    selección de modelos completa:
+
+    - Random Forest y Gradient Boosting: se añaden `arboles_extra` árboles (o etapas) con
+      warm_start, ajustados sobre los datos ampliados.
+    - Regresión lineal y Lasso: se reajustan a partir de los estadísticos suficientes
+      acumulados, sin recorrer los datos anteriores.
+    - Resto de modelos: se reajustan desde cero sobre los datos ampliados.
+
+    Antes de actualizar se mide el R² de cada modelo en las filas nuevas. Si la caída respecto
+    a `r2_referencia` supera `umbral_deriva`, la variable objetivo se marca para repetir la
+    selección. Con reseleccionar=True, para esas variables objetivo se repite la selección de
+    variables (`seleccion_modelo.calcular_importancia_variables_rf`) y de modelos
+    (`evaluacion_modelo.torneo_modelos`) sobre los datos ampliados en lugar de actualizarlas.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado (de sklearn) para cada variable objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    X_nuevo, y_nuevo : pandas.DataFrame
+        Filas correspondientes a los nuevos periodos.
+    X_previo, y_previo : pandas.DataFrame
+        Datos con los que se ajustaron los modelos.
+    estadisticos : dict, optional
+        Estadísticos suficientes de los datos previos. Si no se indican se calculan.
+    arboles_extra : int
+        Número de árboles o etapas a añadir en los modelos de conjuntos de árboles.
+    r2_referencia : dict, optional
+        R² de validación de referencia de cada variable objetivo (por ejemplo la columna
+        'Mejor R2' del resumen de selección de modelos). Sin él no se mide la deriva.
+    umbral_deriva : float
+        Caída máxima de R² admitida antes de repetir (o recomendar repetir) la selección.
+    reseleccionar : bool
+        Si se repite la selección de variables y de modelos para las variables objetivo cuya
+        deriva supera el umbral.
+    parametros_seleccion : dict, optional
+        Argumentos de `seleccion_modelo.calcular_importancia_variables_rf` para la nueva
+        selección de variables (umbral_importancia, num_variables, variables_forzadas...).
+    familias : dict, optional
+        Familias de modelos del torneo (por defecto `evaluacion_modelo.familias_por_defecto()`).
+
+    Returns
+    -------
+    dict
+        Diccionario con los modelos actualizados.
+    dict
+        Variables predictoras de cada variable objetivo (cambian en las que se reseleccionan).
+    dict
+        Estadísticos suficientes acumulados (previos + nuevos).
+    pandas.DataFrame
+        Informe con el método de actualización, el R² en las filas nuevas, la deriva y el
+        tiempo empleado para cada variable objetivo.
+    list
+        Variables objetivo cuya deriva supera el umbral.
+    """
+    from sklearn.base import clone
+
+    if not r2_referencia:
+        warnings.warn(
+            "Sin r2_referencia no se mide la deriva ni se repite la selección de modelos"
+        )
+
+    if estadisticos is None:
+        estadisticos = estadisticos_suficientes(X_previo, y_previo, variables_importantes)
+    estadisticos = combinar_estadisticos(
+        estadisticos,
+        estadisticos_suficientes(X_nuevo, y_nuevo, variables_importantes),
+    )
+    X_total = pd.concat([X_previo, X_nuevo])
+    y_total = pd.concat([y_previo, y_nuevo])
+
+    modelos = {}
+    informe = []
+    reseleccion = []
+    r2_nuevos = {}
+    derivas = {}
+    for target_variable, model in best_models.items():
+        if not hasattr(model, "get_params"):
+            raise TypeError(
+                f"El modelo de {target_variable} no es un estimador de sklearn; "
+                "cargue el registro con mmap=False para actualizarlo"
+            )
+        inicio = time.perf_counter()
+        predictors = variables_importantes[target_variable]
+
+        # Medimos la deriva con los modelos actuales sobre las filas nuevas
+        r2_nuevo = _r2(
+            y_nuevo[target_variable], model.predict(X_nuevo[predictors])
+        )
+        deriva = np.nan
+        if r2_referencia is not None and target_variable in r2_referencia:
+            deriva = r2_referencia[target_variable] - r2_nuevo
+            if deriva > umbral_deriva:
+                reseleccion.append(target_variable)
+        r2_nuevos[target_variable] = r2_nuevo
+        derivas[target_variable] = deriva
+        if reseleccionar and target_variable in reseleccion:
+            # Se sustituye por el ganador de la nueva selección
+            continue
+
+        nombre = type(model).__name__
+        if nombre in ("RandomForestRegressor", "GradientBoostingRegressor"):
+            metodo = "warm_start"
+            actualizado = copy.deepcopy(model)
+            actualizado.set_params(
+                warm_start=True, n_estimators=model.n_estimators + arboles_extra
+            )
+            actualizado.fit(X_total[predictors], y_total[target_variable])
+        elif nombre == "LinearRegression":
+            metodo = "estadisticos"
+            actualizado = _ajustar_lineal(
+                copy.deepcopy(model), estadisticos[target_variable]
+            )
+        elif nombre == "Lasso":
+            metodo = "estadisticos"
+            actualizado = _ajustar_lasso(
+                copy.deepcopy(model), estadisticos[target_variable]
+            )
+        else:
+            metodo = "reajuste"
+            actualizado = clone(model).fit(
+                X_total[predictors], y_total[target_variable]
+            )
+        modelos[target_variable] = actualizado
+        informe.append(
+            {
+                "Variable Objetivo": target_variable,
+                "Modelo": nombre,
+                "Método": metodo,
+                "R2 nuevos datos": r2_nuevo,
+                "Deriva": deriva,
+                "Tiempo (s)": time.perf_counter() - inicio,
+            }
+        )
+
+    variables = dict(variables_importantes)
+    if reseleccionar and reseleccion:
+        nuevos, variables_nuevas, resumen, tiempo = _reseleccionar(
+            X_total,
+            y_total[reseleccion],
+            parametros_seleccion or {},
+            familias,
+        )
+        for target_variable in reseleccion:
+            if target_variable not in nuevos:
+                # Ninguna familia ha podido evaluarse: se mantiene el modelo anterior
+                modelos[target_variable] = best_models[target_variable]
+                variables_nuevas.pop(target_variable, None)
+        modelos.update(nuevos)
+        variables.update(variables_nuevas)
+        # Los estadísticos de estas variables objetivo cambian con sus predictores
+        estadisticos.update(
+            estadisticos_suficientes(X_total, y_total, variables_nuevas)
+        )
+        for fila in resumen.to_dict("records"):
+            target_variable = fila["Variable Objetivo"]
+            if target_variable not in nuevos:
+                continue
+            informe.append(
+                {
+                    "Variable Objetivo": target_variable,
+                    "Modelo": type(nuevos[target_variable]).__name__,
+                    "Método": "reseleccion",
+                    "R2 nuevos datos": r2_nuevos[target_variable],
+                    "Deriva": derivas[target_variable],
+                    "R2 validacion": fila["Mejor R2"],
+                    "Tiempo (s)": tiempo,
+                }
+            )
+    # Mismo orden que best_models
+    modelos = {t: modelos[t] for t in best_models if t in modelos}
+    return modelos, variables, estadisticos, pd.DataFrame(informe), reseleccion
+
+
+def _reseleccionar(X, y, parametros_seleccion, familias):
+    # Repite la selección de variables y el torneo de modelos para las variables objetivo de y
+    from seleccion_modelo import calcular_importancia_variables_rf
+    from evaluacion_modelo import torneo_modelos
+
+    inicio = time.perf_counter()
+    _, _, variables_nuevas = calcular_importancia_variables_rf(
+        X, y, **parametros_seleccion
+    )
+    variables_nuevas = {t: list(v) for t, v in variables_nuevas.items()}
+    nuevos, resumen, _ = torneo_modelos(X, y, variables_nuevas, familias=familias)
+    return nuevos, variables_nuevas, resumen, time.perf_counter() - inicio
+
+
+def actualizar_registro(
+    ruta,
+    X_nuevo,
+    y_nuevo,
+    X_previo,
+    y_previo,
+    r2_referencia=None,
+    umbral_deriva=0.1,
+    arboles_extra=50,
+    reseleccionar=False,
+    parametros_seleccion=None,
+    familias=None,
+):
+    """
+    Actualiza la versión activa del registro de modelos con nuevos periodos de datos y guarda
+    el resultado como una nueva versión, junto con los estadísticos suficientes acumulados
+    para la siguiente actualización.
+
+    Si no se indica `r2_referencia` se usa el R² de validación guardado en el manifiesto del
+    registro. El resto de parámetros son los de `actualizar_modelos`.
+
+    Returns
+    -------
+    str
+        Nombre de la nueva versión.
+    pandas.DataFrame
+        Informe de la actualización (ver `actualizar_modelos`).
+    list
+        Variables objetivo cuya deriva supera el umbral (reseleccionadas si
+        reseleccionar=True).
+    """
+    from registro_modelos import cargar_registro, guardar_registro
+
+    best_models, variables_importantes, manifiesto = cargar_registro(ruta, mmap=False)
+    fichero = os.path.join(ruta, manifiesto["version"], _ESTADISTICOS)
+    estadisticos = joblib.load(fichero) if os.path.exists(fichero) else None
+    if r2_referencia is None:
+        r2_referencia = {
+            t: info["r2_validacion"]
+            for t, info in manifiesto["modelos"].items()
+            if info.get("r2_validacion") is not None
+        }
+
+    modelos, variables, estadisticos, informe, reseleccion = actualizar_modelos(
+        best_models,
+        variables_importantes,
+        X_nuevo,
+        y_nuevo,
+        X_previo,
+        y_previo,
+        estadisticos=estadisticos,
+        arboles_extra=arboles_extra,
+        r2_referencia=r2_referencia,
+        umbral_deriva=umbral_deriva,
+        reseleccionar=reseleccionar,
+        parametros_seleccion=parametros_seleccion,
+        familias=familias,
+    )
+    # La referencia de la deriva se mantiene salvo en los modelos reseleccionados, que pasan a
+    # tener el R² de validación de la nueva selección
+    r2_validacion = dict(r2_referencia)
+    if "R2 validacion" in informe:
+        nuevas = informe.dropna(subset=["R2 validacion"])
+        r2_validacion.update(zip(nuevas["Variable Objetivo"], nuevas["R2 validacion"]))
+    version = guardar_registro(
+        ruta,
+        modelos,
+        variables,
+        pd.concat([X_previo, X_nuevo]),
+        pd.concat([y_previo, y_nuevo]),
+        metadatos={
+            "actualizado_desde": manifiesto["version"],
+            "reseleccion_recomendada": [] if reseleccionar else reseleccion,
+            "reseleccionadas": reseleccion if reseleccionar else [],
+        },
+        r2_validacion=r2_validacion,
+    )
+    joblib.dump(estadisticos, os.path.join(ruta, version, _ESTADISTICOS))
+    return version, informe, reseleccion
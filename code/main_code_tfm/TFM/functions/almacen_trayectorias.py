@@ -0,0 +1,295 @@
+import os
+import json
+import shutil
+import hashlib
+import uuid
+from urllib.parse import quote
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+# Almacén de las trayectorias de simulacion.simulacion_smi. Cada trayectoria se guarda en una
+# partición escenario/ccaa/año de inicio/objetivo con un fichero .npy por variable (formato
+# columnar), y un índice JSON guarda los parámetros de cada escenario y la lista de
+# particiones. Las consultas abren solo las columnas que necesitan como memoria mapeada, sin
+# cargar el resto de trayectorias.
+
+_INDICE = "indice.json"
+_CLAVES = ("escenario", "ccaa", "inicio", "objetivo")
+VALOR_OBJETIVO = "VALOR_OBJETIVO"
+
+
+def id_escenario(parametros):
+    """
+    Identificador de un escenario a partir de la huella de sus parámetros, de modo que el mismo
+    escenario guardado dos veces tiene el mismo identificador.
+    """
+    texto = json.dumps(parametros, sort_keys=True, default=str)
+    return hashlib.sha1(texto.encode()).hexdigest()[:12]
+
+
+class AlmacenTrayectorias:
+    """
+    Almacén de trayectorias de simulación particionado por escenario, comunidad autónoma, año
+    de inicio y objetivo.
+
+    Parameters
+    ----------
+    ruta : str
+        Directorio del almacén (se crea si no existe). Se supone un único proceso escribiendo a
+        la vez; las lecturas pueden hacerse desde varios procesos.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(ruta, exist_ok=True)
+        fichero = os.path.join(ruta, _INDICE)
+        if os.path.exists(fichero):
+            with open(fichero, encoding="utf-8") as f:
+                self._indice = json.load(f)
+        else:
+            self._indice = {"escenarios": {}, "particiones": {}}
+
+    def _guardar_indice(self):
+        # Escritura atómica para no dejar un índice a medias si se interrumpe la escritura
+        fichero = os.path.join(self.ruta, _INDICE)
+        temporal = fichero + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._indice, f, indent=1, ensure_ascii=False)
+        os.replace(temporal, fichero)
+
+    @staticmethod
+    def _clave(escenario, ccaa, inicio, objetivo):
+        return "/".join(
+            f"{nombre}={quote(str(valor), safe='')}"
+            for nombre, valor in zip(_CLAVES, (escenario, ccaa, int(inicio), objetivo))
+        )
+
+    # ----------------------------------------------------------------------------------------
+    # Escritura
+    # ----------------------------------------------------------------------------------------
+
+    def registrar_escenario(self, parametros, escenario=None):
+        """
+        Guarda los parámetros de un escenario (incrementos mínimo y máximo, pasos, pesos...) y
+        devuelve su identificador (por defecto, la huella de los parámetros).
+        """
+        if escenario is None:
+            escenario = id_escenario(parametros)
+        self._indice["escenarios"][escenario] = json.loads(
+            json.dumps(parametros, default=str)
+        )
+        self._guardar_indice()
+        return escenario
+
+    def agregar(
+        self, evolucion, escenario, ccaa, inicio, objetivo, valor_objetivo=None
+    ):
+        """
+        Añade la trayectoria de una simulación. Si la partición ya existía se sustituye.
+
+        Parameters
+        ----------
+        evolucion : pd.DataFrame
+            Salida de simulacion.simulacion_smi (una fila por paso).
+        escenario : str
+            Identificador devuelto por `registrar_escenario`.
+        ccaa : str
+            Comunidad autónoma simulada.
+        inicio : int
+            Año del estado de partida.
+        objetivo : str
+            Nombre de la función objetivo maximizada.
+        valor_objetivo : array-like, optional
+            Valor de la función objetivo en cada paso; se guarda como la columna
+            VALOR_OBJETIVO.
+
+        Returns
+        -------
+        str
+            Clave de la partición.
+        """
+        if escenario not in self._indice["escenarios"]:
+            raise KeyError(f"Escenario no registrado: {escenario}")
+        columnas = {
+            c: evolucion[c].to_numpy(dtype=float)
+            for c in evolucion.columns
+            if pd.api.types.is_numeric_dtype(evolucion[c])
+        }
+        if valor_objetivo is not None:
+            columnas[VALOR_OBJETIVO] = np.asarray(valor_objetivo, dtype=float)
+            if len(columnas[VALOR_OBJETIVO]) != len(evolucion):
+                raise ValueError("valor_objetivo debe tener un valor por paso")
+
+        clave = self._clave(escenario, ccaa, inicio, objetivo)
+        destino = os.path.join(self.ruta, clave)
+        # Se escribe en un directorio temporal y se mueve entero a su sitio. La partición
+        # anterior se aparta antes con un renombrado y solo se borra cuando la nueva ya está en
+        # su sitio, de modo que una interrupción nunca deja la partición a medias
+        sufijo = uuid.uuid4().hex
+        temporal = f"{destino}.{sufijo}.tmp"
+        os.makedirs(temporal)
+        for i, (columna, valores) in enumerate(columnas.items()):
+            np.save(os.path.join(temporal, f"{i}.npy"), valores)
+        anterior = None
+        if os.path.exists(destino):
+            anterior = f"{destino}.{sufijo}.old"
+            os.replace(destino, anterior)
+        os.replace(temporal, destino)
+        if anterior is not None:
+            shutil.rmtree(anterior, ignore_errors=True)
+
+        self._indice["particiones"][clave] = {
+            "escenario": escenario,
+            "ccaa": ccaa,
+            "inicio": int(inicio),
+            "objetivo": objetivo,
+            "pasos": len(evolucion),
+            "columnas": list(columnas),
+        }
+        self._guardar_indice()
+        return clave
+
+    # ----------------------------------------------------------------------------------------
+    # Lectura
+    # ----------------------------------------------------------------------------------------
+
+    def escenarios(self, **filtros):
+        """
+        DataFrame con los parámetros de los escenarios (uno por fila) que cumplen los filtros,
+        por ejemplo escenarios(pasos=5).
+        """
+        filas = [
+            {"escenario": e, **p}
+            for e, p in self._indice["escenarios"].items()
+            if all(p.get(k) == v for k, v in filtros.items())
+        ]
+        return pd.DataFrame(filas)
+
+    def particiones(self, **filtros):
+        """
+        DataFrame con las particiones que cumplen los filtros (escenario, ccaa, inicio u
+        objetivo), sin leer las trayectorias.
+        """
+        desconocidos = set(filtros) - set(_CLAVES)
+        if desconocidos:
+            raise ValueError(f"Filtros desconocidos: {sorted(desconocidos)}")
+        filas = [
+            {"clave": clave, **p}
+            for clave, p in self._indice["particiones"].items()
+            if all(p[k] == v for k, v in filtros.items())
+        ]
+        return pd.DataFrame(filas, columns=["clave", *_CLAVES, "pasos", "columnas"])
+
+    def _columna(self, clave, columna):
+        p = self._indice["particiones"][clave]
+        try:
+            i = p["columnas"].index(columna)
+        except ValueError:
+            raise KeyError(f"La partición {clave} no tiene la columna {columna}") from None
+        return np.load(os.path.join(self.ruta, clave, f"{i}.npy"), mmap_mode="r")
+
+    def cargar(self, escenario, ccaa, inicio, objetivo, columnas=None):
+        """
+        Trayectoria de una partición como DataFrame (una fila por paso, columna 'paso').
+        """
+        clave = self._clave(escenario, ccaa, inicio, objetivo)
+        if clave not in self._indice["particiones"]:
+            raise KeyError(f"No hay trayectoria para {clave}")
+        if columnas is None:
+            columnas = self._indice["particiones"][clave]["columnas"]
+        df = pd.DataFrame({c: np.array(self._columna(clave, c)) for c in columnas})
+        df.insert(0, "paso", np.arange(len(df)))
+        return df
+
+    def mejor_por_region(self, columna=VALOR_OBJETIVO, maximizar=True, paso=-1, **filtros):
+        """
+        Para cada comunidad autónoma, la partición (escenario, inicio y objetivo) con el mejor
+        valor de `columna` en el paso indicado (el último por defecto). Solo se lee ese valor de
+        cada partición.
+
+        Returns
+        -------
+        pd.DataFrame
+            Una fila por comunidad con la partición ganadora y su valor.
+        """
+        candidatas = self.particiones(**filtros)
+        if candidatas.empty:
+            return pd.DataFrame(columns=[*_CLAVES, columna])
+        valores = []
+        for clave in candidatas["clave"]:
+            try:
+                serie = self._columna(clave, columna)
+            except KeyError:
+                valores.append(np.nan)
+                continue
+            valores.append(float(serie[paso]) if len(serie) else np.nan)
+        candidatas[columna] = valores
+        candidatas = candidatas.dropna(subset=[columna])
+        orden = candidatas.sort_values(columna, ascending=not maximizar)
+        return (
+            orden.drop_duplicates("ccaa")
+            .sort_values("ccaa")[[*_CLAVES, columna]]
+            .reset_index(drop=True)
+        )
+
+    def divergencia(self, escenario_a, escenario_b, columnas=None, **filtros):
+        """
+        Diferencia paso a paso (b - a) entre dos escenarios en las particiones que comparten
+        comunidad, año de inicio y objetivo. Solo se leen las columnas pedidas de esas
+        particiones.
+
+        Returns
+        -------
+        pd.DataFrame
+            Una fila por comunidad, inicio, objetivo, paso y variable con los valores de cada
+            escenario y su diferencia.
+        """
+        if "escenario" in filtros:
+            raise ValueError("El escenario se indica con escenario_a y escenario_b")
+        if escenario_a == escenario_b:
+            raise ValueError("escenario_a y escenario_b deben ser escenarios distintos")
+        a = self.particiones(escenario=escenario_a, **filtros)
+        b = self.particiones(escenario=escenario_b, **filtros)
+        comunes = a.merge(b, on=["ccaa", "inicio", "objetivo"], suffixes=("_a", "_b"))
+        bloques = []
+        for fila in comunes.itertuples(index=False):
+            variables = columnas
+            if variables is None:
+                variables = [c for c in fila.columnas_a if c in set(fila.columnas_b)]
+            n = min(fila.pasos_a, fila.pasos_b)
+            for variable in variables:
+                valores_a = np.asarray(self._columna(fila.clave_a, variable)[:n])
+                valores_b = np.asarray(self._columna(fila.clave_b, variable)[:n])
+                bloques.append(
+                    pd.DataFrame(
+                        {
+                            "ccaa": fila.ccaa,
+                            "inicio": fila.inicio,
+                            "objetivo": fila.objetivo,
+                            "paso": np.arange(n),
+                            "variable": variable,
+                            escenario_a: valores_a,
+                            escenario_b: valores_b,
+                            "diferencia": valores_b - valores_a,
+                        }
+                    )
+                )
+        if not bloques:
+            return pd.DataFrame(
+                columns=[
+                    "ccaa",
+                    "inicio",
+                    "objetivo",
+                    "paso",
+                    "variable",
+                    escenario_a,
+                    escenario_b,
+                    "diferencia",
+                ]
+            )
+        return pd.concat(bloques, ignore_index=True)
@@ -0,0 +1,242 @@
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from joblib import Parallel, delayed, effective_n_jobs
+from bosque_empaquetado import tipo_modelo_arboles
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+# Implementación del algoritmo TreeSHAP (Lundberg et al., 2018) para árboles de regresión de
+# sklearn. El recorrido de cada árbol es el mismo para todas las filas (se visitan siempre los
+# dos hijos); lo único que depende de la fila es la fracción "one" de cada elemento del camino,
+# por lo que los pesos del camino se guardan como arrays (longitud del camino × filas) y todas
+# las filas se procesan a la vez.
+
+
+def _extender(d, z, o, w, pz, po, pi):
+    # EXTEND: añade un elemento al camino y actualiza los pesos de las permutaciones
+    l = len(d)
+    if l == 0:
+        return [pi], np.array([pz]), po[None, :], np.ones((1, po.shape[0]))
+    k = np.arange(l + 1)[:, None]
+    w_ext = np.vstack([w, np.zeros((1, w.shape[1]))])
+    w_desp = np.vstack([np.zeros((1, w.shape[1])), w])
+    w_nuevo = (pz * w_ext * (l - k) + po * w_desp * k) / (l + 1)
+    return d + [pi], np.append(z, pz), np.vstack([o, po[None, :]]), w_nuevo
+
+
+def _deshacer(d, z, o, w, i):
+    # UNWIND: elimina el elemento i del camino deshaciendo su efecto sobre los pesos
+    l = len(d)
+    zi, oi = z[i], o[i]
+    no_nulo = oi != 0
+    oi_seguro = np.where(no_nulo, oi, 1.0)
+    siguiente = w[l - 1].copy()
+    w_nuevo = w[: l - 1].copy()
+    for j in range(l - 2, -1, -1):
+        con_uno = siguiente * l / ((j + 1) * oi_seguro)
+        sin_uno = w[j] * l / (zi * (l - j - 1))
+        siguiente = np.where(
+            no_nulo, w[j] - con_uno * zi * (l - j - 1) / l, siguiente
+        )
+        w_nuevo[j] = np.where(no_nulo, con_uno, sin_uno)
+    return (
+        d[:i] + d[i + 1 :],
+        np.delete(z, i),
+        np.delete(o, i, axis=0),
+        w_nuevo,
+    )
+
+
+def _suma_deshecha(z, o, w, i):
+    # UNWOUNDSUM: suma de los pesos del camino si se eliminase el elemento i
+    l = len(z)
+    zi, oi = z[i], o[i]
+    no_nulo = oi != 0
+    oi_seguro = np.where(no_nulo, oi, 1.0)
+    siguiente = w[l - 1].copy()
+    total_uno = np.zeros_like(siguiente)
+    total_cero = np.zeros_like(siguiente)
+    for j in range(l - 2, -1, -1):
+        tmp = siguiente / ((j + 1) * oi_seguro)
+        total_uno += tmp
+        siguiente = w[j] - tmp * zi * (l - j - 1)
+        total_cero += w[j] / (zi * (l - j - 1))
+    return np.where(no_nulo, total_uno, total_cero) * l
+
+
+def _shap_arbol(arbol, X, n_variables):
+    # Valores SHAP exactos de un árbol para todas las filas de X (float32)
+    t = arbol.tree_
+    izquierda, derecha = t.children_left, t.children_right
+    variable, umbral = t.feature, t.threshold
+    valor = t.value[:, 0, 0]
+    cobertura = t.weighted_n_node_samples
+    phi = np.zeros((X.shape[0], n_variables))
+
+    def recorrer(j, d, z, o, w, pz, po, pi):
+        d, z, o, w = _extender(d, z, o, w, pz, po, pi)
+        if izquierda[j] == -1:
+            for i in range(1, len(d)):
+                peso = _suma_deshecha(z, o, w, i)
+                phi[:, d[i]] += peso * (o[i] - z[i]) * valor[j]
+            return
+        f = variable[j]
+        iz, io = 1.0, np.ones(X.shape[0])
+        if f in d:
+            k = d.index(f)
+            iz, io = z[k], o[k]
+            d, z, o, w = _deshacer(d, z, o, w, k)
+        va_izquierda = X[:, f] <= umbral[j]
+        hi, hd = izquierda[j], derecha[j]
+        recorrer(
+            hi, d, z, o, w, iz * cobertura[hi] / cobertura[j], io * va_izquierda, f
+        )
+        recorrer(
+            hd, d, z, o, w, iz * cobertura[hd] / cobertura[j], io * ~va_izquierda, f
+        )
+
+    recorrer(0, [], np.zeros(0), None, None, 1.0, np.ones(X.shape[0]), -1)
+    esperado = (valor * cobertura)[izquierda == -1].sum() / cobertura[0]
+    return phi, esperado
+
+
+def _shap_bloque(arboles, X, n_variables):
+    phi = np.zeros((X.shape[0], n_variables))
+    esperado = 0.0
+    for arbol in arboles:
+        p, e = _shap_arbol(arbol, X, n_variables)
+        phi += p
+        esperado += e
+    return phi, esperado
+
+
+def valores_shap(model, X, X_fondo=None, n_jobs=1):
+    """
+    Calcula las contribuciones exactas de cada variable a la predicción de cada fila (valores
+    SHAP). Para árboles de decisión, Random Forest y Gradient Boosting se usa el algoritmo
+    TreeSHAP, que recorre cada árbol una única vez para todas las filas y tiene coste
+    polinómico en la profundidad. Para modelos lineales (regresión lineal, Lasso) la
+    contribución es coef * (x - media), con la media de `X_fondo`.
+
+    Se cumple que valor_base + suma de las contribuciones de una fila = predicción de la fila.
+
+    Parameters
+    ----------
+    model : sklearn.Model
+        Modelo ajustado.
+    X : pandas.DataFrame
+        Filas a explicar, con las variables predictoras del modelo en el orden de entrenamiento.
+    X_fondo : pandas.DataFrame, optional
+        Datos de referencia para los modelos lineales. Por defecto se usa X.
+    n_jobs : int
+        Número de procesos entre los que se reparten los árboles del conjunto.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Contribución de cada variable (columnas) para cada fila (mismo índice que X).
+    float
+        Valor base (predicción esperada).
+    """
+    n_variables = X.shape[1]
+    if hasattr(model, "coef_"):
+        fondo = X if X_fondo is None else X_fondo
+        coef = np.ravel(model.coef_)
+        media = fondo.to_numpy(dtype=float).mean(axis=0)
+        phi = (X.to_numpy(dtype=float) - media) * coef
+        base = float(np.ravel(model.intercept_)[0] + media @ coef)
+        return pd.DataFrame(phi, index=X.index, columns=X.columns), base
+
+    # sklearn compara los umbrales con los datos convertidos a float32
+    X32 = X.to_numpy(dtype=np.float32)
+    tipo = tipo_modelo_arboles(model)
+    if tipo == "arbol":
+        arboles, escala, base = [model], 1.0, 0.0
+    elif tipo == "boosting":
+        arboles = list(np.ravel(model.estimators_))
+        escala = model.learning_rate
+        base = (
+            0.0
+            if isinstance(model.init_, str)
+            else float(np.ravel(model.init_.predict(X32[:1]))[0])
+        )
+    elif tipo == "bosque":
+        arboles = list(model.estimators_)
+        escala, base = 1.0 / len(arboles), 0.0
+    else:
+        raise TypeError(
+            f"{type(model).__name__} no es un modelo de árboles ni lineal; "
+            "use importancia.importancia_permutacion_columna"
+        )
+
+    if n_jobs == 1:
+        resultados = [_shap_bloque(arboles, X32, n_variables)]
+    else:
+        n_bloques = min(effective_n_jobs(n_jobs), len(arboles))
+        bloques = np.array_split(np.arange(len(arboles)), n_bloques)
+        resultados = Parallel(n_jobs=n_jobs)(
+            delayed(_shap_bloque)([arboles[i] for i in b], X32, n_variables)
+            for b in bloques
+        )
+    phi = escala * sum(r[0] for r in resultados)
+    base += escala * sum(r[1] for r in resultados)
+    return pd.DataFrame(phi, index=X.index, columns=X.columns), base
+
+
+def atribuciones_modelos(best_models, X, variables_importantes, n_jobs=1):
+    """
+    Calcula los valores SHAP de todas las filas de X para el modelo de cada variable objetivo.
+
+    Returns
+    -------
+    dict
+        Diccionario {variable objetivo: (DataFrame de contribuciones, valor base)}. Los modelos
+        no soportados (por ejemplo SVR) se omiten.
+    """
+    atribuciones = {}
+    for target_variable, model in best_models.items():
+        try:
+            atribuciones[target_variable] = valores_shap(
+                model, X[list(variables_importantes[target_variable])], n_jobs=n_jobs
+            )
+        except TypeError:
+            continue
+    return atribuciones
+
+
+def importancia_shap(
+    best_models, X, variables_importantes, variable_interes=None, n_jobs=1
+):
+    """
+    Importancia global de las variables como media del valor absoluto de sus contribuciones
+    SHAP, para el modelo de cada variable objetivo.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    variable_interes : str, optional
+        Si se indica (por ejemplo 'INC_SMI_REAL'), solo se devuelve la importancia de esa variable.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame con las columnas 'Variable', 'Importancia' y 'Modelo' (variable objetivo).
+    """
+    filas = []
+    for target_variable, (phi, _) in atribuciones_modelos(
+        best_models, X, variables_importantes, n_jobs=n_jobs
+    ).items():
+        for var, imp in phi.abs().mean().items():
+            if variable_interes is None or var == variable_interes:
+                filas.append(
+                    {"Variable": var, "Importancia": imp, "Modelo": target_variable}
+                )
+    return pd.DataFrame(filas, columns=["Variable", "Importancia", "Modelo"])
@@ -0,0 +1,180 @@
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from joblib import Parallel, delayed, effective_n_jobs
+from simulacion import increase_vars_batch
+from panel import AlmacenPanel
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+
+def _columna_estado(target_variable, columnas):
+    # Columna de estado que actualiza la predicción (por ejemplo PARO para PARO_delta1). Si
+    # varias columnas están contenidas en el nombre, se toma la más larga (PIB_CAPITA y no PIB).
+    candidatas = [c for c in columnas if c in target_variable]
+    return max(candidatas, key=len) if candidatas else None
+
+
+def _backtest_regiones(
+    panel,
+    regiones_bloque,
+    best_models,
+    variables_importantes,
+    horizonte,
+    variable,
+):
+    # Reproduce la evolución real del incremento para todos los periodos de inicio de un
+    # bloque de comunidades. En cada horizonte se predicen a la vez todas las trayectorias que
+    # siguen activas, con una única llamada a predict por variable objetivo. Los estados reales
+    # se leen del almacén del panel por posición, sin reindexar DataFrames.
+    columnas = panel.columnas
+    predictores = sorted({v for p in variables_importantes.values() for v in p})
+    filas_bloque = panel.indices_regiones(regiones_bloque)
+    ir, ip = np.nonzero(panel.completas(predictores)[filas_bloque])
+    ir = filas_bloque[ir]
+    regiones = np.asarray(panel.regiones, dtype=object)[ir]
+    periodos_inicio = np.asarray(panel.periodos)[ip]
+    estado = pd.DataFrame(panel.datos[ir, ip], columns=columnas)
+    estado_columnas = {t: _columna_estado(t, columnas) for t in best_models}
+    i_columna = {c: i for i, c in enumerate(columnas)}
+
+    trayectorias = []
+    activas = np.ones(len(estado), dtype=bool)
+    for h in range(1, horizonte + 1):
+        # Incremento real aplicado en el periodo anterior y estado real h periodos después
+        inc, _ = panel.filas(regiones, periodos_inicio + h - 1, [variable])
+        real, presentes = panel.filas(regiones, periodos_inicio + h)
+        activas &= ~np.isnan(inc[:, 0]) & presentes
+        if not activas.any():
+            break
+
+        actual = estado.loc[activas].copy()
+        actual[variable] = inc[activas, 0]
+        increases = {
+            t: np.asarray(
+                model.predict(actual[list(variables_importantes[t])]), dtype=float
+            )
+            for t, model in best_models.items()
+        }
+        nuevo = increase_vars_batch(increases, actual.copy())
+        estado.loc[activas, columnas] = nuevo[columnas]
+
+        for target_variable, columna in estado_columnas.items():
+            if columna is None:
+                continue
+            k = i_columna[columna]
+            trayectorias.append(
+                pd.DataFrame(
+                    {
+                        panel.col_region: regiones[activas],
+                        "periodo_inicio": periodos_inicio[activas],
+                        "horizonte": h,
+                        panel.col_periodo: periodos_inicio[activas] + h,
+                        "Variable Objetivo": target_variable,
+                        "Inicial": panel.datos[ir[activas], ip[activas], k],
+                        "Real": real[activas, k],
+                        "Simulado": nuevo[columna].to_numpy(dtype=float),
+                    }
+                )
+            )
+    if not trayectorias:
+        return pd.DataFrame()
+    return pd.concat(trayectorias, ignore_index=True)
+
+
+def backtest(
+    best_models,
+    df,
+    variables_importantes,
+    horizonte=5,
+    variable="INC_SMI_REAL",
+    col_region="ccaa",
+    col_periodo="periodo",
+    n_jobs=-1,
+):
+    """
+    Valida el simulador reproduciendo la evolución histórica real del incremento del salario
+    mínimo para cada comunidad autónoma y cada periodo de inicio posible. Partiendo del estado
+    real de la comunidad en el periodo de inicio, en cada paso se aplica el incremento real de
+    ese periodo y se actualizan las variables con las predicciones de los modelos, igual que en
+    `simulacion.simulacion_smi`, y se compara el estado simulado con el real.
+
+    Las comunidades se reparten en bloques que se procesan en paralelo y, dentro de cada bloque,
+    todas las trayectorias se predicen a la vez en cada horizonte.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con los modelos de prediccion para cada variable objetivo
+    df : pd.DataFrame or AlmacenPanel
+        Panel con las columnas de región y periodo, las variables predictoras y las variables
+        de estado reales
+    variables_importantes : dict
+        Diccionario con las variables importantes para cada variable objetivo
+    horizonte : int
+        Numero maximo de pasos simulados desde cada periodo de inicio
+    n_jobs : int
+        Numero de procesos entre los que se reparten las comunidades
+
+    Returns
+    -------
+    pd.DataFrame
+        Resumen con el error absoluto medio (MAE), el sesgo (simulado - real) y el acierto en
+        la dirección del cambio respecto al periodo de inicio, por variable objetivo y horizonte
+    pd.DataFrame
+        Trayectorias simuladas y reales de cada comunidad, periodo de inicio y horizonte
+    """
+    if isinstance(df, AlmacenPanel):
+        panel = df.instantanea()
+    else:
+        columnas = [
+            c
+            for c in df.columns
+            if c not in (col_region, col_periodo)
+            and pd.api.types.is_numeric_dtype(df[c])
+        ]
+        if variable not in columnas:
+            columnas.append(variable)
+        panel = AlmacenPanel.desde_dataframe(
+            df, col_region, col_periodo, columnas
+        ).instantanea()
+    # Todos los bloques comparten la misma instantánea de solo lectura del panel
+    n_bloques = max(1, min(effective_n_jobs(n_jobs), len(panel.regiones)))
+    bloques = np.array_split(np.array(panel.regiones, dtype=object), n_bloques)
+    resultados = Parallel(n_jobs=n_jobs)(
+        delayed(_backtest_regiones)(
+            panel,
+            list(b),
+            best_models,
+            variables_importantes,
+            horizonte,
+            variable,
+        )
+        for b in bloques
+        if len(b)
+    )
+    trayectorias = pd.concat(resultados, ignore_index=True)
+    if trayectorias.empty:
+        return pd.DataFrame(), trayectorias
+
+    error = trayectorias["Simulado"] - trayectorias["Real"]
+    direccion = np.sign(trayectorias["Simulado"] - trayectorias["Inicial"]) == np.sign(
+        trayectorias["Real"] - trayectorias["Inicial"]
+    )
+    resumen = (
+        trayectorias.assign(
+            error_abs=error.abs(), error=error, direccion=direccion.astype(float)
+        )
+        .groupby(["Variable Objetivo", "horizonte"])
+        .agg(
+            MAE=("error_abs", "mean"),
+            Sesgo=("error", "mean"),
+            Acierto_direccion=("direccion", "mean"),
+            N=("error", "size"),
+        )
+        .reset_index()
+        .rename(columns={"Acierto_direccion": "Acierto dirección"})
+    )
+    return resumen, trayectorias
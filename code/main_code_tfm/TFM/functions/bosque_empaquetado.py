@@ -0,0 +1,227 @@
+import os
+import json
+import numpy as np
+import warnings
+
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+_ARRAYS = ["feature", "threshold", "left", "right", "value", "roots"]
+
+
+def tipo_modelo_arboles(model):
+    """
+    Tipo de modelo de árboles de regresión ya ajustado: "arbol" (árbol de decisión), "bosque"
+    (Random Forest o Extra Trees, media de los árboles), "boosting" (Gradient Boosting) o None
+    si no es ninguno de ellos. Otros conjuntos de árboles (AdaBoost, Bagging,
+    HistGradientBoosting...) combinan las predicciones de otra forma.
+    """
+    # sklearn se importa aquí para que importar este módulo no lo cargue
+    from sklearn.tree import DecisionTreeRegressor
+    from sklearn.ensemble import (
+        ExtraTreesRegressor,
+        GradientBoostingRegressor,
+        RandomForestRegressor,
+    )
+
+    if isinstance(model, DecisionTreeRegressor):
+        return "arbol" if hasattr(model, "tree_") else None
+    if not hasattr(model, "estimators_"):
+        return None
+    if isinstance(model, GradientBoostingRegressor):
+        return "boosting"
+    if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+        return "bosque"
+    return None
+
+
+def es_modelo_arboles(model):
+    """
+    Indica si el modelo es un árbol de decisión o un conjunto de árboles de regresión
+    (Random Forest, Extra Trees o Gradient Boosting) ya ajustado que se puede empaquetar.
+    """
+    return tipo_modelo_arboles(model) is not None
+
+
+class BosqueEmpaquetado:
+    """
+    Representación plana de un árbol o conjunto de árboles de regresión de sklearn. Todos los
+    nodos de todos los árboles se guardan en arrays contiguos de NumPy, lo que permite
+    guardarlos en disco, cargarlos como memoria mapeada (compartiendo páginas entre procesos)
+    y predecir recorriendo todos los árboles a la vez sin necesidad de importar sklearn.
+
+    La predicción es base + escala * suma de los valores de las hojas alcanzadas.
+
+    Parameters
+    ----------
+    feature, threshold, left, right, value : numpy.ndarray
+        Arrays por nodo (índices globales). Las hojas tienen feature = -1.
+    roots : numpy.ndarray
+        Índice del nodo raíz de cada árbol.
+    base : float
+        Valor inicial de la predicción (predicción inicial en Gradient Boosting).
+    escala : float
+        Factor que multiplica la suma de las hojas (1/n_árboles en Random Forest, tasa de
+        aprendizaje en Gradient Boosting).
+    feature_names : list, optional
+        Nombre y orden de las variables predictoras.
+    """
+
+    def __init__(
+        self,
+        feature,
+        threshold,
+        left,
+        right,
+        value,
+        roots,
+        base,
+        escala,
+        feature_names=None,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.base = float(base)
+        self.escala = float(escala)
+        self.feature_names_in_ = (
+            np.asarray(feature_names, dtype=object)
+            if feature_names is not None
+            else None
+        )
+
+    @property
+    def n_arboles(self):
+        return len(self.roots)
+
+    @classmethod
+    def desde_modelo(cls, model):
+        """
+        Empaqueta un DecisionTreeRegressor, RandomForestRegressor, ExtraTreesRegressor o
+        GradientBoostingRegressor ya ajustado.
+        """
+        tipo = tipo_modelo_arboles(model)
+        if tipo is None:
+            raise TypeError(
+                f"No se puede empaquetar un modelo {type(model).__name__}: solo árboles de "
+                "decisión, Random Forest, Extra Trees o Gradient Boosting de regresión ajustados"
+            )
+        if tipo == "arbol":
+            arboles = [model]
+            base, escala = 0.0, 1.0
+        elif tipo == "boosting":
+            arboles = list(np.ravel(model.estimators_))
+            escala = model.learning_rate
+            init = model.init_
+            if isinstance(init, str):
+                base = 0.0
+            else:
+                base = float(
+                    np.ravel(init.predict(np.zeros((1, model.n_features_in_))))[0]
+                )
+        else:
+            arboles = list(model.estimators_)
+            base, escala = 0.0, 1.0 / len(arboles)
+
+        partes = {k: [] for k in _ARRAYS}
+        desplazamiento = 0
+        for arbol in arboles:
+            t = arbol.tree_
+            hoja = t.children_left == -1
+            partes["feature"].append(np.where(hoja, -1, t.feature).astype(np.int32))
+            partes["threshold"].append(t.threshold.astype(np.float64))
+            partes["left"].append(
+                np.where(hoja, -1, t.children_left + desplazamiento).astype(np.int32)
+            )
+            partes["right"].append(
+                np.where(hoja, -1, t.children_right + desplazamiento).astype(np.int32)
+            )
+            partes["value"].append(t.value[:, 0, 0].astype(np.float64))
+            partes["roots"].append(np.array([desplazamiento], dtype=np.int32))
+            desplazamiento += t.node_count
+        arrays = {k: np.concatenate(v) for k, v in partes.items()}
+        return cls(
+            **arrays,
+            base=base,
+            escala=escala,
+            feature_names=getattr(model, "feature_names_in_", None),
+        )
+
+    def _matriz(self, X):
+        # Reordenamos las columnas según el orden de entrenamiento si recibimos un DataFrame
+        if hasattr(X, "columns") and self.feature_names_in_ is not None:
+            X = X[list(self.feature_names_in_)]
+        # sklearn compara los umbrales con los datos convertidos a float32
+        return np.asarray(X, dtype=np.float32)
+
+    def apply(self, X):
+        """
+        Devuelve el índice global de la hoja alcanzada por cada fila en cada árbol
+        (array de forma filas × árboles).
+        """
+        X = self._matriz(X)
+        filas = np.arange(X.shape[0])[:, None]
+        nodos = np.broadcast_to(self.roots, (X.shape[0], self.n_arboles)).copy()
+        activos = self.feature[nodos] >= 0
+        while activos.any():
+            f = self.feature[nodos]
+            izquierda = X[filas, np.maximum(f, 0)] <= self.threshold[nodos]
+            siguiente = np.where(izquierda, self.left[nodos], self.right[nodos])
+            nodos = np.where(activos, siguiente, nodos)
+            activos = self.feature[nodos] >= 0
+        return nodos
+
+    def predict(self, X):
+        return self.base + self.escala * self.value[self.apply(X)].sum(axis=1)
+
+    def predicciones_arboles(self, X):
+        """
+        Devuelve el valor de la hoja alcanzada en cada árbol (filas × árboles), útil para
+        estimar la dispersión de las predicciones de un bosque.
+        """
+        return self.value[self.apply(X)]
+
+    def guardar(self, ruta):
+        """
+        Guarda los arrays como ficheros .npy (aptos para memoria mapeada) y los metadatos en JSON.
+        """
+        os.makedirs(ruta, exist_ok=True)
+        for k in _ARRAYS:
+            np.save(
+                os.path.join(ruta, f"{k}.npy"), np.ascontiguousarray(getattr(self, k))
+            )
+        with open(os.path.join(ruta, "bosque.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "base": self.base,
+                    "escala": self.escala,
+                    "feature_names": (
+                        [str(c) for c in self.feature_names_in_]
+                        if self.feature_names_in_ is not None
+                        else None
+                    ),
+                },
+                f,
+            )
+
+    @classmethod
+    def cargar(cls, ruta, mmap=True):
+        """
+        Carga un bosque guardado con `guardar`. Con mmap=True los arrays se abren como memoria
+        mapeada de solo lectura, por lo que la carga es casi inmediata y los procesos que
+        cargan el mismo fichero comparten las páginas.
+        """
+        with open(os.path.join(ruta, "bosque.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        modo = "r" if mmap else None
+        arrays = {
+            k: np.load(os.path.join(ruta, f"{k}.npy"), mmap_mode=modo) for k in _ARRAYS
+        }
+        return cls(
+            **arrays,
+            base=meta["base"],
+            escala=meta["escala"],
+            feature_names=meta["feature_names"],
+        )
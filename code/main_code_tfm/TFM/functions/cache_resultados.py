@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import time
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from telemetria import contar
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+
+def huella_datos(*datos):
+    """
+    Calcula una huella (hash) estable de uno o varios DataFrames/Series. La huella depende
+    de los valores, del índice y del nombre de las columnas, por lo que cualquier cambio en
+    los datos produce una huella distinta.
+
+    Parameters
+    ----------
+    *datos : pandas.DataFrame o pandas.Series
+        Objetos de los que se calcula la huella conjunta.
+
+    Returns
+    -------
+    str
+        Huella hexadecimal de los datos.
+    """
+    h = hashlib.sha1()
+    for d in datos:
+        if isinstance(d, pd.DataFrame):
+            h.update(json.dumps([str(c) for c in d.columns]).encode())
+        else:
+            h.update(str(d.name).encode())
+        h.update(pd.util.hash_pandas_object(d, index=True).values.tobytes())
+    return h.hexdigest()
+
+
+def _texto_parametros(model):
+    # Representación estable de la clase y los parámetros del estimador
+    return json.dumps(
+        {"clase": type(model).__name__, "params": model.get_params()},
+        sort_keys=True,
+        default=repr,
+    )
+
+
+class CacheResultados:
+    """
+    Caché en disco de las puntuaciones de validación cruzada. Cada entrada se identifica por
+    la huella de la matriz de entrenamiento, la variable objetivo, la lista de predictores,
+    la clase y parámetros del estimador y la configuración de la validación cruzada.
+
+    Las entradas guardan además la huella del conjunto de datos completo con el que se
+    generaron, de forma que al evaluar con datos distintos se eliminan automáticamente.
+    El número de entradas está acotado por `max_entradas` (se eliminan las menos usadas).
+
+    Parameters
+    ----------
+    ruta : str
+        Directorio donde se guarda el índice de la caché.
+    max_entradas : int
+        Número máximo de entradas que se conservan.
+    """
+
+    def __init__(self, ruta="cache_resultados", max_entradas=5000):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._fichero = os.path.join(ruta, "indice.json")
+        self._pendiente = False
+        os.makedirs(ruta, exist_ok=True)
+        if os.path.exists(self._fichero):
+            with open(self._fichero, encoding="utf-8") as f:
+                self._entradas = json.load(f)
+        else:
+            self._entradas = {}
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def clave(self, X_var, y_var, model, cv):
+        """
+        Construye la clave de una evaluación a partir de los datos, el modelo y la validación cruzada.
+        """
+        h = hashlib.sha1()
+        h.update(huella_datos(X_var, y_var).encode())
+        h.update(_texto_parametros(model).encode())
+        h.update(repr(cv).encode())
+        return h.hexdigest()
+
+    def obtener(self, clave):
+        """
+        Devuelve las puntuaciones por pliegue guardadas para la clave o None si no existen.
+        """
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            contar("cache_resultados.fallos")
+            return None
+        self.aciertos += 1
+        contar("cache_resultados.aciertos")
+        entrada["ultimo_acceso"] = time.time()
+        self._pendiente = True
+        return np.array(entrada["puntuaciones"], dtype=float)
+
+    def guardar(self, clave, puntuaciones, huella, objetivo=None, model=None):
+        """
+        Guarda las puntuaciones por pliegue de una evaluación.
+        """
+        ahora = time.time()
+        self._entradas[clave] = {
+            "puntuaciones": [float(p) for p in puntuaciones],
+            "huella_datos": huella,
+            "objetivo": objetivo,
+            "modelo": type(model).__name__ if model is not None else None,
+            "params": _texto_parametros(model) if model is not None else None,
+            "creado": ahora,
+            "ultimo_acceso": ahora,
+        }
+        self._pendiente = True
+        self._acotar()
+
+    def expirar(self, huella):
+        """
+        Elimina las entradas generadas con un conjunto de datos distinto al actual.
+        """
+        obsoletas = [
+            c for c, e in self._entradas.items() if e["huella_datos"] != huella
+        ]
+        for c in obsoletas:
+            del self._entradas[c]
+        if obsoletas:
+            self._pendiente = True
+        return len(obsoletas)
+
+    def _acotar(self):
+        # Eliminamos las entradas usadas hace más tiempo si se supera el límite
+        exceso = len(self._entradas) - self.max_entradas
+        if exceso > 0:
+            antiguas = sorted(
+                self._entradas, key=lambda c: self._entradas[c]["ultimo_acceso"]
+            )[:exceso]
+            for c in antiguas:
+                del self._entradas[c]
+
+    def volcar(self):
+        """
+        Escribe el índice en disco (de forma atómica) si hay cambios pendientes.
+        """
+        if not self._pendiente:
+            return
+        temporal = self._fichero + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._entradas, f)
+        os.replace(temporal, self._fichero)
+        self._pendiente = False
+
+    def limpiar(self):
+        """
+        Elimina todas las entradas de la caché.
+        """
+        self._entradas = {}
+        self._pendiente = True
+        self.volcar()
+
+    def resumen(self):
+        """
+        Devuelve un DataFrame con el contenido de la caché para poder inspeccionarla.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Una fila por entrada con el modelo, la variable objetivo, el R² medio y las fechas
+            de creación y último acceso.
+        """
+        filas = [
+            {
+                "Clave": c,
+                "Modelo": e["modelo"],
+                "Variable Objetivo": e["objetivo"],
+                "Mean R²": np.mean(e["puntuaciones"]),
+                "Creado": pd.to_datetime(e["creado"], unit="s"),
+                "Último acceso": pd.to_datetime(e["ultimo_acceso"], unit="s"),
+            }
+            for c, e in self._entradas.items()
+        ]
+        return pd.DataFrame(
+            filas,
+            columns=[
+                "Clave",
+                "Modelo",
+                "Variable Objetivo",
+                "Mean R²",
+                "Creado",
+                "Último acceso",
+            ],
+        )
+
+    def estadisticas(self):
+        """
+        Devuelve el número de entradas, aciertos, fallos y la tasa de aciertos de la caché.
+        """
+        total = self.aciertos + self.fallos
+        return {
+            "entradas": len(self._entradas),
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / total if total else 0.0,
+        }
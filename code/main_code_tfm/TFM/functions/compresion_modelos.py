@@ -0,0 +1,184 @@
+import copy
+import json
+import time
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from joblib import Parallel, delayed
+from bosque_empaquetado import BosqueEmpaquetado
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+
+def _es_comprimible(model):
+    nombre = type(model).__name__
+    return nombre in (
+        "RandomForestRegressor",
+        "ExtraTreesRegressor",
+        "GradientBoostingRegressor",
+    )
+
+
+def _predicciones_prefijo(model, X):
+    # Predicción usando solo los m primeros árboles (o etapas), para m = 1..M
+    # (array de forma M × filas)
+    if hasattr(model, "learning_rate"):
+        return np.array([p for p in model.staged_predict(X)])
+    por_arbol = BosqueEmpaquetado.desde_modelo(model).predicciones_arboles(X)
+    return (np.cumsum(por_arbol, axis=1) / np.arange(1, por_arbol.shape[1] + 1)).T
+
+
+def _r2_prefijos(model, X_train, y_train, X_test, y_test):
+    # R² en el pliegue de validación de cada prefijo, con un único ajuste del modelo
+    from sklearn.base import clone
+
+    ajustado = clone(model).fit(X_train, y_train)
+    pred = _predicciones_prefijo(ajustado, X_test)
+    y_test = np.asarray(y_test, dtype=float)
+    total = ((y_test - y_test.mean()) ** 2).sum()
+    return 1 - ((pred - y_test) ** 2).sum(axis=1) / total
+
+
+def truncar_modelo(model, n_arboles):
+    """
+    Devuelve una copia del Random Forest o Gradient Boosting con solo sus n_arboles primeros
+    árboles (o etapas).
+    """
+    truncado = copy.deepcopy(model)
+    truncado.estimators_ = model.estimators_[:n_arboles]
+    truncado.n_estimators = n_arboles
+    if hasattr(truncado, "n_estimators_"):
+        truncado.n_estimators_ = n_arboles
+    if hasattr(truncado, "train_score_"):
+        truncado.train_score_ = model.train_score_[:n_arboles]
+    if hasattr(truncado, "oob_improvement_"):
+        truncado.oob_improvement_ = model.oob_improvement_[:n_arboles]
+    return truncado
+
+
+def _tiempo_fila(model, X, repeticiones=50):
+    # Tiempo medio de predicción de una sola fila, como en las simulaciones
+    fila = X.iloc[[0]]
+    model.predict(fila)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        model.predict(fila)
+    return (time.perf_counter() - inicio) / repeticiones
+
+
+def comprimir_modelos(
+    best_models,
+    X,
+    y,
+    variables_importantes,
+    tolerancia=0.005,
+    n_jobs=-1,
+):
+    """
+    Reduce el número de árboles de los Random Forest y Gradient Boosting de best_models,
+    eligiendo el menor número de árboles (o etapas) cuyo R² en validación cruzada no cae más de
+    `tolerancia` respecto al modelo completo. En cada pliegue el modelo se ajusta una sola vez y
+    se evalúan todos los prefijos de árboles (predicciones acumuladas en Random Forest,
+    staged_predict en Gradient Boosting). El resto de modelos se devuelven sin cambios.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    y : pandas.DataFrame
+        Conjunto de datos con las variables objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    tolerancia : float
+        Caída máxima de R² admitida.
+    n_jobs : int
+        Número de procesos entre los que se reparten los pliegues.
+
+    Returns
+    -------
+    dict
+        Diccionario con los modelos comprimidos.
+    pandas.DataFrame
+        Informe con el número de árboles, el R² de validación antes y después, la diferencia y
+        la aceleración en la predicción de una fila para cada variable objetivo.
+    """
+    from sklearn.model_selection import KFold
+
+    kf = KFold(n_splits=5, shuffle=True, random_state=42)
+    comprimidos = {}
+    informe = []
+    for target_variable, model in best_models.items():
+        if not _es_comprimible(model):
+            comprimidos[target_variable] = model
+            continue
+        X_var = X[list(variables_importantes[target_variable])]
+        y_var = y[target_variable]
+        r2_pliegues = Parallel(n_jobs=n_jobs)(
+            delayed(_r2_prefijos)(
+                model,
+                X_var.iloc[train],
+                y_var.iloc[train],
+                X_var.iloc[test],
+                y_var.iloc[test],
+            )
+            for train, test in kf.split(X_var)
+        )
+        r2_medio = np.mean(r2_pliegues, axis=0)
+        r2_completo = r2_medio[-1]
+        n_arboles = int(np.argmax(r2_medio >= r2_completo - tolerancia)) + 1
+
+        truncado = truncar_modelo(model, n_arboles)
+        comprimidos[target_variable] = truncado
+        informe.append(
+            {
+                "Variable Objetivo": target_variable,
+                "Modelo": type(model).__name__,
+                "Árboles originales": len(r2_medio),
+                "Árboles comprimidos": n_arboles,
+                "R2 original": r2_completo,
+                "R2 comprimido": r2_medio[n_arboles - 1],
+                "Diferencia R2": r2_medio[n_arboles - 1] - r2_completo,
+                "Aceleración": _tiempo_fila(model, X_var)
+                / _tiempo_fila(truncado, X_var),
+            }
+        )
+    return comprimidos, pd.DataFrame(informe)
+
+
+def guardar_comprimidos(
+    ruta, comprimidos, variables_importantes, informe, X=None, y=None
+):
+    """
+    Guarda los modelos comprimidos como una nueva versión del registro de modelos, que pasa a
+    ser la activa, e incluye el informe de compresión en el manifiesto. La versión original se
+    conserva y se puede cargar indicando su nombre en registro_modelos.cargar_registro.
+
+    Returns
+    -------
+    str
+        Nombre de la nueva versión.
+    """
+    from registro_modelos import guardar_registro, version_actual, cargar_manifiesto
+
+    # Se conserva el R² de validación de la versión original como referencia de la deriva
+    origen = cargar_manifiesto(ruta)
+    return guardar_registro(
+        ruta,
+        comprimidos,
+        variables_importantes,
+        X,
+        y,
+        metadatos={
+            "comprimido_desde": version_actual(ruta),
+            "compresion": json.loads(informe.to_json(orient="records")),
+        },
+        r2_validacion={
+            t: info.get("r2_validacion")
+            for t, info in origen["modelos"].items()
+            if info.get("r2_validacion") is not None
+        },
+    )
@@ -0,0 +1,207 @@
+import os
+import json
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from dependencia_parcial import curvas_ice
+from panel import AlmacenPanel
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+_DATOS = "cubo.npy"
+_COORDENADAS = "coordenadas.json"
+
+
+def construir_cubo(
+    best_models,
+    df,
+    variables_importantes,
+    ruta,
+    rejilla=None,
+    variable="INC_SMI_REAL",
+    col_region="ccaa",
+    col_periodo="periodo",
+):
+    """
+    Precalcula la predicción de todos los modelos para cada comunidad autónoma, periodo e
+    incremento de la rejilla y la guarda en disco como un array denso float32
+    (ccaa × periodo × rejilla × variable objetivo) junto con sus coordenadas.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    df : pandas.DataFrame or AlmacenPanel
+        Panel con las columnas de región, periodo y las variables predictoras.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    ruta : str
+        Directorio donde se guarda el cubo.
+    rejilla : numpy.ndarray, optional
+        Incrementos a precalcular, al menos dos y en orden creciente. Por defecto
+        np.linspace(-0.15, 0.3, 200).
+
+    Returns
+    -------
+    CuboRespuesta
+        Cubo cargado en modo de solo lectura.
+    """
+    if rejilla is None:
+        rejilla = np.linspace(-0.15, 0.3, 200)
+    rejilla = np.asarray(rejilla, dtype=float)
+    # La consulta interpola entre dos puntos consecutivos de la rejilla
+    if rejilla.ndim != 1 or len(rejilla) < 2:
+        raise ValueError("La rejilla debe tener al menos dos incrementos")
+    if not np.all(np.diff(rejilla) > 0):
+        raise ValueError("La rejilla debe estar en orden creciente y sin repetidos")
+    predictores = sorted({v for p in variables_importantes.values() for v in p})
+
+    if not isinstance(df, AlmacenPanel):
+        df = AlmacenPanel.desde_dataframe(df, col_region, col_periodo, predictores)
+    regiones, periodos = df.regiones, df.periodos
+
+    # Solo se pueden predecir las filas con todas las variables predictoras informadas. Sus
+    # posiciones en el almacén son directamente las del cubo.
+    filas_r, filas_p = np.nonzero(df.completas(predictores))
+    completas = pd.DataFrame(
+        df.datos[filas_r, filas_p][:, df.indices_columnas(predictores)],
+        columns=predictores,
+    )
+    curvas, objetivos = curvas_ice(
+        best_models, completas, variables_importantes, variable, rejilla
+    )
+
+    os.makedirs(ruta, exist_ok=True)
+    datos = np.lib.format.open_memmap(
+        os.path.join(ruta, _DATOS),
+        mode="w+",
+        dtype=np.float32,
+        shape=(len(regiones), len(periodos), len(rejilla), len(objetivos)),
+    )
+    datos[:] = np.nan
+    datos[filas_r, filas_p] = curvas
+    datos.flush()
+    del datos
+
+    with open(os.path.join(ruta, _COORDENADAS), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "variable": variable,
+                "regiones": [str(r) for r in regiones],
+                "periodos": [int(p) for p in periodos],
+                "rejilla": rejilla.tolist(),
+                "objetivos": objetivos,
+            },
+            f,
+            ensure_ascii=False,
+        )
+    return CuboRespuesta(ruta)
+
+
+class CuboRespuesta:
+    """
+    Cubo de respuesta precalculado (ccaa × periodo × incremento × variable objetivo), abierto
+    como memoria mapeada de solo lectura. Permite consultar predicciones, curvas y cortes sin
+    volver a ejecutar los modelos.
+
+    Parameters
+    ----------
+    ruta : str
+        Directorio en el que se guardó el cubo con `construir_cubo`.
+    """
+
+    def __init__(self, ruta):
+        with open(os.path.join(ruta, _COORDENADAS), encoding="utf-8") as f:
+            coordenadas = json.load(f)
+        self.variable = coordenadas["variable"]
+        self.regiones = coordenadas["regiones"]
+        self.periodos = coordenadas["periodos"]
+        self.rejilla = np.array(coordenadas["rejilla"])
+        self.objetivos = coordenadas["objetivos"]
+        self.datos = np.load(os.path.join(ruta, _DATOS), mmap_mode="r")
+        self._i_region = {r: i for i, r in enumerate(self.regiones)}
+        self._i_periodo = {p: i for i, p in enumerate(self.periodos)}
+        self._i_objetivo = {o: i for i, o in enumerate(self.objetivos)}
+
+    def _indices_objetivo(self, objetivos):
+        if objetivos is None:
+            return list(range(len(self.objetivos))), self.objetivos
+        if isinstance(objetivos, str):
+            objetivos = [objetivos]
+        return [self._i_objetivo[o] for o in objetivos], list(objetivos)
+
+    def _interpolar(self, bloque, incrementos):
+        # Interpolación lineal sobre el eje de la rejilla (bloque: rejilla × objetivos)
+        incrementos = np.clip(
+            np.atleast_1d(np.asarray(incrementos, dtype=float)),
+            self.rejilla[0],
+            self.rejilla[-1],
+        )
+        derecha = np.clip(
+            np.searchsorted(self.rejilla, incrementos), 1, len(self.rejilla) - 1
+        )
+        izquierda = derecha - 1
+        peso = (incrementos - self.rejilla[izquierda]) / (
+            self.rejilla[derecha] - self.rejilla[izquierda]
+        )
+        return (
+            bloque[izquierda] * (1 - peso[:, None]) + bloque[derecha] * peso[:, None]
+        )
+
+    def consultar(self, ccaa, periodo, incremento, objetivos=None):
+        """
+        Predicción de los modelos para una comunidad, un periodo y uno o varios incrementos,
+        interpolando linealmente entre los puntos de la rejilla.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Una fila por incremento, con la columna del incremento y una por variable objetivo.
+        """
+        indices, nombres = self._indices_objetivo(objetivos)
+        bloque = np.asarray(
+            self.datos[self._i_region[ccaa], self._i_periodo[periodo]][:, indices],
+            dtype=float,
+        )
+        valores = self._interpolar(bloque, incremento)
+        df = pd.DataFrame(valores, columns=nombres)
+        df.insert(0, self.variable, np.atleast_1d(np.asarray(incremento, dtype=float)))
+        return df
+
+    def curva(self, ccaa, periodo, minimo=None, maximo=None, objetivos=None):
+        """
+        Curvas de respuesta de una comunidad y periodo en el rango de incrementos indicado, en
+        el formato que espera plots.plot_simulacion.
+        """
+        indices, nombres = self._indices_objetivo(objetivos)
+        seleccion = np.ones(len(self.rejilla), dtype=bool)
+        if minimo is not None:
+            seleccion &= self.rejilla >= minimo
+        if maximo is not None:
+            seleccion &= self.rejilla <= maximo
+        bloque = self.datos[self._i_region[ccaa], self._i_periodo[periodo]]
+        df = pd.DataFrame(
+            np.asarray(bloque[seleccion][:, indices], dtype=float), columns=nombres
+        )
+        df.insert(0, self.variable, self.rejilla[seleccion])
+        return df
+
+    def corte(self, objetivo, incremento):
+        """
+        Mapa de la predicción de una variable objetivo para un incremento dado en todas las
+        comunidades y periodos.
+
+        Returns
+        -------
+        pandas.DataFrame
+            DataFrame con las comunidades como índice y los periodos como columnas.
+        """
+        k = self._i_objetivo[objetivo]
+        bloque = np.asarray(self.datos[:, :, :, k], dtype=float)
+        n_r, n_p, n_g = bloque.shape
+        valores = self._interpolar(
+            bloque.reshape(n_r * n_p, n_g).T, [incremento]
+        ).reshape(n_r, n_p)
+        return pd.DataFrame(valores, index=self.regiones, columns=self.periodos)
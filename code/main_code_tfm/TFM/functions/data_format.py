@@ -1,11 +1,13 @@
 import pandas as pd
 import warnings
 from pandas.errors import SettingWithCopyWarning
+from telemetria import instrumentar
 
 warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 
+@instrumentar
 def combinar_tablas(
     gasto_basico,
     smi,
@@ -271,6 +273,7 @@ def combinar_tablas(
     return total_merge
 
 
+@instrumentar
 def format_total_merge(total_merge, variables):
     IPC_2015_factor = 100 / total_merge[total_merge["periodo"] == 2015]["IPC"].values[0]
     total_merge["IPC_2015"] = total_merge["IPC"] * IPC_2015_factor
@@ -317,6 +320,7 @@ def format_total_merge(total_merge, variables):
     return df
 
 
+@instrumentar
 def atrasar_año(
     df,
     var,
@@ -0,0 +1,198 @@
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from bosque_empaquetado import tipo_modelo_arboles
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+
+def _arboles(model):
+    # Árboles de sklearn que forman el modelo (None si no es un árbol, Random Forest, Extra
+    # Trees o Gradient Boosting). Otros conjuntos como AdaBoost o Bagging no combinan los
+    # árboles con una media o una suma, o les pasan solo un subconjunto de las variables.
+    tipo = tipo_modelo_arboles(model)
+    if tipo is None:
+        return None
+    if tipo == "arbol":
+        return [model]
+    return list(np.ravel(model.estimators_))
+
+
+def _umbrales(model, j):
+    # Umbrales de todos los nodos que dividen por la variable j (None si no es de árboles)
+    if hasattr(model, "feature") and hasattr(model, "threshold"):
+        # BosqueEmpaquetado
+        return np.unique(np.asarray(model.threshold)[np.asarray(model.feature) == j])
+    arboles = _arboles(model)
+    if arboles is None:
+        return None
+    return np.unique(
+        np.concatenate(
+            [a.tree_.threshold[a.tree_.feature == j] for a in arboles] + [np.zeros(0)]
+        )
+    )
+
+
+def _prediccion_rejilla(model, X_var, j, rejilla):
+    # Predicción de cada fila para cada valor de la rejilla (filas × rejilla) en una sola
+    # llamada a predict. En los modelos de árboles, los valores de la rejilla que caen entre
+    # los mismos umbrales de la variable dan la misma predicción, por lo que solo se predice
+    # un valor representativo de cada intervalo.
+    n = X_var.shape[0]
+    umbrales = _umbrales(model, j)
+    if umbrales is not None:
+        intervalo = np.searchsorted(
+            umbrales, rejilla.astype(np.float32).astype(np.float64), side="left"
+        )
+        _, representantes, inversa = np.unique(
+            intervalo, return_index=True, return_inverse=True
+        )
+        valores = rejilla[representantes]
+    else:
+        valores, inversa = rejilla, np.arange(len(rejilla))
+
+    apilado = np.repeat(X_var.to_numpy(dtype=float), len(valores), axis=0)
+    apilado[:, j] = np.tile(valores, n)
+    pred = np.asarray(
+        model.predict(pd.DataFrame(apilado, columns=X_var.columns)), dtype=float
+    ).reshape(n, len(valores))
+    return pred[:, inversa]
+
+
+def curvas_ice(
+    best_models,
+    X,
+    variables_importantes,
+    variable="INC_SMI_REAL",
+    rejilla=None,
+):
+    """
+    Calcula las curvas ICE (expectativa condicional individual) de cada variable objetivo
+    respecto a `variable` para todas las filas de X a la vez (por ejemplo todas las
+    combinaciones de comunidad autónoma y año del panel).
+
+    Para cada modelo se hace una única predicción apilada (filas × rejilla). En los modelos de
+    árboles la rejilla se reduce primero a un valor por intervalo entre umbrales de la
+    variable, ya que el resto de valores producen exactamente la misma predicción.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    X : pandas.DataFrame
+        Filas para las que se calculan las curvas.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    variable : str
+        Variable que se hace variar.
+    rejilla : numpy.ndarray, optional
+        Valores de la variable. Por defecto np.linspace(-0.15, 0.3, 200), como en el trabajo.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array de forma (filas × rejilla × variables objetivo).
+    list
+        Variables objetivo en el orden del último eje.
+    """
+    if rejilla is None:
+        rejilla = np.linspace(-0.15, 0.3, 200)
+    rejilla = np.asarray(rejilla, dtype=float)
+    objetivos = list(best_models)
+    curvas = np.empty((X.shape[0], len(rejilla), len(objetivos)))
+    for k, target_variable in enumerate(objetivos):
+        model = best_models[target_variable]
+        predictors = list(variables_importantes[target_variable])
+        X_var = X[predictors]
+        if variable not in predictors:
+            # La variable no interviene en el modelo: la curva es constante
+            curvas[:, :, k] = np.asarray(model.predict(X_var), dtype=float)[:, None]
+            continue
+        curvas[:, :, k] = _prediccion_rejilla(
+            model, X_var, predictors.index(variable), rejilla
+        )
+    return curvas, objetivos
+
+
+def _dependencia_arbol(arbol, j, rejilla):
+    # Método de recursión: un único recorrido del árbol para toda la rejilla. En los nodos que
+    # dividen por la variable se sigue la rama de cada valor de la rejilla y en el resto se
+    # reparte el peso según la proporción de muestras de entrenamiento de cada hijo.
+    t = arbol.tree_
+    resultado = np.zeros(len(rejilla))
+    pila = [(0, np.ones(len(rejilla)))]
+    while pila:
+        nodo, peso = pila.pop()
+        izq, der = t.children_left[nodo], t.children_right[nodo]
+        if izq == -1:
+            resultado += peso * t.value[nodo, 0, 0]
+        elif t.feature[nodo] == j:
+            va_izquierda = rejilla <= t.threshold[nodo]
+            pila.append((izq, peso * va_izquierda))
+            pila.append((der, peso * ~va_izquierda))
+        else:
+            total = t.weighted_n_node_samples[nodo]
+            pila.append((izq, peso * t.weighted_n_node_samples[izq] / total))
+            pila.append((der, peso * t.weighted_n_node_samples[der] / total))
+    return resultado
+
+
+def dependencia_parcial(
+    best_models,
+    X,
+    variables_importantes,
+    variable="INC_SMI_REAL",
+    rejilla=None,
+):
+    """
+    Calcula la dependencia parcial de cada variable objetivo respecto a `variable`. En los
+    árboles de decisión, Random Forest, Extra Trees y Gradient Boosting de sklearn se usa el
+    método de recursión, que recorre cada árbol una sola vez para toda la rejilla sin depender
+    del número de filas (el promedio es sobre la distribución de entrenamiento). En el resto
+    de modelos (incluidos AdaBoost o Bagging) se promedian las curvas ICE de X.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame con la columna de la variable y una columna por variable objetivo, en el
+        formato que espera plots.plot_simulacion.
+    """
+    if rejilla is None:
+        rejilla = np.linspace(-0.15, 0.3, 200)
+    rejilla = np.asarray(rejilla, dtype=float)
+    rejilla32 = rejilla.astype(np.float32).astype(np.float64)
+    resultado = {variable: rejilla}
+    for target_variable, model in best_models.items():
+        predictors = list(variables_importantes[target_variable])
+        arboles = _arboles(model)
+        if variable in predictors and arboles is not None:
+            j = predictors.index(variable)
+            suma = sum(_dependencia_arbol(a, j, rejilla32) for a in arboles)
+            if tipo_modelo_arboles(model) == "boosting":
+                base = (
+                    0.0
+                    if isinstance(model.init_, str)
+                    else float(np.ravel(model.init_.predict(X[predictors][:1]))[0])
+                )
+                resultado[target_variable] = base + model.learning_rate * suma
+            else:
+                resultado[target_variable] = suma / len(arboles)
+        else:
+            curvas, _ = curvas_ice(
+                {target_variable: model}, X, variables_importantes, variable, rejilla
+            )
+            resultado[target_variable] = curvas[:, :, 0].mean(axis=0)
+    return pd.DataFrame(resultado)
+
+
+def curvas_fila(curvas, objetivos, rejilla, fila, variable="INC_SMI_REAL"):
+    """
+    Extrae las curvas de una fila del resultado de `curvas_ice` como DataFrame, en el formato
+    que espera plots.plot_simulacion (la variable en la primera columna y una columna por
+    variable objetivo).
+    """
+    df = pd.DataFrame(curvas[fila], columns=objetivos)
+    df.insert(0, variable, np.asarray(rejilla, dtype=float))
+    return df
@@ -1,19 +1,22 @@
 import pandas as pd
-import sklearn as sk
 import numpy as np
-import math
-import statsmodels.api as sm
+import time
 import warnings
-import utils as u
 from pandas.errors import SettingWithCopyWarning
+from telemetria import instrumentar
 
 warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 from sklearn.model_selection import cross_val_score
-from sklearn.model_selection import KFold, GridSearchCV
+from sklearn.model_selection import KFold, GridSearchCV, ParameterGrid
+from sklearn.base import clone
+from sklearn.metrics import r2_score
+from joblib import Parallel, delayed
+from cache_resultados import huella_datos
 
 
-def evaluacion_modelo_simple(X, y, variables_importantes, model):
+@instrumentar
+def evaluacion_modelo_simple(X, y, variables_importantes, model, cache=None):
     """
     Evalúa el rendimiento de un modelo con respecto a un conjunto de variables objetivo,
     realizando una validación cruzada con KFold.
@@ -28,6 +31,9 @@ def evaluacion_modelo_simple(X, y, variables_importantes, model):
         Diccionario con las variables predictoras y su correspondiente variable objetivo.
     model : sklearn.Model
         Modelo a evaluar.
+    cache : cache_resultados.CacheResultados, optional
+        Caché en disco de las puntuaciones. Si se indica, solo se evalúan las combinaciones
+        que no estén ya guardadas.
 
     Returns
     -------
@@ -37,6 +43,9 @@ def evaluacion_modelo_simple(X, y, variables_importantes, model):
         validación cruzada.
     """
     results = []
+    if cache is not None:
+        huella = huella_datos(X, y)
+        cache.expirar(huella)
     # Realizar la validación cruzada para cada variable objetivo
     for target_variable, predictors in variables_importantes.items():
         # Extraer las columnas del DataFrame correspondientes a las variables predictoras
@@ -48,10 +57,19 @@ def evaluacion_modelo_simple(X, y, variables_importantes, model):
             n_splits=5, shuffle=True, random_state=42
         )  # 5 pliegues de cross-validation
 
-        # Realizar el cross-validation y obtener la puntuación (por defecto, R^2)
-        cv_scores = cross_val_score(
-            model, X_var, y_var, cv=kf, scoring="r2"
-        )  # Cambiar 'r2' si necesitas otro tipo de métrica
+        # Buscar primero las puntuaciones en la caché
+        cv_scores = None
+        if cache is not None:
+            clave = cache.clave(X_var, y_var, model, kf)
+            cv_scores = cache.obtener(clave)
+
+        if cv_scores is None:
+            # Realizar el cross-validation y obtener la puntuación (por defecto, R^2)
+            cv_scores = cross_val_score(
+                model, X_var, y_var, cv=kf, scoring="r2"
+            )  # Cambiar 'r2' si necesitas otro tipo de métrica
+            if cache is not None:
+                cache.guardar(clave, cv_scores, huella, target_variable, model)
 
         # Guardar los resultados para la variable objetivo actual
         results.append(
@@ -60,11 +78,61 @@ def evaluacion_modelo_simple(X, y, variables_importantes, model):
                 "Mean R²": cv_scores.mean(),  # Promedio de las puntuaciones R^2
             }
         )
+    if cache is not None:
+        cache.volcar()
     results_df = pd.DataFrame(results)
     return results_df
 
 
-def evaluacion_modelo(X, y, variables_importantes, model, param_grid):
+def _grid_search_cache(X_var, y_var, model, param_grid, kf, cache, huella, target):
+    # Recuperamos de la caché las combinaciones ya evaluadas y solo lanzamos el resto
+    combinaciones = list(ParameterGrid(param_grid))
+    puntuaciones = [None] * len(combinaciones)
+    claves = []
+    pendientes = []
+    for i, params in enumerate(combinaciones):
+        clave = cache.clave(X_var, y_var, clone(model).set_params(**params), kf)
+        claves.append(clave)
+        puntuaciones[i] = cache.obtener(clave)
+        if puntuaciones[i] is None:
+            pendientes.append(i)
+
+    if pendientes:
+        grid_search = GridSearchCV(
+            estimator=model,
+            param_grid=[
+                {k: [v] for k, v in combinaciones[i].items()} for i in pendientes
+            ],
+            cv=kf,
+            scoring="r2",
+            n_jobs=-1,
+            verbose=0,
+        )
+        grid_search.fit(X_var, y_var)
+        n_splits = kf.get_n_splits()
+        for j, i in enumerate(pendientes):
+            puntuaciones[i] = np.array(
+                [
+                    grid_search.cv_results_[f"split{k}_test_score"][j]
+                    for k in range(n_splits)
+                ]
+            )
+            cache.guardar(
+                claves[i],
+                puntuaciones[i],
+                huella,
+                target,
+                clone(model).set_params(**combinaciones[i]),
+            )
+
+    # Elegimos la mejor combinación con el mismo criterio que GridSearchCV
+    medias = np.array([p.mean() for p in puntuaciones])
+    mejor = int(np.nanargmax(medias)) if not np.all(np.isnan(medias)) else 0
+    return combinaciones[mejor], medias[mejor]
+
+
+@instrumentar
+def evaluacion_modelo(X, y, variables_importantes, model, param_grid, cache=None):
     """
     Evalúa el rendimiento de un modelo con respecto a un conjunto de variables objetivo, realizando una búsqueda de hiperparámetros con GridSearchCV.
 
@@ -80,6 +148,9 @@ def evaluacion_modelo(X, y, variables_importantes, model, param_grid):
         Modelo a evaluar.
     param_grid : dict
         Diccionario con los parámetros a explorar en la búsqueda de hiperparámetros.
+    cache : cache_resultados.CacheResultados, optional
+        Caché en disco de las puntuaciones por pliegue de cada combinación de parámetros. Si
+        se indica, solo se evalúan las combinaciones que no estén ya guardadas.
 
     Returns
     -------
@@ -90,6 +161,9 @@ def evaluacion_modelo(X, y, variables_importantes, model, param_grid):
     """
     results = []
     best_params_dict = {}
+    if cache is not None:
+        huella = huella_datos(X, y)
+        cache.expirar(huella)
 
     # Realizar la búsqueda de hiperparámetros con GridSearchCV para cada variable objetivo
     for target_variable, predictors in variables_importantes.items():
@@ -100,24 +174,29 @@ def evaluacion_modelo(X, y, variables_importantes, model, param_grid):
         # Configurar KFold (5 pliegues de cross-validation)
         kf = KFold(n_splits=5, shuffle=True, random_state=42)
 
-        # Realizar la búsqueda de hiperparámetros con GridSearchCV
-        grid_search = GridSearchCV(
-            estimator=model,
-            param_grid=param_grid,
-            cv=kf,
-            scoring="r2",
-            n_jobs=-1,
-            verbose=0,
-        )
+        if cache is not None:
+            best_params, best_r2 = _grid_search_cache(
+                X_var, y_var, model, param_grid, kf, cache, huella, target_variable
+            )
+        else:
+            # Realizar la búsqueda de hiperparámetros con GridSearchCV
+            grid_search = GridSearchCV(
+                estimator=model,
+                param_grid=param_grid,
+                cv=kf,
+                scoring="r2",
+                n_jobs=-1,
+                verbose=0,
+            )
 
-        # Ajustar el modelo con los datos
-        grid_search.fit(X_var, y_var)
+            # Ajustar el modelo con los datos
+            grid_search.fit(X_var, y_var)
 
-        # Obtener el mejor conjunto de parámetros
-        best_params = grid_search.best_params_
+            # Obtener el mejor conjunto de parámetros
+            best_params = grid_search.best_params_
 
-        # Obtener el mejor R² para la mejor combinación de parámetros
-        best_r2 = grid_search.best_score_
+            # Obtener el mejor R² para la mejor combinación de parámetros
+            best_r2 = grid_search.best_score_
 
         # Almacenar el resultado de R² y el mejor conjunto de parámetros
         results.append({"Variable Objetivo": target_variable, "Best R²": best_r2})
@@ -125,6 +204,272 @@ def evaluacion_modelo(X, y, variables_importantes, model, param_grid):
         # Guardar el mejor conjunto de parámetros para esta variable objetivo
         best_params_dict[target_variable] = best_params
 
+    if cache is not None:
+        cache.volcar()
+
     # Convertir los resultados en un DataFrame
     results_df = pd.DataFrame(results)
     return results_df, best_params_dict
+
+
+def familias_por_defecto():
+    """
+    Devuelve el registro de familias de modelos y rejillas de hiperparámetros utilizado en el
+    trabajo. Las familias sin rejilla se evalúan con sus parámetros por defecto.
+
+    Returns
+    -------
+    dict
+        Diccionario {nombre de la familia: (modelo, param_grid o None)}.
+    """
+    from sklearn.linear_model import LinearRegression, Lasso
+    from sklearn.tree import DecisionTreeRegressor
+    from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+    from sklearn.svm import SVR
+
+    return {
+        "Regresión Lineal": (LinearRegression(), None),
+        "Regresión Lasso": (Lasso(), None),
+        "Árbol de decisión": (
+            DecisionTreeRegressor(),
+            {
+                "max_depth": [5, 10, 15, None],
+                "min_samples_split": [2, 5, 10],
+                "min_samples_leaf": [1, 2, 4],
+                "criterion": ["squared_error", "friedman_mse", "absolute_error"],
+            },
+        ),
+        "Random Forest": (
+            RandomForestRegressor(),
+            {
+                "n_estimators": [50, 100, 200],
+                "max_depth": [5, 10, 15, None],
+                "min_samples_split": [2, 5, 10],
+                "min_samples_leaf": [1, 2, 4],
+                "criterion": ["squared_error", "absolute_error"],
+                "bootstrap": [True, False],
+            },
+        ),
+        "Gradient Boosting": (
+            GradientBoostingRegressor(),
+            {
+                "n_estimators": [50, 100, 200],
+                "learning_rate": [0.01, 0.1, 0.2],
+                "max_depth": [3, 5, 10],
+                "min_samples_split": [2, 5, 10],
+                "min_samples_leaf": [1, 2, 4],
+                "subsample": [0.8, 1.0],
+            },
+        ),
+        "SVM": (
+            SVR(),
+            {
+                "C": [0.1, 1, 2, 5, 10, 100, 200, 500],
+                "kernel": ["rbf", "linear", "sigmoid"],
+                "gamma": ["scale", "auto"],
+            },
+        ),
+    }
+
+
+def _evaluar_pliegue(model, params, X_var, y_var, train, test):
+    # Ajusta una combinación de parámetros en un pliegue y devuelve el R², el tiempo empleado y
+    # el error si el ajuste falla. Como GridSearchCV (error_score=np.nan), un fallo puntúa NaN
+    # en lugar de interrumpir el torneo completo.
+    inicio = time.perf_counter()
+    try:
+        estimador = clone(model).set_params(**params)
+        estimador.fit(X_var[train], y_var[train])
+        score = r2_score(y_var[test], estimador.predict(X_var[test]))
+        error = None
+    except Exception as e:
+        score, error = np.nan, repr(e)
+    return score, time.perf_counter() - inicio, error
+
+
+def _ajustar_final(model, params, X_var, y_var):
+    estimador = clone(model).set_params(**params)
+    estimador.fit(X_var, y_var)
+    return estimador
+
+
+@instrumentar
+def torneo_modelos(X, y, variables_importantes, familias=None, n_jobs=-1, cache=None):
+    """
+    Selecciona el mejor modelo para cada variable objetivo en una única ejecución paralela.
+    Todas las combinaciones (familia × variable objetivo × parámetros × pliegue) se reparten
+    en un mismo conjunto de procesos, se elige la familia y los parámetros con mayor R² medio
+    para cada variable objetivo y se reajusta el ganador con todos los datos.
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    y : pandas.DataFrame
+        Conjunto de datos con las variables objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras y su correspondiente variable objetivo.
+    familias : dict, optional
+        Diccionario {nombre: (modelo, param_grid o None)}. Por defecto se usa
+        `familias_por_defecto()`.
+    n_jobs : int
+        Número de procesos a utilizar (-1 para usar todos los disponibles).
+    cache : cache_resultados.CacheResultados, optional
+        Caché en disco de las puntuaciones por pliegue. Las combinaciones ya guardadas no se
+        vuelven a evaluar.
+
+    Returns
+    -------
+    dict
+        Diccionario con el mejor modelo ajustado para cada variable objetivo (best_models).
+    pandas.DataFrame
+        Tabla resumen con el R² de cada familia, el mejor R², el modelo ganador y sus parámetros
+        para cada variable objetivo.
+    dict
+        Tiempos de la evaluación, del reajuste y total (en segundos), y tiempo de ajuste
+        acumulado por familia.
+    """
+    if familias is None:
+        familias = familias_por_defecto()
+    inicio = time.perf_counter()
+    kf = KFold(n_splits=5, shuffle=True, random_state=42)
+    if cache is not None:
+        huella = huella_datos(X, y)
+        cache.expirar(huella)
+
+    # Preparamos los datos de cada variable objetivo y las combinaciones a evaluar
+    datos = {}
+    pliegues = {}
+    combinaciones = {}
+    puntuaciones = {}
+    claves = {}
+    tareas = []
+    for target_variable, predictors in variables_importantes.items():
+        X_var = X[predictors].to_numpy()
+        y_var = y[target_variable].to_numpy()
+        datos[target_variable] = (X_var, y_var)
+        pliegues[target_variable] = list(kf.split(X_var))
+        for familia, (model, param_grid) in familias.items():
+            grid = list(ParameterGrid(param_grid if param_grid is not None else {}))
+            combinaciones[(familia, target_variable)] = grid
+            for i, params in enumerate(grid):
+                if cache is not None:
+                    clave = cache.clave(
+                        X[predictors],
+                        y[target_variable],
+                        clone(model).set_params(**params),
+                        kf,
+                    )
+                    claves[(familia, target_variable, i)] = clave
+                    guardadas = cache.obtener(clave)
+                    if guardadas is not None:
+                        puntuaciones[(familia, target_variable, i)] = guardadas
+                        continue
+                for k in range(len(pliegues[target_variable])):
+                    tareas.append((familia, target_variable, i, k))
+
+    # Lanzamos primero las tareas más costosas para repartir mejor la carga
+    def coste(tarea):
+        familia, target_variable, i, _ = tarea
+        return combinaciones[(familia, target_variable)][i].get("n_estimators", 1)
+
+    tareas.sort(key=coste, reverse=True)
+
+    tiempos_familia = {familia: 0.0 for familia in familias}
+    with Parallel(n_jobs=n_jobs, batch_size="auto") as paralelo:
+        resultados = paralelo(
+            delayed(_evaluar_pliegue)(
+                familias[familia][0],
+                combinaciones[(familia, target_variable)][i],
+                *datos[target_variable],
+                *pliegues[target_variable][k],
+            )
+            for familia, target_variable, i, k in tareas
+        )
+        fin_evaluacion = time.perf_counter()
+
+        # Agrupamos las puntuaciones por pliegue de cada combinación
+        por_combinacion = {}
+        errores = {}
+        for (familia, target_variable, i, k), (score, segundos, error) in zip(
+            tareas, resultados
+        ):
+            por_combinacion.setdefault((familia, target_variable, i), {})[k] = score
+            tiempos_familia[familia] += segundos
+            if error is not None:
+                errores.setdefault((familia, target_variable, i), error)
+        for (familia, target_variable, i), error in errores.items():
+            warnings.warn(
+                f"El ajuste de {familia} con {combinaciones[(familia, target_variable)][i]} "
+                f"para {target_variable} ha fallado en algún pliegue y se puntúa como NaN: "
+                f"{error}"
+            )
+        for (familia, target_variable, i), scores in por_combinacion.items():
+            scores = np.array([scores[k] for k in sorted(scores)])
+            puntuaciones[(familia, target_variable, i)] = scores
+            # Los fallos no se guardan en la caché para volver a intentarlos
+            if cache is not None and (familia, target_variable, i) not in errores:
+                params = combinaciones[(familia, target_variable)][i]
+                cache.guardar(
+                    claves[(familia, target_variable, i)],
+                    scores,
+                    huella,
+                    target_variable,
+                    clone(familias[familia][0]).set_params(**params),
+                )
+        if cache is not None:
+            cache.volcar()
+
+        # Elegimos la mejor combinación de cada familia y la mejor familia de cada objetivo. Como
+        # en GridSearchCV, la media de una combinación con algún pliegue fallido es NaN y la
+        # combinación no se puede elegir.
+        results = []
+        ganadores = {}
+        for target_variable in variables_importantes:
+            fila = {"Variable Objetivo": target_variable}
+            mejor = (-np.inf, None, None)
+            for familia in familias:
+                grid = combinaciones[(familia, target_variable)]
+                medias = np.array(
+                    [
+                        puntuaciones[(familia, target_variable, i)].mean()
+                        for i in range(len(grid))
+                    ]
+                )
+                if np.all(np.isnan(medias)):
+                    fila[f"Best R2 {familia}"] = np.nan
+                    continue
+                i_mejor = int(np.nanargmax(medias))
+                fila[f"Best R2 {familia}"] = medias[i_mejor]
+                if medias[i_mejor] > mejor[0]:
+                    mejor = (medias[i_mejor], familia, grid[i_mejor])
+            if mejor[1] is None:
+                warnings.warn(
+                    f"Ninguna familia se ha podido evaluar para {target_variable}"
+                )
+                mejor = (np.nan, None, None)
+            fila["Mejor R2"], fila["Modelo"], fila["Parámetros"] = mejor
+            ganadores[target_variable] = mejor
+            results.append(fila)
+
+        # Reajustamos el ganador de cada variable objetivo con todos los datos
+        objetivos = [t for t in variables_importantes if ganadores[t][1] is not None]
+        modelos = paralelo(
+            delayed(_ajustar_final)(
+                familias[ganadores[t][1]][0],
+                ganadores[t][2],
+                X[variables_importantes[t]],
+                y[t],
+            )
+            for t in objetivos
+        )
+    best_models = dict(zip(objetivos, modelos))
+    fin = time.perf_counter()
+
+    tiempos = {
+        "evaluacion": fin_evaluacion - inicio,
+        "reajuste": fin - fin_evaluacion,
+        "total": fin - inicio,
+        "por_familia": tiempos_familia,
+    }
+    return best_models, pd.DataFrame(results), tiempos
@@ -0,0 +1,156 @@
+import weakref
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from cache_resultados import huella_datos
+from telemetria import contar
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+# Resultados guardados por modelo; se liberan automáticamente al eliminar el modelo. Junto a
+# ellos se guarda la huella del estado ajustado del modelo, ya que un mismo objeto puede
+# volver a ajustarse (por ejemplo con warm_start en actualizacion_modelos)
+_cache = weakref.WeakKeyDictionary()
+
+
+def _huella_ajuste(model):
+    # Huella de los parámetros y del estado ajustado (árboles, coeficientes...) del modelo
+    import joblib
+
+    return joblib.hash(model)
+
+
+def _r2_repeticiones(y_real, y_pred):
+    # R² de cada repetición (y_pred de forma repeticiones × filas)
+    residuo = ((y_pred - y_real) ** 2).sum(axis=-1)
+    total = ((y_real - y_real.mean()) ** 2).sum()
+    return 1 - residuo / total
+
+
+def importancia_permutacion_columna(
+    model, X, y, columna, n_repeats=30, random_state=42
+):
+    """
+    Calcula la importancia por permutación de una única columna: la caída del R² del modelo al
+    permutar aleatoriamente esa columna. Todas las repeticiones se apilan en una sola llamada a
+    predict y el resultado se guarda por (modelo, huella de los datos, columna), de modo que
+    los gráficos y los informes que lo vuelven a pedir no repiten el cálculo. Si el modelo se
+    vuelve a ajustar, sus resultados guardados se descartan.
+
+    Parameters
+    ----------
+    model : sklearn.Model
+        Modelo ajustado.
+    X : pandas.DataFrame
+        Variables predictoras del modelo, en el orden de entrenamiento.
+    y : pandas.Series
+        Variable objetivo.
+    columna : str
+        Columna de X a permutar.
+    n_repeats : int
+        Número de permutaciones.
+    random_state : int
+        Semilla de las permutaciones.
+
+    Returns
+    -------
+    dict
+        Diccionario con 'importances_mean', 'importances_std' e 'importances' (la caída de R²
+        en cada repetición).
+    """
+    clave = (huella_datos(X, y), columna, n_repeats, random_state)
+    huella_modelo = _huella_ajuste(model)
+    huella_guardada, por_modelo = _cache.get(model, (None, {}))
+    if huella_guardada != huella_modelo:
+        por_modelo = {}
+        _cache[model] = (huella_modelo, por_modelo)
+    if clave in por_modelo:
+        contar("importancia.aciertos")
+        return por_modelo[clave]
+    contar("importancia.fallos")
+
+    rng = np.random.RandomState(random_state)
+    X_np = X.to_numpy()
+    y_np = np.asarray(y, dtype=float)
+    n = X_np.shape[0]
+    j = X.columns.get_loc(columna)
+    base = _r2_repeticiones(y_np, np.asarray(model.predict(X), dtype=float))
+
+    # Apilamos las repeticiones y permutamos solo la columna pedida en cada bloque
+    apilado = np.tile(X_np, (n_repeats, 1))
+    for r in range(n_repeats):
+        apilado[r * n : (r + 1) * n, j] = X_np[rng.permutation(n), j]
+    pred = model.predict(pd.DataFrame(apilado, columns=X.columns))
+    scores = _r2_repeticiones(y_np, np.asarray(pred, dtype=float).reshape(n_repeats, n))
+
+    importancias = base - scores
+    resultado = {
+        "importances_mean": importancias.mean(),
+        "importances_std": importancias.std(),
+        "importances": importancias,
+    }
+    por_modelo[clave] = resultado
+    return resultado
+
+
+def importancia_variable_interes(
+    best_models,
+    X,
+    y,
+    variables_importantes,
+    variable_interes="INC_SMI_REAL",
+    n_repeats=30,
+    random_state=42,
+):
+    """
+    Calcula la importancia por permutación de una variable en el modelo de cada variable
+    objetivo que la utiliza como predictora.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    y : pandas.DataFrame
+        Conjunto de datos con las variables objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    variable_interes : str
+        Variable cuya importancia se calcula.
+
+    Returns
+    -------
+    pandas.DataFrame
+        DataFrame con las columnas 'Variable', 'Importancia' y 'Modelo' (variable objetivo).
+    """
+    filas = []
+    for target_variable, model in best_models.items():
+        predictors = list(variables_importantes[target_variable])
+        if variable_interes not in predictors:
+            continue
+        resultado = importancia_permutacion_columna(
+            model,
+            X[predictors],
+            y[target_variable],
+            variable_interes,
+            n_repeats=n_repeats,
+            random_state=random_state,
+        )
+        filas.append(
+            {
+                "Variable": variable_interes,
+                "Importancia": resultado["importances_mean"],
+                "Modelo": target_variable,
+            }
+        )
+    return pd.DataFrame(filas, columns=["Variable", "Importancia", "Modelo"])
+
+
+def limpiar_cache():
+    """
+    Elimina todos los resultados de importancia guardados.
+    """
+    _cache.clear()
@@ -0,0 +1,317 @@
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from joblib import Parallel, delayed, effective_n_jobs
+from bosque_empaquetado import BosqueEmpaquetado, es_modelo_arboles
+from simulacion import increase_vars_batch
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+
+def _es_bosque(model):
+    # Random Forest o Extra Trees: cada árbol es ya una réplica bootstrap del modelo
+    return (
+        es_modelo_arboles(model)
+        and not hasattr(model, "tree_")
+        and not hasattr(model, "learning_rate")
+    )
+
+
+def _agrupar_bosques(bosques, escalas, bases):
+    # Une varios bosques empaquetados en uno solo. Todos los grupos tienen el mismo número de
+    # árboles, de modo que las raíces forman una matriz (grupos × árboles por grupo).
+    partes = {k: [] for k in ("feature", "threshold", "left", "right", "value")}
+    raices = []
+    desplazamiento = 0
+    for bosque, escala in zip(bosques, escalas):
+        hoja = bosque.feature < 0
+        partes["feature"].append(bosque.feature)
+        partes["threshold"].append(bosque.threshold)
+        partes["left"].append(np.where(hoja, -1, bosque.left + desplazamiento))
+        partes["right"].append(np.where(hoja, -1, bosque.right + desplazamiento))
+        partes["value"].append(bosque.value * escala)
+        raices.append(bosque.roots + desplazamiento)
+        desplazamiento += len(bosque.feature)
+    arrays = {k: np.concatenate(v) for k, v in partes.items()}
+    bosque = BosqueEmpaquetado(
+        **arrays,
+        roots=np.vstack(raices),
+        base=0.0,
+        escala=1.0,
+        feature_names=bosques[0].feature_names_in_,
+    )
+    return bosque, np.asarray(bases, dtype=float)
+
+
+class ReplicasModelo:
+    """
+    Conjunto de B réplicas de un modelo ajustado, evaluadas en bloque:
+
+    - 'lineal': matriz de coeficientes (B × variables) e interceptos.
+    - 'arboles': todos los árboles de todas las réplicas en un único bosque empaquetado,
+      agrupados por réplica.
+    - 'modelos': lista de modelos, evaluados uno a uno (por ejemplo SVR).
+
+    Parameters
+    ----------
+    tipo : str
+        Tipo de representación ('lineal', 'arboles' o 'modelos').
+    columnas : list
+        Variables predictoras en el orden de entrenamiento.
+    """
+
+    def __init__(
+        self,
+        tipo,
+        columnas,
+        coeficientes=None,
+        interceptos=None,
+        bosque=None,
+        bases=None,
+        modelos=None,
+    ):
+        self.tipo = tipo
+        self.columnas = list(columnas)
+        self.coeficientes = coeficientes
+        self.interceptos = interceptos
+        self.bosque = bosque
+        self.bases = bases
+        self.modelos = modelos
+
+    @property
+    def n_replicas(self):
+        if self.tipo == "lineal":
+            return len(self.interceptos)
+        if self.tipo == "arboles":
+            return len(self.bases)
+        return len(self.modelos)
+
+    @classmethod
+    def desde_modelos(cls, modelos, columnas):
+        """
+        Agrupa una lista de réplicas ajustadas en la representación más rápida disponible.
+        """
+        if all(hasattr(m, "coef_") for m in modelos):
+            return cls(
+                "lineal",
+                columnas,
+                coeficientes=np.vstack([np.ravel(m.coef_) for m in modelos]),
+                interceptos=np.array([np.ravel(m.intercept_)[0] for m in modelos]),
+            )
+        if all(es_modelo_arboles(m) for m in modelos):
+            bosques = [BosqueEmpaquetado.desde_modelo(m) for m in modelos]
+            if len({b.n_arboles for b in bosques}) == 1:
+                bosque, bases = _agrupar_bosques(
+                    bosques, [b.escala for b in bosques], [b.base for b in bosques]
+                )
+                return cls("arboles", columnas, bosque=bosque, bases=bases)
+        return cls("modelos", columnas, modelos=list(modelos))
+
+    @classmethod
+    def desde_bosque(cls, model, columnas, n_replicas=None, random_state=42):
+        """
+        Usa los árboles de un Random Forest ya ajustado como réplicas. Si se pide un número de
+        réplicas distinto del número de árboles, se muestrean árboles con reemplazamiento.
+        """
+        bosque = BosqueEmpaquetado.desde_modelo(model)
+        indices = np.arange(bosque.n_arboles)
+        if n_replicas is not None and n_replicas != bosque.n_arboles:
+            rng = np.random.RandomState(random_state)
+            indices = rng.choice(
+                bosque.n_arboles, n_replicas, replace=n_replicas > bosque.n_arboles
+            )
+        bosque.roots = bosque.roots[indices][:, None]
+        return cls("arboles", columnas, bosque=bosque, bases=np.zeros(len(indices)))
+
+    def predict_filas(self, X, replicas=None):
+        """
+        Predicción de la réplica replicas[i] para la fila i de X (una trayectoria por réplica).
+        """
+        if replicas is None:
+            replicas = np.arange(self.n_replicas)
+        replicas = np.asarray(replicas)
+        if self.tipo == "lineal":
+            A = np.asarray(X[self.columnas], dtype=float)
+            return (
+                np.einsum("ij,ij->i", A, self.coeficientes[replicas])
+                + self.interceptos[replicas]
+            )
+        if self.tipo == "arboles":
+            b = self.bosque
+            A = b._matriz(X[self.columnas])
+            filas = np.arange(A.shape[0])[:, None]
+            nodos = b.roots[replicas].copy()
+            activos = b.feature[nodos] >= 0
+            while activos.any():
+                f = b.feature[nodos]
+                izquierda = A[filas, np.maximum(f, 0)] <= b.threshold[nodos]
+                siguiente = np.where(izquierda, b.left[nodos], b.right[nodos])
+                nodos = np.where(activos, siguiente, nodos)
+                activos = b.feature[nodos] >= 0
+            return self.bases[replicas] + b.value[nodos].sum(axis=1)
+        X_var = X[self.columnas]
+        return np.array(
+            [
+                np.ravel(self.modelos[r].predict(X_var.iloc[[i]]))[0]
+                for i, r in enumerate(replicas)
+            ]
+        )
+
+
+def _ajustar_replicas(model, X_np, y_np, columnas, semillas):
+    # Ajusta una réplica por semilla sobre una muestra bootstrap de las filas
+    from sklearn.base import clone
+
+    modelos = []
+    n = X_np.shape[0]
+    for semilla in semillas:
+        idx = np.random.RandomState(semilla).randint(0, n, n)
+        replica = clone(model)
+        if "random_state" in replica.get_params():
+            replica.set_params(random_state=semilla)
+        replica.fit(pd.DataFrame(X_np[idx], columns=columnas), y_np[idx])
+        modelos.append(replica)
+    return modelos
+
+
+def replicas_bootstrap(
+    best_models,
+    X,
+    y,
+    variables_importantes,
+    B=200,
+    usar_arboles=True,
+    random_state=42,
+    n_jobs=-1,
+):
+    """
+    Construye B réplicas de cada mejor modelo para estimar la incertidumbre de la simulación.
+    En los Random Forest se usan directamente los árboles del bosque (si usar_arboles=True);
+    en el resto de modelos se ajustan B copias sobre muestras bootstrap de las filas del panel,
+    repartidas entre procesos que comparten los datos como memoria mapeada de solo lectura.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    y : pandas.DataFrame
+        Conjunto de datos con las variables objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    B : int
+        Número de réplicas.
+    n_jobs : int
+        Número de procesos para ajustar las réplicas.
+
+    Returns
+    -------
+    dict
+        Diccionario {variable objetivo: ReplicasModelo}.
+    """
+    rng = np.random.RandomState(random_state)
+    replicas = {}
+    for target_variable, model in best_models.items():
+        columnas = list(variables_importantes[target_variable])
+        if usar_arboles and _es_bosque(model):
+            replicas[target_variable] = ReplicasModelo.desde_bosque(
+                model, columnas, B, random_state
+            )
+            continue
+        semillas = rng.randint(0, 2**31 - 1, B)
+        X_np = X[columnas].to_numpy(dtype=float)
+        y_np = y[target_variable].to_numpy(dtype=float)
+        bloques = np.array_split(semillas, min(effective_n_jobs(n_jobs), B))
+        resultados = Parallel(n_jobs=n_jobs, max_nbytes=0)(
+            delayed(_ajustar_replicas)(model, X_np, y_np, columnas, b)
+            for b in bloques
+            if len(b)
+        )
+        replicas[target_variable] = ReplicasModelo.desde_modelos(
+            [m for r in resultados for m in r], columnas
+        )
+    return replicas
+
+
+def _simular_replicas(df, incrementos, replicas, indices, variable):
+    # Simula a la vez una trayectoria por réplica (una fila por réplica)
+    estado = pd.concat([df.iloc[[0]]] * len(indices), ignore_index=True)
+    evolution = []
+    for step, inc in enumerate(incrementos):
+        estado[variable] = inc
+        paso = estado.copy()
+        paso["paso"] = step
+        paso["replica"] = indices
+        evolution.append(paso)
+        increases = {t: r.predict_filas(estado, indices) for t, r in replicas.items()}
+        estado = increase_vars_batch(increases, estado)
+    return pd.concat(evolution, ignore_index=True)
+
+
+def simulacion_incertidumbre(
+    df,
+    incrementos,
+    replicas,
+    cuantiles=(0.05, 0.5, 0.95),
+    variable="INC_SMI_REAL",
+    n_jobs=1,
+):
+    """
+    Propaga las réplicas de los modelos a lo largo de una senda de incrementos del salario
+    mínimo (por ejemplo la columna INC_SMI_REAL devuelta por `simulacion.simulacion_smi`) y
+    devuelve bandas de cuantiles para cada variable y paso. Cada réplica sigue su propia
+    trayectoria y todas se evalúan en bloque en cada paso; con n_jobs > 1 las réplicas se
+    reparten entre procesos.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        DataFrame con el estado de partida (una fila), como en simulacion_smi
+    incrementos : array-like
+        Incremento del salario mínimo aplicado en cada paso
+    replicas : dict
+        Réplicas de cada variable objetivo devueltas por `replicas_bootstrap`
+    cuantiles : tuple
+        Cuantiles de las bandas
+
+    Returns
+    -------
+    pd.DataFrame
+        Bandas con una fila por paso y variable, la media y una columna por cuantil
+    pd.DataFrame
+        Trayectorias de todas las réplicas (columnas 'paso' y 'replica')
+    """
+    n_replicas = {r.n_replicas for r in replicas.values()}
+    if len(n_replicas) != 1:
+        raise ValueError(
+            "Todas las variables objetivo deben tener el mismo número de réplicas"
+        )
+    indices = np.arange(n_replicas.pop())
+    incrementos = np.asarray(incrementos, dtype=float)
+
+    if n_jobs == 1:
+        trayectorias = _simular_replicas(df, incrementos, replicas, indices, variable)
+    else:
+        bloques = np.array_split(indices, min(effective_n_jobs(n_jobs), len(indices)))
+        trayectorias = pd.concat(
+            Parallel(n_jobs=n_jobs)(
+                delayed(_simular_replicas)(df, incrementos, replicas, b, variable)
+                for b in bloques
+            ),
+            ignore_index=True,
+        )
+
+    columnas = [
+        c for c in df.columns if c != variable and pd.api.types.is_numeric_dtype(df[c])
+    ]
+    largo = trayectorias.melt(
+        id_vars=["paso", "replica"], value_vars=columnas, var_name="Variable"
+    )
+    agrupado = largo.groupby(["paso", "Variable"])["value"]
+    bandas = agrupado.quantile(list(cuantiles)).unstack()
+    bandas.columns = [f"q{q:g}" for q in cuantiles]
+    bandas.insert(0, "media", agrupado.mean())
+    return bandas.reset_index(), trayectorias
@@ -0,0 +1,256 @@
+import os
+import json
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+_DATOS = "panel.npy"
+_PRESENTE = "presente.npy"
+_COORDENADAS = "coordenadas.json"
+
+
+class AlmacenPanel:
+    """
+    Panel comunidad × periodo guardado en un array contiguo float64 de forma
+    (regiones × periodos × variables). Las regiones y los periodos se localizan con
+    diccionarios, por lo que el acceso a una fila, a un valor o a una columna completa no
+    recorre el panel, a diferencia de las máscaras df[(df.ccaa == r) & (df.periodo == p)].
+
+    Las combinaciones que no están en el panel original quedan a NaN y se distinguen con la
+    máscara `presente`. Las instantáneas (`instantanea`) y los paneles cargados de disco son de
+    solo lectura, de modo que se pueden compartir entre hilos o procesos sin copiarlos (los
+    cargados con mmap=True comparten además las páginas del fichero).
+
+    Parameters
+    ----------
+    datos : numpy.ndarray
+        Array (regiones × periodos × variables).
+    presente : numpy.ndarray
+        Máscara booleana (regiones × periodos) de las filas que existen en el panel.
+    regiones, periodos, columnas : list
+        Coordenadas de cada eje.
+    col_region, col_periodo : str
+        Nombre de las columnas de región y periodo al convertir a DataFrame.
+    """
+
+    def __init__(
+        self,
+        datos,
+        presente,
+        regiones,
+        periodos,
+        columnas,
+        col_region="ccaa",
+        col_periodo="periodo",
+    ):
+        self.datos = datos
+        self.presente = presente
+        self.regiones = list(regiones)
+        self.periodos = list(periodos)
+        self.columnas = list(columnas)
+        self.col_region = col_region
+        self.col_periodo = col_periodo
+        self._i_region = {r: i for i, r in enumerate(self.regiones)}
+        self._i_periodo = {p: i for i, p in enumerate(self.periodos)}
+        self._i_columna = {c: i for i, c in enumerate(self.columnas)}
+        self._indice_regiones = pd.Index(self.regiones)
+        self._indice_periodos = pd.Index(self.periodos)
+
+    @classmethod
+    def desde_dataframe(cls, df, col_region="ccaa", col_periodo="periodo", columnas=None):
+        """
+        Crea el almacén a partir de un panel en formato largo (una fila por región y periodo).
+        Por defecto se guardan todas las columnas numéricas.
+        """
+        if columnas is None:
+            columnas = [
+                c
+                for c in df.columns
+                if c not in (col_region, col_periodo)
+                and pd.api.types.is_numeric_dtype(df[c])
+            ]
+        if df.duplicated([col_region, col_periodo]).any():
+            raise ValueError(f"Hay filas repetidas de {col_region} y {col_periodo}")
+        regiones = sorted(df[col_region].unique())
+        periodos = sorted(int(p) for p in df[col_periodo].unique())
+        ir = pd.Index(regiones).get_indexer(df[col_region])
+        ip = pd.Index(periodos).get_indexer(df[col_periodo].astype(int))
+
+        datos = np.full((len(regiones), len(periodos), len(columnas)), np.nan)
+        datos[ir, ip] = df[columnas].to_numpy(dtype=float)
+        presente = np.zeros((len(regiones), len(periodos)), dtype=bool)
+        presente[ir, ip] = True
+        return cls(datos, presente, regiones, periodos, columnas, col_region, col_periodo)
+
+    # ----------------------------------------------------------------------------------------
+    # Acceso
+    # ----------------------------------------------------------------------------------------
+
+    def existe(self, ccaa, periodo):
+        i = self._i_region.get(ccaa)
+        j = self._i_periodo.get(periodo)
+        return i is not None and j is not None and bool(self.presente[i, j])
+
+    def _posicion(self, ccaa, periodo):
+        if not self.existe(ccaa, periodo):
+            raise KeyError(f"No hay datos de {ccaa} en {periodo}")
+        return self._i_region[ccaa], self._i_periodo[periodo]
+
+    def fila(self, ccaa, periodo):
+        """
+        Vector con todas las variables de una comunidad y periodo (vista, sin copia).
+        """
+        i, j = self._posicion(ccaa, periodo)
+        return self.datos[i, j]
+
+    def valor(self, ccaa, periodo, columna):
+        i, j = self._posicion(ccaa, periodo)
+        return float(self.datos[i, j, self._i_columna[columna]])
+
+    def columna(self, columna):
+        """
+        Matriz (regiones × periodos) de una variable (vista, sin copia).
+        """
+        return self.datos[:, :, self._i_columna[columna]]
+
+    def estado(self, ccaa, periodo, columnas=None):
+        """
+        DataFrame de una fila con el estado de una comunidad en un periodo, como el que reciben
+        simulacion.simulacion_smi o simulacion.model_prediction.
+        """
+        fila = self.fila(ccaa, periodo)
+        if columnas is None:
+            return pd.DataFrame([fila], columns=self.columnas)
+        return pd.DataFrame(
+            [fila[self.indices_columnas(columnas)]], columns=list(columnas)
+        )
+
+    def indices_columnas(self, columnas):
+        return [self._i_columna[c] for c in columnas]
+
+    def indices_regiones(self, regiones):
+        """
+        Posición de cada región en el primer eje (-1 si no está en el panel).
+        """
+        return self._indice_regiones.get_indexer(np.asarray(regiones, dtype=object))
+
+    def posiciones(self, regiones, periodos):
+        """
+        Posiciones de varias filas a la vez. Devuelve los índices de región y periodo (-1 si no
+        existen) y una máscara de las filas presentes en el panel.
+        """
+        ir = self.indices_regiones(regiones)
+        ip = self._indice_periodos.get_indexer(np.asarray(periodos))
+        validas = (ir >= 0) & (ip >= 0)
+        presentes = validas.copy()
+        presentes[validas] = self.presente[ir[validas], ip[validas]]
+        return ir, ip, presentes
+
+    def filas(self, regiones, periodos, columnas=None):
+        """
+        Array (filas × variables) con las filas pedidas; las que no existen quedan a NaN.
+
+        Returns
+        -------
+        numpy.ndarray
+            Valores de las filas.
+        numpy.ndarray
+            Máscara de las filas presentes en el panel.
+        """
+        ir, ip, presentes = self.posiciones(regiones, periodos)
+        indices = slice(None) if columnas is None else self.indices_columnas(columnas)
+        n_columnas = len(self.columnas) if columnas is None else len(columnas)
+        valores = np.full((len(ir), n_columnas), np.nan)
+        valores[presentes] = self.datos[ir[presentes], ip[presentes]][:, indices]
+        return valores, presentes
+
+    def completas(self, columnas):
+        """
+        Máscara (regiones × periodos) de las filas presentes con todas las columnas informadas.
+        """
+        indices = self.indices_columnas(columnas)
+        return self.presente & ~np.isnan(self.datos[:, :, indices]).any(axis=2)
+
+    def a_dataframe(self, columnas=None):
+        """
+        Panel en formato largo con las filas presentes, ordenado por región y periodo.
+        """
+        ir, ip = np.nonzero(self.presente)
+        columnas = self.columnas if columnas is None else list(columnas)
+        df = pd.DataFrame(
+            self.datos[ir, ip][:, self.indices_columnas(columnas)], columns=columnas
+        )
+        df.insert(0, self.col_periodo, np.asarray(self.periodos)[ip])
+        df.insert(0, self.col_region, np.asarray(self.regiones, dtype=object)[ir])
+        return df
+
+    # ----------------------------------------------------------------------------------------
+    # Instantáneas y disco
+    # ----------------------------------------------------------------------------------------
+
+    def instantanea(self):
+        """
+        Copia de solo lectura del estado actual. Los cambios posteriores en este almacén no le
+        afectan y se puede pasar a hilos o procesos sin volver a copiarla.
+        """
+        if not self.datos.flags.writeable and not self.presente.flags.writeable:
+            return self
+        datos = self.datos.copy()
+        presente = self.presente.copy()
+        datos.flags.writeable = False
+        presente.flags.writeable = False
+        return AlmacenPanel(
+            datos,
+            presente,
+            self.regiones,
+            self.periodos,
+            self.columnas,
+            self.col_region,
+            self.col_periodo,
+        )
+
+    def guardar(self, ruta):
+        os.makedirs(ruta, exist_ok=True)
+        np.save(os.path.join(ruta, _DATOS), np.ascontiguousarray(self.datos))
+        np.save(os.path.join(ruta, _PRESENTE), self.presente)
+        with open(os.path.join(ruta, _COORDENADAS), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "regiones": [str(r) for r in self.regiones],
+                    "periodos": [int(p) for p in self.periodos],
+                    "columnas": [str(c) for c in self.columnas],
+                    "col_region": self.col_region,
+                    "col_periodo": self.col_periodo,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        return ruta
+
+    @classmethod
+    def cargar(cls, ruta, mmap=True):
+        """
+        Carga un almacén guardado con `guardar`, de solo lectura. Con mmap=True los datos se
+        abren como memoria mapeada y los procesos que usan el mismo fichero comparten memoria.
+        """
+        with open(os.path.join(ruta, _COORDENADAS), encoding="utf-8") as f:
+            coordenadas = json.load(f)
+        modo = "r" if mmap else None
+        datos = np.load(os.path.join(ruta, _DATOS), mmap_mode=modo)
+        presente = np.load(os.path.join(ruta, _PRESENTE), mmap_mode=modo)
+        if not mmap:
+            datos.flags.writeable = False
+            presente.flags.writeable = False
+        return cls(
+            datos,
+            presente,
+            coordenadas["regiones"],
+            coordenadas["periodos"],
+            coordenadas["columnas"],
+            coordenadas["col_region"],
+            coordenadas["col_periodo"],
+        )
@@ -0,0 +1,787 @@
+"""
+Ejecuta el flujo de trabajo completo (descarga de la AEAT, formateo de las fuentes,
+combinación, imputación, retardos, selección de variables, torneo de modelos, registro y
+simulación) como un grafo de etapas con caché direccionada por contenido.
+
+La clave de cada etapa es la huella de su código, de sus parámetros, de los ficheros que lee y
+de las salidas de las etapas de las que depende. Una etapa solo se ejecuta si su clave ha
+cambiado (o si alguno de los ficheros que escribe ya no coincide con el guardado), de modo que
+al cambiar un parámetro solo se recalculan las etapas posteriores. Las etapas independientes
+se ejecutan en paralelo en procesos separados.
+
+Uso (desde este directorio):
+    python pipeline.py                          # todas las etapas
+    python pipeline.py seleccion                # hasta la selección de variables
+    python pipeline.py --config config.json     # parámetros distintos a los de por defecto
+    python pipeline.py --plan                   # muestra qué etapas están al día
+    python pipeline.py --forzar imputacion      # vuelve a ejecutar una etapa
+
+El fichero de configuración solo necesita los parámetros que cambian, por etapa:
+    {"imputacion": {"n_neighbors": 3}, "seleccion": {"num_variables": 6}}
+"""
+
+import os
+import sys
+import json
+import time
+import copy
+import hashlib
+import inspect
+import argparse
+import tempfile
+import contextlib
+import subprocess
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+FUNCIONES = os.path.dirname(os.path.abspath(__file__))
+CODIGO = os.path.normpath(os.path.join(FUNCIONES, "..", "..", ".."))
+MAIN = os.path.join(CODIGO, "main_code_tfm")
+DATOS = os.path.normpath(os.path.join(CODIGO, "..", "data"))
+PROCESADOS = os.path.normpath(os.path.join(CODIGO, "..", "processed_data"))
+CACHE = os.path.normpath(os.path.join(CODIGO, "..", "cache_pipeline"))
+_ESTADO = "estado.json"
+
+# Variables del panel usadas en el trabajo
+VARIABLES = [
+    "ccaa",
+    "periodo",
+    "SMI_VIDA",
+    "SMI_MEDIO",
+    "EMPRESAS_10",
+    "EMPRESAS_20",
+    "EMPRESAS_50",
+    "PARO_1_AÑO",
+    "EMP_1_5",
+    "PARO_25",
+    "OC_CONSTRUCCION",
+    "OC_SERVICIOS",
+    "PARO",
+    "PIB_CAPITA",
+    "PROD_HORA",
+    "CARENCIA",
+    "RIESGO_POBREZA",
+    "INC_SMI_REAL",
+    "DESIGUALDAD",
+    "PARCIAL",
+    "IPC",
+    "HORAS_TRABAJO",
+]
+NUM_VAR = [v for v in VARIABLES if v not in ("ccaa", "periodo")]
+NUM_VAR_DELTA = [v for v in NUM_VAR if v != "INC_SMI_REAL"]
+
+CONFIG_DEFECTO = {
+    "aeat": {},
+    "formateo": {},
+    "combinar": {
+        # Argumento de data_format.combinar_tablas -> fichero de processed_data
+        "fuentes": {
+            "gasto_basico": "gasto_ipc_ipri/gasto_hogar.csv",
+            "smi": "salarios/salarios_smis_aeat.csv",
+            "pobreza": "pobreza/riesgo_pobreza.csv",
+            "desigualdad": "pobreza/desigualdad.csv",
+            "salarios_ocupacion": "salarios/ocupacion.csv",
+            "salarios_smis": "salarios/salarios_smis_aeat.csv",
+            "empresas": "empresas/empresas.csv",
+            "ipc": "gasto_ipc_ipri/ipc.csv",
+            "pib_per_capita": "pib/pib_per_capita.csv",
+            "productividad_hora": "productividad/productividad_ccaa.csv",
+            "carencia": "pobreza/carencia_material.csv",
+            "empleo_hora": "productividad/productividad_ccaa.csv",
+            "paro": "paro/parados.csv",
+            "paro_duracion": "paro/parados_tiempo.csv",
+            "ocupados_jornada": "trabajo/ocupados_jornada.csv",
+        },
+    },
+    "formato": {"variables": VARIABLES},
+    "imputacion": {"n_neighbors": 2},
+    "retardos": {"variables": NUM_VAR_DELTA, "periodos": 1},
+    "conjuntos": {"predictoras": NUM_VAR, "periodo_max": 2019},
+    "seleccion": {
+        "n_estimadores": 100,
+        "metodo": "importancia_nativa",
+        "umbral_importancia": 0.95,
+        "num_variables": 8,
+        "variables_forzadas": ["INC_SMI_REAL"],
+    },
+    # Familias de evaluacion_modelo.familias_por_defecto() (None para todas)
+    "torneo": {"familias": None},
+    "registro": {"ruta": "../modelos"},
+    "simulacion": {
+        "ccaa": "Madrid, Comunidad de",
+        "periodo": 2015,
+        "min_inc": 0,
+        "max_inc": 0.1,
+        "pasos": 5,
+        "pesos": {
+            "PIB_CAPITA_delta1": 0.5,
+            "PROD_HORA_delta1": 0.5,
+            "PARO_25_delta1": -0.5,
+            "IPC_delta1": -0.5,
+        },
+    },
+}
+
+
+class Etapa:
+    """
+    Etapa del flujo de trabajo. `funcion(entradas, parametros)` recibe un diccionario con la
+    salida de cada dependencia y devuelve la salida de la etapa, que se guarda con joblib.
+
+    Parameters
+    ----------
+    nombre : str
+        Nombre de la etapa.
+    funcion : callable
+        Función que ejecuta la etapa.
+    dependencias : tuple
+        Etapas cuya salida necesita.
+    ficheros : callable
+        Función de los parámetros que devuelve los ficheros que lee la etapa.
+    salidas : tuple
+        Ficheros que escribe la etapa fuera de la caché (por ejemplo los de los notebooks).
+    codigo : tuple
+        Módulos (por nombre) y funciones auxiliares cuyo código forma parte de la clave.
+    """
+
+    def __init__(self, nombre, funcion, dependencias, ficheros, salidas, codigo):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.dependencias = tuple(dependencias)
+        self.ficheros = ficheros
+        self.salidas = tuple(salidas)
+        self.codigo = tuple(codigo)
+
+    def texto_codigo(self):
+        # Código fuente de la etapa, de sus funciones auxiliares y de los módulos que usa
+        partes = [inspect.getsource(self.funcion)]
+        for c in self.codigo:
+            if isinstance(c, str):
+                with open(importlib.util.find_spec(c).origin, encoding="utf-8") as f:
+                    partes.append(f.read())
+            else:
+                partes.append(inspect.getsource(c))
+        return "\n".join(partes)
+
+
+# Registro de etapas en orden topológico (cada etapa se declara después de sus dependencias)
+ETAPAS = {}
+
+
+def etapa(nombre, dependencias=(), ficheros=(), salidas=(), codigo=()):
+    def decorador(funcion):
+        for d in dependencias:
+            if d not in ETAPAS:
+                raise ValueError(f"La etapa {nombre} depende de {d}, que no existe")
+        lista = ficheros if callable(ficheros) else (lambda parametros: list(ficheros))
+        ETAPAS[nombre] = Etapa(nombre, funcion, dependencias, lista, salidas, codigo)
+        return funcion
+
+    return decorador
+
+
+# --------------------------------------------------------------------------------------------
+# Huellas y estado
+# --------------------------------------------------------------------------------------------
+
+
+def huella_fichero(ruta, memo=None):
+    """
+    Huella SHA-1 del contenido de un fichero (None si no existe). Con `memo` se reutiliza la
+    huella calculada antes si el tamaño y la fecha de modificación no han cambiado.
+    """
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    firma = [info.st_size, info.st_mtime_ns]
+    if memo is not None and memo.get(ruta, [None, None])[:2] == firma:
+        return memo[ruta][2]
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(2**20), b""):
+            h.update(bloque)
+    huella = h.hexdigest()
+    if memo is not None:
+        memo[ruta] = firma + [huella]
+    return huella
+
+
+def clave_etapa(nombre, parametros, huellas_dependencias, memo=None):
+    """
+    Clave de una etapa: huella de su código, sus parámetros, los ficheros que lee y las salidas
+    de sus dependencias.
+    """
+    et = ETAPAS[nombre]
+    h = hashlib.sha1()
+    h.update(et.texto_codigo().encode())
+    h.update(json.dumps(parametros, sort_keys=True, default=str).encode())
+    for ruta in sorted(et.ficheros(parametros)):
+        h.update(f"{ruta}:{huella_fichero(ruta, memo)}".encode())
+    for dep in et.dependencias:
+        h.update(f"{dep}:{huellas_dependencias[dep]}".encode())
+    return h.hexdigest()
+
+
+def _leer_estado(ruta_cache):
+    fichero = os.path.join(ruta_cache, _ESTADO)
+    if not os.path.exists(fichero):
+        return {"etapas": {}, "ficheros": {}}
+    with open(fichero, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _guardar_estado(ruta_cache, estado):
+    # Escritura atómica para no dejar un estado a medias si se interrumpe la ejecución
+    os.makedirs(ruta_cache, exist_ok=True)
+    fichero = os.path.join(ruta_cache, _ESTADO)
+    temporal = fichero + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=1, ensure_ascii=False)
+    os.replace(temporal, fichero)
+
+
+def _al_dia(registro, clave, memo):
+    # La etapa está al día si su clave coincide, su salida sigue en la caché y los ficheros
+    # que escribió no han cambiado
+    if not registro or registro.get("clave") != clave:
+        return False
+    if not os.path.exists(registro["ruta"]):
+        return False
+    return all(
+        huella_fichero(ruta, memo) == huella
+        for ruta, huella in registro.get("salidas", {}).items()
+    )
+
+
+def cargar_config(config=None):
+    """
+    Parámetros de cada etapa: los de CONFIG_DEFECTO actualizados con los de `config` (ruta a
+    un JSON o diccionario {etapa: {parametro: valor}}).
+    """
+    resultado = copy.deepcopy(CONFIG_DEFECTO)
+    if config is None:
+        return resultado
+    if isinstance(config, str):
+        with open(config, encoding="utf-8") as f:
+            config = json.load(f)
+    for nombre, parametros in config.items():
+        if nombre not in ETAPAS:
+            raise ValueError(f"Etapa desconocida en la configuración: {nombre}")
+        resultado[nombre].update(parametros)
+    return resultado
+
+
+def _seleccionar(objetivos):
+    # Etapas necesarias para obtener los objetivos (ellos y sus dependencias), en orden
+    if not objetivos:
+        return list(ETAPAS)
+    necesarias = set()
+    pendientes = list(objetivos)
+    while pendientes:
+        nombre = pendientes.pop()
+        if nombre not in ETAPAS:
+            raise ValueError(f"Etapa desconocida: {nombre}")
+        if nombre not in necesarias:
+            necesarias.add(nombre)
+            pendientes.extend(ETAPAS[nombre].dependencias)
+    return [n for n in ETAPAS if n in necesarias]
+
+
+# --------------------------------------------------------------------------------------------
+# Ejecución
+# --------------------------------------------------------------------------------------------
+
+
+def _ejecutar_etapa(nombre, parametros, rutas_entradas, ruta_salida):
+    # Se ejecuta en un proceso del pool: carga las salidas de las dependencias, ejecuta la
+    # etapa y guarda su salida en la caché
+    import joblib
+
+    entradas = {dep: joblib.load(ruta) for dep, ruta in rutas_entradas.items()}
+    inicio = time.perf_counter()
+    resultado = ETAPAS[nombre].funcion(entradas, parametros)
+    duracion = time.perf_counter() - inicio
+    os.makedirs(os.path.dirname(ruta_salida), exist_ok=True)
+    temporal = f"{ruta_salida}.{os.getpid()}.tmp"
+    joblib.dump(resultado, temporal)
+    os.replace(temporal, ruta_salida)
+    return duracion
+
+
+def plan(objetivos=None, config=None, ruta_cache=CACHE):
+    """
+    Indica, sin ejecutar nada, qué etapas están al día y cuáles se ejecutarían (las que han
+    cambiado y todas las posteriores a ellas).
+
+    Returns
+    -------
+    dict
+        Diccionario {etapa: 'al día' o 'pendiente'}.
+    """
+    config = cargar_config(config)
+    estado = _leer_estado(ruta_cache)
+    memo = estado["ficheros"]
+    huellas = {}
+    resultado = {}
+    for nombre in _seleccionar(objetivos):
+        et = ETAPAS[nombre]
+        registro = estado["etapas"].get(nombre)
+        if all(d in huellas for d in et.dependencias):
+            clave = clave_etapa(nombre, config[nombre], huellas, memo)
+            if _al_dia(registro, clave, memo):
+                huellas[nombre] = registro["huella"]
+                resultado[nombre] = "al día"
+                continue
+        resultado[nombre] = "pendiente"
+    return resultado
+
+
+def ejecutar_pipeline(
+    objetivos=None, config=None, ruta_cache=CACHE, n_procesos=None, forzar=()
+):
+    """
+    Ejecuta las etapas necesarias para obtener `objetivos` (todas por defecto), saltando las
+    que están al día y ejecutando en paralelo las que no dependen entre sí.
+
+    Parameters
+    ----------
+    objetivos : list, optional
+        Etapas a obtener. Se ejecutan también sus dependencias si no están al día.
+    config : str o dict, optional
+        Parámetros de las etapas (ver cargar_config).
+    ruta_cache : str
+        Directorio de la caché: <ruta_cache>/<etapa>/<clave>.joblib y estado.json.
+    n_procesos : int, optional
+        Número máximo de etapas ejecutándose a la vez (por defecto el número de CPUs).
+    forzar : iterable
+        Etapas que se ejecutan aunque estén al día.
+
+    Returns
+    -------
+    dict
+        Diccionario {etapa: 'ejecutada' o 'al día'}.
+    """
+    config = cargar_config(config)
+    forzar = set(forzar)
+    estado = _leer_estado(ruta_cache)
+    memo = estado["ficheros"]
+    registros = estado["etapas"]
+    pendientes = _seleccionar(objetivos)
+    huellas = {}
+    resultado = {}
+    en_curso = {}
+
+    with ProcessPoolExecutor(max_workers=n_procesos) as ejecutor:
+        while pendientes or en_curso:
+            listas = [
+                n
+                for n in pendientes
+                if all(d in huellas for d in ETAPAS[n].dependencias)
+            ]
+            for nombre in listas:
+                pendientes.remove(nombre)
+                et = ETAPAS[nombre]
+                clave = clave_etapa(nombre, config[nombre], huellas, memo)
+                registro = registros.get(nombre)
+                if nombre not in forzar and _al_dia(registro, clave, memo):
+                    huellas[nombre] = registro["huella"]
+                    resultado[nombre] = "al día"
+                    print(f"{nombre:12s} al día")
+                    continue
+                ruta = os.path.join(ruta_cache, nombre, clave + ".joblib")
+                rutas_entradas = {d: registros[d]["ruta"] for d in et.dependencias}
+                futuro = ejecutor.submit(
+                    _ejecutar_etapa, nombre, config[nombre], rutas_entradas, ruta
+                )
+                en_curso[futuro] = (nombre, clave, ruta)
+                print(f"{nombre:12s} en ejecución")
+            if listas and not en_curso:
+                # Alguna etapa estaba al día: se revisan de nuevo las que dependen de ella
+                continue
+
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre, clave, ruta = en_curso.pop(futuro)
+                try:
+                    duracion = futuro.result()
+                except Exception:
+                    _guardar_estado(ruta_cache, estado)
+                    raise
+                huella = huella_fichero(ruta)
+                registros[nombre] = {
+                    "clave": clave,
+                    "ruta": ruta,
+                    "huella": huella,
+                    "salidas": {
+                        s: huella_fichero(s, memo) for s in ETAPAS[nombre].salidas
+                    },
+                    "duracion_s": round(duracion, 3),
+                    "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+                huellas[nombre] = huella
+                resultado[nombre] = "ejecutada"
+                print(f"{nombre:12s} ejecutada en {duracion:.1f} s")
+                _guardar_estado(ruta_cache, estado)
+
+    _guardar_estado(ruta_cache, estado)
+    return resultado
+
+
+def cargar_resultado(nombre, ruta_cache=CACHE):
+    """
+    Carga la última salida guardada de una etapa (por ejemplo desde un notebook).
+    """
+    import joblib
+
+    registro = _leer_estado(ruta_cache)["etapas"].get(nombre)
+    if registro is None:
+        raise ValueError(f"La etapa {nombre} no se ha ejecutado todavía")
+    return joblib.load(registro["ruta"])
+
+
+# --------------------------------------------------------------------------------------------
+# Etapas
+# --------------------------------------------------------------------------------------------
+
+
+def _ejecutar_notebook(notebook, salidas):
+    # Ejecuta el notebook con nbconvert en su propio directorio (sus rutas son relativas a él)
+    # y devuelve la huella de los ficheros que escribe
+    with tempfile.TemporaryDirectory() as temporal:
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "jupyter",
+                "nbconvert",
+                "--to",
+                "notebook",
+                "--execute",
+                "--ExecutePreprocessor.timeout=-1",
+                "--output-dir",
+                temporal,
+                os.path.join(CODIGO, notebook),
+            ],
+            check=True,
+            cwd=CODIGO,
+        )
+    return {os.path.relpath(s, PROCESADOS): huella_fichero(s) for s in salidas}
+
+
+def _ficheros_datos(parametros):
+    # Todos los ficheros de datos originales
+    return [
+        os.path.join(raiz, f) for raiz, _, fs in os.walk(DATOS) for f in fs
+    ] + [os.path.join(CODIGO, "format_dataset.ipynb")]
+
+
+_SALIDAS_AEAT = (os.path.join(PROCESADOS, "salarios", "salarios_smis_aeat.csv"),)
+_SALIDAS_FORMATEO = tuple(
+    os.path.join(PROCESADOS, *r.split("/"))
+    for r in [
+        "salarios/sector.csv",
+        "salarios/contrato.csv",
+        "salarios/ocupacion.csv",
+        "salarios/jornada.csv",
+        "gasto_ipc_ipri/ipc.csv",
+        "gasto_ipc_ipri/ipri.csv",
+        "gasto_ipc_ipri/gasto_hogar.csv",
+        "paro/parados.csv",
+        "paro/parados_tiempo.csv",
+        "trabajo/afiliacion.csv",
+        "trabajo/empleo_privado.csv",
+        "trabajo/horas_trabajadas.csv",
+        "trabajo/ocupados_sector.csv",
+        "trabajo/ocupados_jornada.csv",
+        "empresas/empresas.csv",
+        "pobreza/riesgo_pobreza.csv",
+        "pobreza/carencia_material.csv",
+        "pobreza/desigualdad.csv",
+        "productividad/productividad_ccaa.csv",
+        "pib/pib_per_capita.csv",
+    ]
+)
+
+
+@etapa(
+    "aeat",
+    ficheros=(
+        os.path.join(DATOS, "smi", "smi_2008_2024.xlsx"),
+        os.path.join(CODIGO, "colect_data_aeat.ipynb"),
+    ),
+    salidas=_SALIDAS_AEAT,
+    codigo=(_ejecutar_notebook,),
+)
+def etapa_aeat(entradas, parametros):
+    return _ejecutar_notebook("colect_data_aeat.ipynb", _SALIDAS_AEAT)
+
+
+@etapa(
+    "formateo",
+    ficheros=_ficheros_datos,
+    salidas=_SALIDAS_FORMATEO,
+    codigo=(_ejecutar_notebook,),
+)
+def etapa_formateo(entradas, parametros):
+    return _ejecutar_notebook("format_dataset.ipynb", _SALIDAS_FORMATEO)
+
+
+@contextlib.contextmanager
+def _directorio_trabajo(directorio):
+    anterior = os.getcwd()
+    os.chdir(directorio)
+    try:
+        yield
+    finally:
+        os.chdir(anterior)
+
+
+def _preparar_fuentes(tablas):
+    # Mismas transformaciones que el notebook del trabajo antes de combinar_tablas
+    import pandas as pd
+
+    gasto = tablas["gasto_basico"]
+    tablas["gasto_basico"] = (
+        gasto[
+            (gasto["tipo_gasto"] == "Gasto medio por persona")
+            & (gasto["tipo_dato"] == "Dato base")
+            & gasto.grupo_gasto.isin(
+                [
+                    "01 Alimentos y bebidas no alcohólicas",
+                    "04 Vivienda, agua, electricidad, gas y otros combustibles",
+                ]
+            )
+        ]
+        .groupby(["ccaa", "periodo"], as_index=False)
+        .sum(numeric_only=True)
+    )
+    tablas["smi"] = tablas["smi"][["periodo", "smi_14"]].drop_duplicates()
+
+    productividad = tablas["productividad_hora"]
+    productividad = productividad[productividad.periodo >= 2008]
+    tablas["productividad_hora"] = productividad[
+        (productividad["variable"] == "Productividad del trabajo por hora trabajada")
+        & (productividad.unidad == "Euros de 2015 por hora trabajada")
+    ]
+
+    productividad = tablas["empleo_hora"]
+    productividad = productividad[productividad.periodo >= 2008]
+    empleo = (
+        productividad[
+            (productividad.variable == "Empleo total")
+            & (productividad.unidad == "Miles de personas")
+        ]
+        .drop(["variable", "unidad"], axis=1)
+        .rename(columns={"total": "empleo"})
+    )
+    horas_trabajadas = (
+        productividad[
+            (productividad.variable == "Horas trabajadas totales")
+            & (productividad.unidad == "Millones de horas")
+        ]
+        .drop(["variable", "unidad"], axis=1)
+        .rename(columns={"total": "horas_trabajadas"})
+    )
+    empleo_hora = pd.merge(empleo, horas_trabajadas, on=["periodo", "ccaa"])
+    empleo_hora["empleo_hora"] = empleo_hora.horas_trabajadas / empleo_hora.empleo
+    tablas["empleo_hora"] = empleo_hora
+    return tablas
+
+
+def _ficheros_combinar(parametros):
+    # combinar_tablas lee además la tabla de ocupados por sector
+    rutas = {os.path.join(PROCESADOS, *r.split("/")) for r in parametros["fuentes"].values()}
+    return sorted(rutas | {os.path.join(PROCESADOS, "trabajo", "ocupados_sector.csv")})
+
+
+@etapa(
+    "combinar",
+    dependencias=("aeat", "formateo"),
+    ficheros=_ficheros_combinar,
+    codigo=("data_format", _preparar_fuentes),
+)
+def etapa_combinar(entradas, parametros):
+    import pandas as pd
+    import data_format as dformat
+
+    tablas = {
+        argumento: pd.read_csv(os.path.join(PROCESADOS, *ruta.split("/")))
+        for argumento, ruta in parametros["fuentes"].items()
+    }
+    tablas = _preparar_fuentes(tablas)
+    # combinar_tablas lee ../../processed_data/trabajo/ocupados_sector.csv
+    with _directorio_trabajo(MAIN):
+        return dformat.combinar_tablas(**tablas)
+
+
+@etapa("formato", dependencias=("combinar",), codigo=("data_format",))
+def etapa_formato(entradas, parametros):
+    import data_format as dformat
+
+    return dformat.format_total_merge(entradas["combinar"], parametros["variables"])
+
+
+@etapa("imputacion", dependencias=("formato",))
+def etapa_imputacion(entradas, parametros):
+    import pandas as pd
+    from sklearn.impute import KNNImputer
+
+    df = entradas["formato"]
+    knn_imputer = KNNImputer(n_neighbors=parametros["n_neighbors"])
+    data_numeric = df.drop(columns=["ccaa", "periodo"])
+    data_imputed_df = pd.DataFrame(
+        knn_imputer.fit_transform(data_numeric), columns=data_numeric.columns
+    )
+    data_imputed_df["ccaa"] = df["ccaa"].values
+    data_imputed_df["periodo"] = df["periodo"].values
+    return data_imputed_df
+
+
+@etapa("retardos", dependencias=("imputacion",), codigo=("data_format",))
+def etapa_retardos(entradas, parametros):
+    import data_format as dformat
+
+    df_delta = entradas["imputacion"].copy()
+    for var in parametros["variables"]:
+        df_delta = dformat.atrasar_año(
+            df_delta,
+            var,
+            year_col="periodo",
+            region_col="ccaa",
+            periodos=parametros["periodos"],
+            calc_delta=True,
+            drop_period_var=True,
+        )
+    return df_delta
+
+
+@etapa("conjuntos", dependencias=("retardos",))
+def etapa_conjuntos(entradas, parametros):
+    # X con las variables de estado e y con los incrementos del año siguiente; los últimos
+    # periodos no tienen incremento
+    df_delta = entradas["retardos"]
+    cond = df_delta["periodo"] <= parametros["periodo_max"]
+    X = df_delta[cond][parametros["predictoras"]]
+    y = df_delta[cond][[var for var in df_delta.columns if "delta" in var]]
+    return X, y
+
+
+@etapa("seleccion", dependencias=("conjuntos",), codigo=("seleccion_modelo",))
+def etapa_seleccion(entradas, parametros):
+    import seleccion_modelo as smod
+
+    X, y = entradas["conjuntos"]
+    df_importancia, _, variables_importantes = smod.calcular_importancia_variables_rf(
+        X,
+        y,
+        n_estimadores=parametros["n_estimadores"],
+        metodo=parametros["metodo"],
+        umbral_importancia=parametros["umbral_importancia"],
+        num_variables=parametros["num_variables"],
+        variables_forzadas=parametros["variables_forzadas"],
+    )
+    variables_importantes = {t: list(v) for t, v in variables_importantes.items()}
+    return variables_importantes, df_importancia
+
+
+@etapa(
+    "torneo", dependencias=("conjuntos", "seleccion"), codigo=("evaluacion_modelo",)
+)
+def etapa_torneo(entradas, parametros):
+    import evaluacion_modelo as em
+
+    X, y = entradas["conjuntos"]
+    variables_importantes, _ = entradas["seleccion"]
+    familias = None
+    if parametros["familias"] is not None:
+        familias = {
+            nombre: familia
+            for nombre, familia in em.familias_por_defecto().items()
+            if nombre in parametros["familias"]
+        }
+    best_models, resumen, tiempos = em.torneo_modelos(
+        X, y, variables_importantes, familias=familias
+    )
+    return best_models, resumen, tiempos
+
+
+@etapa(
+    "registro",
+    dependencias=("conjuntos", "seleccion", "torneo"),
+    codigo=("registro_modelos",),
+)
+def etapa_registro(entradas, parametros):
+    import registro_modelos as rm
+
+    X, y = entradas["conjuntos"]
+    variables_importantes, _ = entradas["seleccion"]
+    best_models, resumen, _ = entradas["torneo"]
+    return rm.guardar_registro(
+        os.path.join(CODIGO, parametros["ruta"]),
+        best_models,
+        variables_importantes,
+        X=X,
+        y=y,
+        metadatos={"origen": "pipeline"},
+        r2_validacion=dict(
+            zip(resumen["Variable Objetivo"], resumen["Mejor R2"])
+        ),
+    )
+
+
+def _objetivo_ponderado(inc, df, best_models, variables_importantes, pesos):
+    # Suma ponderada de los incrementos predichos, como la función del notebook del trabajo
+    import simulacion as sim
+
+    x = sim.model_prediction(inc, df, best_models, variables_importantes)
+    return sum(peso * x[target] for target, peso in pesos.items())
+
+
+@etapa(
+    "simulacion",
+    dependencias=("imputacion", "seleccion", "torneo"),
+    codigo=("simulacion", _objetivo_ponderado),
+)
+def etapa_simulacion(entradas, parametros):
+    import functools
+    import simulacion as sim
+
+    df = entradas["imputacion"]
+    variables_importantes, _ = entradas["seleccion"]
+    best_models, _, _ = entradas["torneo"]
+    df_set = df[
+        (df["ccaa"] == parametros["ccaa"]) & (df["periodo"] == parametros["periodo"])
+    ][NUM_VAR]
+    return sim.simulacion_smi(
+        parametros["min_inc"],
+        parametros["max_inc"],
+        df_set,
+        functools.partial(_objetivo_ponderado, pesos=parametros["pesos"]),
+        best_models,
+        variables_importantes,
+        parametros["pasos"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("etapas", nargs="*", help="etapas a obtener (todas por defecto)")
+    parser.add_argument("--config", help="JSON con los parámetros de las etapas")
+    parser.add_argument("--cache", default=CACHE, help="directorio de la caché")
+    parser.add_argument("-j", "--procesos", type=int, help="etapas en paralelo")
+    parser.add_argument("--forzar", action="append", default=[], help="etapa a repetir")
+    parser.add_argument("--plan", action="store_true", help="solo muestra el estado")
+    args = parser.parse_args()
+
+    if args.plan:
+        for nombre, estado in plan(args.etapas, args.config, args.cache).items():
+            print(f"{nombre:12s} {estado}")
+        return
+    ejecutar_pipeline(
+        args.etapas, args.config, args.cache, n_procesos=args.procesos, forzar=args.forzar
+    )
+
+
+if __name__ == "__main__":
+    main()
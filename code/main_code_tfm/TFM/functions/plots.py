@@ -1,14 +1,7 @@
-import pandas as pd
-import sklearn as sk
 import numpy as np
-import math
-import statsmodels.api as sm
 import warnings
-import seaborn as sns
-import matplotlib.pyplot as plt
 from pandas.errors import SettingWithCopyWarning
-from matplotlib.dates import AutoDateLocator
-from sklearn.inspection import permutation_importance
+from importancia import importancia_variable_interes
 
 warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
@@ -28,6 +21,10 @@ def create_basic_plot(
     save_path=None,
     label="Salario Mínimo",
 ):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.dates import AutoDateLocator
+
     # Set the Seaborn style for better aesthetics
     sns.set_style(style)
 
@@ -80,6 +77,10 @@ def create_dual_plot(
     secondary_y=False,
     save_path=None,
 ):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.dates import AutoDateLocator
+
     # Set the Seaborn style for better aesthetics
     sns.set_style(style)
 
@@ -174,6 +175,10 @@ def create_multi_category_plot(
     figsize=(12, 7),
     save_path=None,
 ):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from matplotlib.dates import AutoDateLocator
+
     if label is None:
         label = category_col
     # Set Seaborn style for better aesthetics
@@ -183,9 +188,12 @@ def create_multi_category_plot(
     plt.figure(figsize=figsize)
     unique_categories = data[category_col].unique()
     colors = sns.color_palette(palette, len(unique_categories))
+    # Las filas de cada categoría se separan en una sola pasada en lugar de una máscara por
+    # categoría
+    grupos = dict(tuple(data.groupby(category_col, sort=False)))
 
     for i, category in enumerate(unique_categories):
-        subset = data[data[category_col] == category]
+        subset = grupos.get(category, data.iloc[:0])
         plt.plot(
             subset[x_col],
             subset[y_col],
@@ -221,6 +229,9 @@ def create_multi_category_plot(
 
 
 def creat_corr_matrix(df, num_var, title="Mapa de calor de correlación"):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     correlation_matrix = df[num_var].corr()
 
     # Configurar el tamaño del gráfico
@@ -261,7 +272,9 @@ def create_category_subplots(
     """
     Create individual subplots for each category in the data with adjusted margins.
     """
+    import matplotlib.pyplot as plt
     import matplotlib.ticker as mticker
+    import seaborn as sns
 
     # Set Seaborn style for aesthetics
     sns.set_style(style)
@@ -271,6 +284,7 @@ def create_category_subplots(
     n_categories = len(unique_categories)
     n_rows = -(-n_categories // n_cols)  # Calculate rows (ceiling division)
     colors = sns.color_palette(palette, n_categories)
+    grupos = dict(tuple(data.groupby(category_col, sort=False)))
 
     # Create subplots
     fig, axes = plt.subplots(n_rows, n_cols, figsize=figsize, sharex=False, sharey=True)
@@ -278,7 +292,7 @@ def create_category_subplots(
 
     for i, category in enumerate(unique_categories):
         ax = axes[i]
-        subset = data[data[category_col] == category]
+        subset = grupos.get(category, data.iloc[:0])
         ax.plot(
             subset[x_col],
             subset[y_col],
@@ -326,6 +340,8 @@ def create_category_subplots(
 
 # Plot para la simulación
 def plot_simulacion(df_res_1, df_res_2, ccaa_1, ccaa_2, variables, n_columns=5):
+    import matplotlib.pyplot as plt
+
     vars = df_res_1.columns[1:]
 
     # Calcular el número de filas necesarias
@@ -366,40 +382,13 @@ def plot_simulacion(df_res_1, df_res_2, ccaa_1, ccaa_2, variables, n_columns=5):
 def plot_importancia_univariable(
     best_models, X, y, variables_importantes, variable_interes="INC_SMI_REAL"
 ):
-    # Diccionario para almacenar los resultados
-    importances_list = []
-
-    # Calcular la importancia para cada modelo
-    for target_variable, model in best_models.items():
-        # Obtener la importancia de las variables para el modelo
-        result = permutation_importance(
-            model,
-            X[variables_importantes[target_variable]],
-            y[target_variable],
-            n_repeats=30,
-            random_state=42,
-        )
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-        # Buscar la importancia de la variable de interés
-        if variable_interes in X[variables_importantes[target_variable]].columns:
-            temp_df = pd.DataFrame(
-                {
-                    "Variable": [variable_interes],
-                    "Importancia": [
-                        result.importances_mean[
-                            X[variables_importantes[target_variable]].columns.get_loc(
-                                variable_interes
-                            )
-                        ]
-                    ],
-                    "Modelo": [target_variable],
-                }
-            )
-            # Añadir el resultado a la lista
-            importances_list.append(temp_df)
-
-    # Combinar todos los DataFrames en uno solo
-    importances_df = pd.concat(importances_list, ignore_index=True)
+    # Calcular la importancia de la variable de interés para cada modelo
+    importances_df = importancia_variable_interes(
+        best_models, X, y, variables_importantes, variable_interes
+    )
 
     # Crear un gráfico de barras
     plt.figure(figsize=(8, 6))
@@ -417,6 +406,8 @@ def plot_importancia_univariable(
 
 
 def box_plot_var(df_num, nrows, ncols):
+    import matplotlib.pyplot as plt
+
     fig, axs = plt.subplots(
         nrows=nrows, ncols=ncols, figsize=(16, 10)
     )  # Ajustar filas y columnas
@@ -434,6 +425,8 @@ def box_plot_var(df_num, nrows, ncols):
 
 
 def plot_real_vs_simulacion(df_real, df_sim, variables, var_plot, n_cols=2):
+    import matplotlib.pyplot as plt
+
     n_rows = int(np.ceil(len(var_plot) / n_cols))
     fig, axs = plt.subplots(nrows=n_rows, ncols=n_cols)
     for i, var in enumerate(var_plot):
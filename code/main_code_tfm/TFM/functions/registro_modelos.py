@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import joblib
+import numpy as np
+import warnings
+from bosque_empaquetado import BosqueEmpaquetado, es_modelo_arboles
+
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+_MANIFIESTO = "manifiesto.json"
+_ACTUAL = "ACTUAL"
+
+
+def _nombre_fichero(i, target_variable):
+    # Nombre seguro para el sistema de ficheros a partir del nombre de la variable objetivo
+    return f"{i:02d}_" + re.sub(r"[^0-9A-Za-z_-]", "_", target_variable)
+
+
+def _versiones_libs():
+    versiones = {"numpy": np.__version__, "joblib": joblib.__version__}
+    try:
+        import sklearn
+
+        versiones["sklearn"] = sklearn.__version__
+    except ImportError:
+        pass
+    return versiones
+
+
+def listar_versiones(ruta):
+    """
+    Devuelve la lista de versiones guardadas en el registro, de la más antigua a la más reciente.
+    """
+    if not os.path.isdir(ruta):
+        return []
+    return sorted(
+        v
+        for v in os.listdir(ruta)
+        if os.path.exists(os.path.join(ruta, v, _MANIFIESTO))
+    )
+
+
+def version_actual(ruta):
+    """
+    Devuelve la versión activa del registro (la última guardada salvo que se cambie).
+    """
+    fichero = os.path.join(ruta, _ACTUAL)
+    if os.path.exists(fichero):
+        with open(fichero, encoding="utf-8") as f:
+            return f.read().strip()
+    versiones = listar_versiones(ruta)
+    return versiones[-1] if versiones else None
+
+
+def guardar_registro(
+    ruta,
+    best_models,
+    variables_importantes,
+    X=None,
+    y=None,
+    version=None,
+    metadatos=None,
+    r2_validacion=None,
+):
+    """
+    Guarda los mejores modelos en un registro versionado. Para cada variable objetivo se guarda
+    el estimador serializado, el orden de sus variables predictoras y, si es un modelo de
+    árboles, una copia empaquetada en arrays .npy que se puede cargar como memoria mapeada.
+
+    Parameters
+    ----------
+    ruta : str
+        Directorio raíz del registro.
+    best_models : dict
+        Diccionario con el modelo ajustado para cada variable objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    X, y : pandas.DataFrame, optional
+        Datos de entrenamiento, usados para guardar su huella.
+    version : str, optional
+        Nombre de la versión. Por defecto se numera automáticamente (v0001, v0002, ...).
+    metadatos : dict, optional
+        Información adicional a guardar en el manifiesto.
+    r2_validacion : dict, optional
+        R² de validación de cada variable objetivo (por ejemplo la columna 'Mejor R2' del
+        resumen de `evaluacion_modelo.torneo_modelos`). Es la referencia con la que
+        `actualizacion_modelos.actualizar_registro` mide la deriva.
+
+    Returns
+    -------
+    str
+        Nombre de la versión guardada.
+    """
+    if version is None:
+        version = f"v{len(listar_versiones(ruta)) + 1:04d}"
+    directorio = os.path.join(ruta, version)
+    if os.path.exists(os.path.join(directorio, _MANIFIESTO)):
+        raise ValueError(f"La versión {version} ya existe en el registro")
+    os.makedirs(directorio, exist_ok=True)
+
+    huella = None
+    if X is not None and y is not None:
+        from cache_resultados import huella_datos
+
+        huella = huella_datos(X, y)
+
+    modelos = {}
+    for i, (target_variable, model) in enumerate(best_models.items()):
+        nombre = _nombre_fichero(i, target_variable)
+        joblib.dump(model, os.path.join(directorio, nombre + ".joblib"))
+        empaquetado = None
+        if es_modelo_arboles(model):
+            empaquetado = nombre + "_arboles"
+            BosqueEmpaquetado.desde_modelo(model).guardar(
+                os.path.join(directorio, empaquetado)
+            )
+        modelos[target_variable] = {
+            "fichero": nombre + ".joblib",
+            "empaquetado": empaquetado,
+            "clase": type(model).__name__,
+            "predictores": [str(v) for v in variables_importantes[target_variable]],
+            "r2_validacion": (
+                float(r2_validacion[target_variable])
+                if r2_validacion and target_variable in r2_validacion
+                else None
+            ),
+        }
+
+    manifiesto = {
+        "version": version,
+        "creado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "huella_datos": huella,
+        "librerias": _versiones_libs(),
+        "metadatos": metadatos or {},
+        "modelos": modelos,
+    }
+    with open(os.path.join(directorio, _MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    with open(os.path.join(ruta, _ACTUAL), "w", encoding="utf-8") as f:
+        f.write(version)
+    return version
+
+
+def cargar_manifiesto(ruta, version=None):
+    """
+    Devuelve el manifiesto de una versión del registro (por defecto la versión activa).
+    """
+    version = version or version_actual(ruta)
+    if version is None:
+        raise FileNotFoundError(f"No hay modelos guardados en {ruta}")
+    with open(os.path.join(ruta, version, _MANIFIESTO), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def cargar_registro(ruta, version=None, mmap=True):
+    """
+    Carga los modelos de una versión del registro.
+
+    Con mmap=True los modelos de árboles se cargan como `BosqueEmpaquetado` sobre memoria
+    mapeada: la carga tarda milisegundos, no requiere sklearn y los procesos que usan la misma
+    versión comparten las páginas en lugar de tener cada uno su copia. Estos objetos solo
+    sirven para predecir; con mmap=False se cargan los estimadores de sklearn completos.
+
+    Parameters
+    ----------
+    ruta : str
+        Directorio raíz del registro.
+    version : str, optional
+        Versión a cargar. Por defecto la versión activa.
+    mmap : bool
+        Si se cargan los modelos de árboles empaquetados y mapeados en memoria.
+
+    Returns
+    -------
+    dict
+        Diccionario con el modelo de cada variable objetivo (best_models).
+    dict
+        Diccionario con las variables predictoras de cada variable objetivo, en el orden usado
+        en el entrenamiento (variables_importantes).
+    dict
+        Manifiesto de la versión cargada.
+    """
+    manifiesto = cargar_manifiesto(ruta, version)
+    directorio = os.path.join(ruta, manifiesto["version"])
+    best_models = {}
+    variables_importantes = {}
+    for target_variable, info in manifiesto["modelos"].items():
+        if mmap and info["empaquetado"] is not None:
+            best_models[target_variable] = BosqueEmpaquetado.cargar(
+                os.path.join(directorio, info["empaquetado"]), mmap=True
+            )
+        else:
+            best_models[target_variable] = joblib.load(
+                os.path.join(directorio, info["fichero"])
+            )
+        variables_importantes[target_variable] = info["predictores"]
+    return best_models, variables_importantes, manifiesto
@@ -0,0 +1,211 @@
+import os
+import time
+import shutil
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+# Generación de las figuras del trabajo por lotes y sin interfaz gráfica. Cada figura se
+# describe con una especificación (la función de plots.py, sus argumentos, el fichero de salida
+# y el estilo) que no toca el estado global de pyplot; las figuras se dibujan con el backend
+# Agg en un conjunto de procesos y se guardan en una caché de imágenes, de modo que las que no
+# han cambiado (mismos datos, estilo, resolución y código) no se vuelven a dibujar.
+
+FUNCIONES = os.path.dirname(os.path.abspath(__file__))
+CACHE_FIGURAS = os.path.normpath(
+    os.path.join(FUNCIONES, "..", "..", "..", "..", "cache_figuras")
+)
+
+
+def especificacion(funcion, fichero, dpi=300, estilo="whitegrid", **argumentos):
+    """
+    Describe una figura sin dibujarla.
+
+    Parameters
+    ----------
+    funcion : str
+        Nombre de la función de plots.py que dibuja la figura (por ejemplo 'create_basic_plot').
+    fichero : str
+        Fichero de salida; el formato se toma de la extensión (png, pdf, svg...).
+    dpi : int
+        Resolución de la imagen.
+    estilo : str, optional
+        Estilo de seaborn que se aplica antes de dibujar (None para el de matplotlib por
+        defecto). Las funciones que reciben `style` lo cambian igualmente.
+    **argumentos
+        Argumentos de la función (datos y opciones de estilo). No se debe pasar save_path.
+
+    Returns
+    -------
+    dict
+        Especificación de la figura.
+    """
+    if "save_path" in argumentos:
+        raise ValueError("El fichero de salida se indica con `fichero`, no con save_path")
+    return {
+        "funcion": funcion,
+        "fichero": fichero,
+        "dpi": dpi,
+        "estilo": estilo,
+        "argumentos": argumentos,
+    }
+
+
+def _fuentes_locales(modulo):
+    # Código de un módulo de esta carpeta y de los módulos de la carpeta que importa, directa o
+    # indirectamente (también dentro de funciones), leído sin importarlos en el proceso
+    # principal. Los módulos externos (matplotlib, seaborn...) se cubren con su versión.
+    import ast
+
+    fuentes = {}
+    pendientes = [modulo]
+    while pendientes:
+        nombre = pendientes.pop()
+        ruta = os.path.join(FUNCIONES, f"{nombre}.py")
+        if nombre in fuentes or not os.path.exists(ruta):
+            continue
+        with open(ruta, encoding="utf-8") as f:
+            fuentes[nombre] = f.read()
+        for nodo in ast.walk(ast.parse(fuentes[nombre])):
+            if isinstance(nodo, ast.Import):
+                pendientes.extend(a.name.split(".")[0] for a in nodo.names)
+            elif isinstance(nodo, ast.ImportFrom) and nodo.module and not nodo.level:
+                pendientes.append(nodo.module.split(".")[0])
+    return fuentes
+
+
+def _codigo_plots(funcion):
+    # Huella del código que dibuja la figura: plots.py completo y los módulos locales de los
+    # que depende (por ejemplo importancia.py), no solo la función, para que un cambio en
+    # cualquiera de ellos invalide la caché
+    import ast
+
+    fuentes = _fuentes_locales("plots")
+    if not any(
+        isinstance(nodo, ast.FunctionDef) and nodo.name == funcion
+        for nodo in ast.parse(fuentes["plots"]).body
+    ):
+        raise ValueError(f"plots.py no tiene la función {funcion}")
+    h = hashlib.sha1()
+    for nombre in sorted(fuentes):
+        h.update(f"{nombre}\0{fuentes[nombre]}\0".encode())
+    return h.hexdigest()
+
+
+def clave_figura(spec, codigos=None):
+    """
+    Clave de la caché de una figura: huella de sus argumentos (datos incluidos), del estilo, la
+    resolución, el formato, el código de plots.py y de los módulos locales que usa, y la versión
+    de matplotlib.
+    """
+    import joblib
+    from importlib.metadata import version
+
+    if codigos is None:
+        codigos = {}
+    if spec["funcion"] not in codigos:
+        codigos[spec["funcion"]] = _codigo_plots(spec["funcion"])
+    h = hashlib.sha1()
+    h.update(codigos[spec["funcion"]].encode())
+    h.update(joblib.hash(spec["argumentos"]).encode())
+    h.update(
+        repr(
+            (
+                spec["dpi"],
+                spec["estilo"],
+                os.path.splitext(spec["fichero"])[1].lower(),
+                version("matplotlib"),
+            )
+        ).encode()
+    )
+    return h.hexdigest()
+
+
+def _iniciar_proceso():
+    import matplotlib
+
+    matplotlib.use("Agg", force=True)
+    # plt.show() avisa de que Agg no es interactivo
+    warnings.filterwarnings("ignore", message=".*non-interactive.*")
+
+
+def _dibujar(spec, destino):
+    # Se ejecuta en un proceso del pool: dibuja la figura con plots.py y guarda la figura
+    # actual (las funciones de plots.py terminan con plt.show(), que con Agg no hace nada)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import plots
+
+    inicio = time.perf_counter()
+    plt.close("all")
+    plt.rcdefaults()
+    if spec["estilo"] is not None:
+        sns.set_style(spec["estilo"])
+    getattr(plots, spec["funcion"])(**spec["argumentos"])
+    temporal = f"{destino}.{os.getpid()}.tmp{os.path.splitext(destino)[1]}"
+    plt.gcf().savefig(temporal, dpi=spec["dpi"], bbox_inches="tight")
+    plt.close("all")
+    os.replace(temporal, destino)
+    return time.perf_counter() - inicio
+
+
+def renderizar_figuras(especificaciones, ruta_cache=CACHE_FIGURAS, n_procesos=None):
+    """
+    Dibuja las figuras en paralelo con el backend Agg y copia cada imagen a su fichero de
+    salida. Las figuras cuya clave ya está en la caché no se vuelven a dibujar.
+
+    Parameters
+    ----------
+    especificaciones : list
+        Lista de especificaciones creadas con `especificacion`.
+    ruta_cache : str
+        Directorio de la caché de imágenes (<clave>.<formato>).
+    n_procesos : int, optional
+        Número de procesos (por defecto el número de CPUs).
+
+    Returns
+    -------
+    list
+        Una entrada por figura con el fichero, la clave, si se ha dibujado o venía de la caché
+        y el tiempo de dibujo en segundos.
+    """
+    os.makedirs(ruta_cache, exist_ok=True)
+    codigos = {}
+    resultados = []
+    pendientes = {}
+    for spec in especificaciones:
+        clave = clave_figura(spec, codigos)
+        en_cache = os.path.join(
+            ruta_cache, clave + os.path.splitext(spec["fichero"])[1].lower()
+        )
+        resultado = {"fichero": spec["fichero"], "clave": clave, "segundos": 0.0}
+        # Si la misma figura se pide dos veces se dibuja una sola vez
+        if os.path.exists(en_cache) or en_cache in pendientes:
+            resultado["origen"] = "cache"
+        else:
+            resultado["origen"] = "dibujada"
+            pendientes[en_cache] = spec
+        resultados.append((resultado, en_cache))
+
+    if pendientes:
+        with ProcessPoolExecutor(
+            max_workers=n_procesos, initializer=_iniciar_proceso
+        ) as ejecutor:
+            futuros = {
+                en_cache: ejecutor.submit(_dibujar, spec, en_cache)
+                for en_cache, spec in pendientes.items()
+            }
+            tiempos = {en_cache: f.result() for en_cache, f in futuros.items()}
+    else:
+        tiempos = {}
+
+    for resultado, en_cache in resultados:
+        if resultado["origen"] == "dibujada":
+            resultado["segundos"] = tiempos[en_cache]
+        directorio = os.path.dirname(resultado["fichero"])
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        shutil.copyfile(en_cache, resultado["fichero"])
+    return [resultado for resultado, _ in resultados]
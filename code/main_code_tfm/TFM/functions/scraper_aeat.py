@@ -0,0 +1,513 @@
+import os
+import io
+import json
+import time
+import hashlib
+import threading
+import contextlib
+import urllib.request
+import pandas as pd
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pandas.errors import SettingWithCopyWarning
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+
+# Páginas de la estadística "Mercado de trabajo y pensiones en las fuentes tributarias" de la
+# AEAT (una por año y tramo de salario en múltiplos del SMI), como en colect_data_aeat.ipynb
+URL_BASE = (
+    "https://sede.agenciatributaria.gob.es/AEAT/Contenidos_Comunes/La_Agencia_Tributaria/"
+    "Estadisticas/Publicaciones/sites/mercado/{year}/{id}.html"
+)
+_CODIFICACION = "ISO-8859-1"
+_INDICE = "indice.json"
+_OBJETOS = "objetos"
+
+IDS_AEAT = {
+    2008: {
+        "Total": "jrubik7125",
+        "0-0.5": "jrubik2817",
+        "0.5-1": "jrubikeae7",
+        "1-1.5": "jrubikec1a",
+        "1.5-2": "jrubikc3cf",
+        "2-2.5": "jrubik298d",
+        "2.5-3": "jrubikd50c",
+        "3-3.5": "jrubik8cce",
+        "3.5-4": "jrubike09c",
+        "4-4.5": "jrubikde50",
+        "4.5-5": "jrubik3627",
+        "5-7.5": "jrubik128d",
+        "7.5-10": "jrubik8727",
+        ">10": "jrubik9bb9",
+    },
+    2009: {
+        "Total": "jrubikf409",
+        "0-0.5": "jrubika3ae",
+        "0.5-1": "jrubik9d7d",
+        "1-1.5": "jrubik29cb",
+        "1.5-2": "jrubikcd1d",
+        "2-2.5": "jrubik30dc",
+        "2.5-3": "jrubikd8f8",
+        "3-3.5": "jrubikfc68",
+        "3.5-4": "jrubika62b",
+        "4-4.5": "jrubikc952",
+        "4.5-5": "jrubik33d4",
+        "5-7.5": "jrubik4eb0",
+        "7.5-10": "jrubikd4e1",
+        ">10": "jrubikfae1",
+    },
+    2010: {
+        "Total": "jrubik7be4",
+        "0-0.5": "jrubikf843",
+        "0.5-1": "jrubik1b6f",
+        "1-1.5": "jrubik811a",
+        "1.5-2": "jrubikdb42",
+        "2-2.5": "jrubikade6",
+        "2.5-3": "jrubikc670",
+        "3-3.5": "jrubikae56",
+        "3.5-4": "jrubikebdf",
+        "4-4.5": "jrubika251",
+        "4.5-5": "jrubik650a",
+        "5-7.5": "jrubik42d3",
+        "7.5-10": "jrubik84b0",
+        ">10": "jrubik8443",
+    },
+    2011: {
+        "Total": "jrubikf30da5f83d15fb9603527d60e94641fae8825e497",
+        "0-0.5": "jrubikf537326ad6a699215a89b2d4bbccc816a43822d3f",
+        "0.5-1": "jrubikf445dcbea10c984b641d96aaaef0554436f6eddfa",
+        "1-1.5": "jrubikf484c592473528e0435e771ad33ab67f480be17a7",
+        "1.5-2": "jrubik160aa2a427ab5513fca5088448bd173d5afa1182",
+        "2-2.5": "jrubikf3f1e201eb5cffe47022ed3774b6a04816f04d071",
+        "2.5-3": "jrubikf1081c591058370d5f5f8695f30838888398f122a",
+        "3-3.5": "jrubik20697493f52d176237411ba171d8035245c94f13",
+        "3.5-4": "jrubik73208c0fa991a81d46bb70a2a9ef72d8dee320a2",
+        "4-4.5": "jrubik7956f32ccda8c388aa2ba52bc69e4ccf5bb5eab5",
+        "4.5-5": "jrubikf5bae79fa7da04ac694e6d17de72d49689b3ffb28",
+        "5-7.5": "jrubik2f78defde6daadb30da02fcb2c34627ece2510be",
+        "7.5-10": "jrubikf7ca27fa5d7ff0b9ebb6c52130d832e833fe5a62a",
+        ">10": "jrubikf4863f2dfc2f810804adc3c435efdaffa98517cf5",
+    },
+    2012: {
+        "Total": "jrubik3c8b4fca9b22cbe4a1825a98283f957b044fb82b",
+        "0-0.5": "jrubikf1b957c66594f27aaf5a216ea029769a59420344d",
+        "0.5-1": "jrubikf49afba57c2e192fc261b4fcf8c26a9114b47e477",
+        "1-1.5": "jrubik2641df70420048a88eb98ace07b8d1afa965e7b0",
+        "1.5-2": "jrubik7ad66ada29e5eb9bbc9b15cc2062937d0f47b3ce",
+        "2-2.5": "jrubik7d8eadc6c3802d42ec240ee7cecce9074e507bda",
+        "2.5-3": "jrubikf4ab46480512e12fe18cd12af556fd39c752cdb18",
+        "3-3.5": "jrubik7a7d4b684c1201375ce7d357b9cc02960f453aea",
+        "3.5-4": "jrubik1eb713093a8483e810479068b0aebc10f1e28215",
+        "4-4.5": "jrubikf543fdebcf969f938a0e1533c9b06117bd6cb9943",
+        "4.5-5": "jrubik29214bf3deffd6d61e3def744f3a11a9d263237e",
+        "5-7.5": "jrubikf7742db7062158f15f35f368df4dc30350da20ade",
+        "7.5-10": "jrubikf7542ae1c9c1551404499beb3eaf8d8c7af229e6d",
+        ">10": "jrubikfb619b6910a79484ed676993db08b74d26373be",
+    },
+    2013: {
+        "Total": "jrubikf5590486e5658081a33152a847e7ca9eadf67bd00",
+        "0-0.5": "jrubikf2ab98d9cb1ab23eb019611cc5aba8be2f13cfd4e",
+        "0.5-1": "jrubikf1a6c7401b35b9bac7710850f1a223ceca47ae53e",
+        "1-1.5": "jrubik23d16ae24abac04715a6b3246a2714231fd5cc2a",
+        "1.5-2": "jrubikf4b877f46f3ec57dd3a33aaab616bbaafe71472e5",
+        "2-2.5": "jrubik44a2137afbbc26c5bb39558c605f5aad38fa936b",
+        "2.5-3": "jrubikf34a5bd86b4baa36e16dd60970e38bd2b213ac539",
+        "3-3.5": "jrubikfe36ef3fd9b62b3dc725f2cb827686dcf9ea6ff",
+        "3.5-4": "jrubik5c8351b308df59a74e4a8f5bf013139d6eaa28fb",
+        "4-4.5": "jrubik6a1a89d9536abdc93d7099ab35cd10933c89de2a",
+        "4.5-5": "jrubik2be0320ab9f3fd12275524b4d027f8499ea6b109",
+        "5-7.5": "jrubik7b5fa59e7941ad81086471d6a6fb62a44a235b9a",
+        "7.5-10": "jrubikf57820074c607557183a07496f4c3a89f38f3560b",
+        ">10": "jrubikf672dea112a71a7bdd98b51fb687def23bf808a3f",
+    },
+    2014: {
+        "Total": "jrubik2722bf59c799ead0bffc44ea5c6b253bfb1d8a40",
+        "0-0.5": "jrubik1770a8239e1127215a62947b4f966df8bbc8e229",
+        "0.5-1": "jrubikf3c87d861ff46ca9289a300105a0f43e6d7204c34",
+        "1-1.5": "jrubikf7a1d97d86c9df5c1129530558296628498af3e89",
+        "1.5-2": "jrubikf50095bf505bc0bc5440c85f454079356cd0055e0",
+        "2-2.5": "jrubik1182a0bcbe4985dc094be4ebf5f27d9631acab95",
+        "2.5-3": "jrubik2171ba2048bd64b18372291a113ee1c9d079f54a",
+        "3-3.5": "jrubik2cc85694ab97cbffc106b1b96a70469705fd19db",
+        "3.5-4": "jrubik335ef607bc8c3c27e0f2b77ba7a5d0f3300139d7",
+        "4-4.5": "jrubikf591e56a3a74a2501cc6359ba69d59925e8b0235b",
+        "4.5-5": "jrubikfd0c811aa4dcf1d59660f3e98a7f9ef196f8a43f",
+        "5-7.5": "jrubik7662664e538ff9d0c2154485cdc5fcaf27e8a09d",
+        "7.5-10": "jrubik6096e603513a2416cf64b2812a4f09f73d42d488",
+        ">10": "jrubikf593b92a7ae63f4724f42d1880cb2753879c8db38",
+    },
+    2015: {
+        "Total": "jrubik55627506bfba609ffe04c5a96a9ead39ac5e9d26",
+        "0-0.5": "jrubikf10f245073b453e2a7f9456faae1abe39248a524e",
+        "0.5-1": "jrubik71111e090dcd46994a94baf6672a208c783e6920",
+        "1-1.5": "jrubikf6e712d257901a10cf18b95d65b1316b9df66daf3",
+        "1.5-2": "jrubikf427f03ede600934bdbdab86cd8a9ff54c50b21ba",
+        "2-2.5": "jrubikf1b9bda005d1525c220f0dfc16ef6bbd55d14b6d",
+        "2.5-3": "jrubikf5cb3007238be3718d72298d76e3b07d0dcd0400a",
+        "3-3.5": "jrubik2d83b362e719936f790aa24645b4ad1e07840eb2",
+        "3.5-4": "jrubikd51d85d85814c08b3d2055d4bf1345ac004e51",
+        "4-4.5": "jrubikf45db518359749c0ef77317f1d0faf7a80508f49f",
+        "4.5-5": "jrubikf46433aeb27a7103bb9bb8bbe60a0318deac951ad",
+        "5-7.5": "jrubikf5415f39251df95c52754436d8819280622979d8d",
+        "7.5-10": "jrubikf4e1899587d4c9adb151a3d090eb83aeff41d82d8",
+        ">10": "jrubik3750e2645b7e8314942b749feba5dc934afba236",
+    },
+    2016: {
+        "Total": "jrubik10c01fd8c4e99c1fc3916ab34f8f6250666781b3",
+        "0-0.5": "jrubik297b44e169160f65104e6e60befa97d0b3a597e6",
+        "0.5-1": "jrubikf378f7c568effb312a394660f67df3cb99375d8fc",
+        "1-1.5": "jrubikf5c968bc7c081a48bf33c0301360c6d99e30869",
+        "1.5-2": "jrubikf1d4340548498f5ad8a8c684fc20ac2b6912dcc15",
+        "2-2.5": "jrubik78a91723a1e73ed96603ad187356aa3073a8d1e0",
+        "2.5-3": "jrubik63263f307c1a76f0e914e9ea4c15193fcd21ef75",
+        "3-3.5": "jrubikf319be59de9c13ef7a685bb80363413e8b323f300",
+        "3.5-4": "jrubik3d1497d464c690646c813f9d5b59339f3fa20370",
+        "4-4.5": "jrubikf7e508ec18e27cb715f3abb16b1651979d6aae916",
+        "4.5-5": "jrubikf45a1a9e9e2c9cd39bda94296bde59da9786dd63f",
+        "5-7.5": "jrubik6c57a083f1266a872c6d570169abc782ddd49225",
+        "7.5-10": "jrubik6cf6b1c07e7781758603495c57dc22a259fb014d",
+        ">10": "jrubik56823f859c8521ce66c9484d53de365b4345678b",
+    },
+    2017: {
+        "Total": "jrubik6b321d30366f388b9379cc09b8b592ab62db52cb",
+        "0-0.5": "jrubik67dc0ce9c75e4c5ed0988eb1c93fc87f0856367f",
+        "0.5-1": "jrubikf55b4e6caba0d32706e0036571e10e06a9e7a0dec",
+        "1-1.5": "jrubikf2666b0a27700486f22fec980006efb8d90e53e7b",
+        "1.5-2": "jrubik1173a1f407a53e028df5def5ea4726bebec4d853",
+        "2-2.5": "jrubikf615438bb3b9f35d4431559fcaf20919f80c02d4b",
+        "2.5-3": "jrubikf4a953aef1cf1f3182af6cd544cdc5630d9cb36d0",
+        "3-3.5": "jrubikf2895401504bcc936bc5f5a1eb82599ab60844fb2",
+        "3.5-4": "jrubikf68e06f3125175bd845668aa975f2a4a0d027fbfb",
+        "4-4.5": "jrubikfcd25e4047dfd9ff2d415d7ed114c73e91d7117d",
+        "4.5-5": "jrubik4b38cc19303af45f2b0f9b72cc1f090f1e8b9748",
+        "5-7.5": "jrubikf72cb63e6b940cb21f80902c8146b1868b34b7cf8",
+        "7.5-10": "jrubik2929595de537b250d247e211baae82d84f0617da",
+        ">10": "jrubikf60d68cce808c5382be7dc69f89eae6e4a926a67a",
+    },
+    2018: {
+        "Total": "jrubikf13275bf1ef5d96e7febc25aa100156774ff5c8ad",
+        "0-0.5": "jrubik1adc1d27f48ee29d14587ecb8b94e27476b3a174",
+        "0.5-1": "jrubikf5a03dd6555efb3b7f9d5f84c23f74ab36de45c31",
+        "1-1.5": "jrubikf1c26a7b4a4643c2c5a9d31103d15813de144a23b",
+        "1.5-2": "jrubik5c065ac90866a050d362ffe345d971509d429202",
+        "2-2.5": "jrubikf2143d8eb6a2a2de6dbb441e86916cf97702e73a2",
+        "2.5-3": "jrubikf4afccc9716dcdb2c47804d8daab15127b82b5359",
+        "3-3.5": "jrubikf8939df248692783906133c64bc0503777ac726f",
+        "3.5-4": "jrubikf56c80411e80af54648629e3b87ec07c300d9ee67",
+        "4-4.5": "jrubik5c89e9356572639c63feff7d6a0a19c4681374fc",
+        "4.5-5": "jrubik2c30f4843fabe8ac4635bb6d4dfe4a633ca20c8e",
+        "5-7.5": "jrubik1a4f1ae16413e820e5f5996139d520d5d3dcabd9",
+        "7.5-10": "jrubikf5bbae21ffcf400829820d9b972eed2e6dc9e01fb",
+        ">10": "jrubik2393a9f7915721dd5374053624b3bf6968728c99",
+    },
+    2019: {
+        "Total": "jrubik7d746b5c70fcbedffe15a1f9af327deecaa11188",
+        "0-0.5": "jrubikf7a2012a21b05126271da8fda7216208f3ad39553",
+        "0.5-1": "jrubik730f04f8988a1bdd96a9afd23a5eba9d4fcddf8a",
+        "1-1.5": "jrubik646e93bde1008afa38d7b8cc83fa47ef8c496f90",
+        "1.5-2": "jrubikf443a5044d782a72d101a442d5a0041900522e449",
+        "2-2.5": "jrubik24af4eefe4b15af6c1aa3bb3a4381224b03ac54e",
+        "2.5-3": "jrubik232b132ac1ffa06e9c4297724f4604d7e76f7141",
+        "3-3.5": "jrubikf6c522e0823a4a79896496bebb74e8b7dbd6d5618",
+        "3.5-4": "jrubikf371e3d135a1cf29542c5e9ed20579f0d41654864",
+        "4-4.5": "jrubikf53da22d345259a6cdc2d372afffc6b621c1d84c2",
+        "4.5-5": "jrubikf477a1dc4952f99941e8c9accf95d2c8e9eed4d01",
+        "5-7.5": "jrubikcc2c60520011a6b6713292920ae1c7a989e48db",
+        "7.5-10": "jrubik1018083eb6eb9d0132b14db829b34b8a0b8fb521",
+        ">10": "jrubik5c1bacb2f607c48d1380784a4158e3a4de72a6ac",
+    },
+    2020: {
+        "Total": "jrubik21acaa390f5744160c4e962a8b423875bf6cf180",
+        "0-0.5": "jrubik1997c06f719a7f829a095c3a5800e8219f72f66b",
+        "0.5-1": "jrubik21ca28f7695a2d5bc227c647ed428899782e4077",
+        "1-1.5": "jrubik59f2a99eb26f92daf6a5a439dd8416c1abd6598e",
+        "1.5-2": "jrubik15324b736d2e079a152af6bfb7e6cdfe7f6371e6",
+        "2-2.5": "jrubikf16a0d3167c7d5de17e8709274b49bf8b927a62e0",
+        "2.5-3": "jrubike3ec316d57e6faf6277c958ea07433e7c9aaf40",
+        "3-3.5": "jrubik3e8048fd56089d4c4cae835351335b039656515a",
+        "3.5-4": "jrubik3c74041a9a97a1a362d6e03d7dd5748f73338d6b",
+        "4-4.5": "jrubik611e66d003aadd17cad1c6f055254a3e4ccdc371",
+        "4.5-5": "jrubikf4f06d4f22adc6b9b072fd01b11eadf4cfd0908bf",
+        "5-7.5": "jrubik32bc5133e5985f27177f36aba26508036b0810d0",
+        "7.5-10": "jrubik3eb5cfabbddc127ea38b58318e8e2bee5b990615",
+        ">10": "jrubik3c5965de51c7d23be13fea7dd08f4b98937f71ab",
+    },
+    2021: {
+        "Total": "jrubik4e41fb505966eabffec242df253d8ea082d12628",
+        "0-0.5": "jrubikf58d914eb2a814036834a526935a84001cf781660",
+        "0.5-1": "jrubikf4c08eb5d719daedfa1ba10ae206a68e9d6b6146a",
+        "1-1.5": "jrubik5b8a6936c98db5fcd438a284b8e282f2c0752fc6",
+        "1.5-2": "jrubikf6c63cc9da6659f8f7d878e58838ea7a5adc196f1",
+        "2-2.5": "jrubik3d7ff622e7eca89c90df7715c049c426390dddcd",
+        "2.5-3": "jrubikf55db8121a6dc822a65841755243b68944c56bcb6",
+        "3-3.5": "jrubikf6461c93af80473fe76471c8fc86f2d04683eb8a5",
+        "3.5-4": "jrubikf2e1ac29b694ce48274bab47f3d6a7110c0df7549",
+        "4-4.5": "jrubik7221bf7774256a375dfbb5857ebeae9f5362e949",
+        "4.5-5": "jrubikf7b596103e3c49782f185e99dc7263fcefae21106",
+        "5-7.5": "jrubikf123f8eca72dddfdc556d91c792a36536cab57aff",
+        "7.5-10": "jrubikf2a44318af52697212912fde8d992768391cac700",
+        ">10": "jrubik61c0db0345206254f0a611e8d9bb7b694586a263",
+    },
+    2022: {
+        "Total": "jrubikf40b4df54aee0b0d2d19c4d019958bfeeab3fbc31",
+        "0-0.5": "jrubikf0cbd83967a5667ea711b3bd22ac1f41db9c4db",
+        "0.5-1": "jrubikf2747f38a914be03287683d9f6ad1594acc3beacd",
+        "1-1.5": "jrubik1986fedb861e0bf14ea19e019cd0aaed6ff4e8c7",
+        "1.5-2": "jrubikf6c189cf10415f3b44d5804ab1052619c8fdce0b",
+        "2-2.5": "jrubik3fc5bfd14b94f1df31515ad4e78428bf122fb357",
+        "2.5-3": "jrubikf5a2ac8b0cf398103170d1936518cac691acad67e",
+        "3-3.5": "jrubik5433d13baab5730d7bcb62d88749a55861dbb300",
+        "3.5-4": "jrubikf47fea45fafd4aef9d5107edb24d6ab0dfb8951cf",
+        "4-4.5": "jrubikf53f743e24630f9fa620df67e55097daf0c887272",
+        "4.5-5": "jrubikf6ad1ae215327d2b53e8636ef7e34144ee02b0eb0",
+        "5-7.5": "jrubik174cfa163acf328b8d0cf6a36176bf8281247c6b",
+        "7.5-10": "jrubikf7121329237796756e0659d1126157005e532f47e",
+        ">10": "jrubik3d3e3e2c8b51ee0655ac784b23312d9f5167a6c9",
+    },
+}
+
+
+class CacheHTML:
+    """
+    Caché local de páginas HTML direccionada por contenido: cada página se guarda una sola vez
+    con el SHA-1 de su contenido como nombre y un índice JSON relaciona cada URL con su huella.
+    Es segura entre hilos, por lo que se puede compartir entre descargas concurrentes.
+
+    Parameters
+    ----------
+    ruta : str
+        Directorio de la caché.
+    """
+
+    def __init__(self, ruta="cache_aeat"):
+        self.ruta = ruta
+        os.makedirs(os.path.join(ruta, _OBJETOS), exist_ok=True)
+        self._bloqueo = threading.Lock()
+        fichero = os.path.join(ruta, _INDICE)
+        self._indice = {}
+        if os.path.exists(fichero):
+            with open(fichero, encoding="utf-8") as f:
+                self._indice = json.load(f)
+
+    def _fichero(self, huella):
+        return os.path.join(self.ruta, _OBJETOS, f"{huella}.html")
+
+    def obtener(self, url):
+        """
+        Devuelve el contenido guardado de la URL (bytes) o None si no está en la caché o el
+        fichero guardado no coincide con su huella (por ejemplo, si quedó truncado).
+        """
+        huella = self._indice.get(url)
+        if huella is None or not os.path.exists(self._fichero(huella)):
+            return None
+        with open(self._fichero(huella), "rb") as f:
+            contenido = f.read()
+        if hashlib.sha1(contenido).hexdigest() != huella:
+            self.descartar(url)
+            return None
+        return contenido
+
+    def guardar(self, url, contenido):
+        huella = hashlib.sha1(contenido).hexdigest()
+        fichero = self._fichero(huella)
+        if not os.path.exists(fichero):
+            temporal = f"{fichero}.{threading.get_ident()}.tmp"
+            with open(temporal, "wb") as f:
+                f.write(contenido)
+            os.replace(temporal, fichero)
+        with self._bloqueo:
+            self._indice[url] = huella
+            # Volcamos el índice tras cada descarga para poder reanudar tras un fallo
+            self._guardar_indice()
+        return huella
+
+    def descartar(self, url):
+        """
+        Quita la URL del índice para que se vuelva a descargar. El fichero no se borra, ya que
+        otra URL puede tener el mismo contenido.
+        """
+        with self._bloqueo:
+            if self._indice.pop(url, None) is not None:
+                self._guardar_indice()
+
+    def _guardar_indice(self):
+        temporal = os.path.join(self.ruta, f"{_INDICE}.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self._indice, f, indent=1)
+        os.replace(temporal, os.path.join(self.ruta, _INDICE))
+
+    def __len__(self):
+        return len(self._indice)
+
+
+def _descargar(url, cache, reintentos, espera, timeout):
+    # Devuelve el HTML de la URL, desde la caché si ya se descargó
+    contenido = cache.obtener(url)
+    if contenido is not None:
+        return contenido, True
+    for intento in range(reintentos + 1):
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as respuesta:
+                contenido = respuesta.read()
+            break
+        except OSError:
+            if intento == reintentos:
+                raise
+            time.sleep(espera * 2**intento)
+    cache.guardar(url, contenido)
+    return contenido, False
+
+
+def _obtener_pagina(url, year, smi, cache, reintentos, espera, timeout):
+    # Descarga (o lee de la caché) y convierte una página. Si la copia de la caché no se puede
+    # leer se descarta y la página se vuelve a descargar
+    contenido, en_cache = _descargar(url, cache, reintentos, espera, timeout)
+    try:
+        return leer_pagina(contenido, year, smi), en_cache
+    except Exception:
+        if not en_cache:
+            raise
+    cache.descartar(url)
+    contenido, _ = _descargar(url, cache, reintentos, espera, timeout)
+    return leer_pagina(contenido, year, smi), False
+
+
+def leer_pagina(contenido, year, smi):
+    """
+    Convierte el HTML de una página en una tabla, con las mismas opciones de lectura que el
+    notebook de recogida de datos y las columnas 'year' y 'smi'.
+    """
+    tables = pd.read_html(
+        io.StringIO(contenido.decode(_CODIFICACION)), thousands=".", decimal=","
+    )
+    df = tables[0]
+    df["year"] = year
+    df["smi"] = smi
+    return df
+
+
+def descargar_aeat(
+    ids=None,
+    url_base=URL_BASE,
+    ruta_cache="cache_aeat",
+    max_paralelo=8,
+    reintentos=3,
+    espera=1.0,
+    timeout=30,
+):
+    """
+    Descarga y lee todas las páginas de la AEAT (año × tramo de SMI) de forma concurrente, con
+    un máximo de `max_paralelo` descargas simultáneas. El HTML de cada página se guarda en una
+    caché local, de modo que si alguna descarga falla basta con volver a llamar a la función:
+    las páginas ya descargadas se leen de la caché y solo se piden las que faltan. Cada página
+    se lee en su propia tabla y todas se concatenan una sola vez al final.
+
+    Parameters
+    ----------
+    ids : dict, optional
+        Diccionario {año: {tramo: identificador de la página}}. Por defecto IDS_AEAT.
+    url_base : str
+        Plantilla de la URL con los campos {year} e {id}. Se puede apuntar a un servidor local
+        (ver `servidor_fixture`).
+    ruta_cache : str
+        Directorio de la caché de páginas.
+    max_paralelo : int
+        Número máximo de descargas simultáneas.
+    reintentos : int
+        Número de reintentos de cada página, con espera exponencial.
+
+    Returns
+    -------
+    pd.DataFrame
+        Tabla completa con las columnas de la AEAT y las columnas 'year' y 'smi'.
+    dict
+        Resumen con el número de páginas leídas de la caché y descargadas, y las páginas que
+        han fallado con el error correspondiente.
+    """
+    if ids is None:
+        ids = IDS_AEAT
+    cache = CacheHTML(ruta_cache)
+    paginas = [
+        (year, smi, id_) for year, smis in ids.items() for smi, id_ in smis.items()
+    ]
+
+    fragmentos = {}
+    fallos = {}
+    de_cache = 0
+    with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+        futuros = {
+            executor.submit(
+                _obtener_pagina,
+                url_base.format(year=year, id=id_),
+                year,
+                smi,
+                cache,
+                reintentos,
+                espera,
+                timeout,
+            ): (year, smi)
+            for year, smi, id_ in paginas
+        }
+        for futuro in as_completed(futuros):
+            year, smi = futuros[futuro]
+            try:
+                fragmentos[(year, smi)], en_cache = futuro.result()
+                de_cache += en_cache
+            except Exception as error:
+                fallos[(year, smi)] = repr(error)
+
+    if fallos:
+        warnings.warn(
+            f"{len(fallos)} páginas no se han podido leer; "
+            "vuelva a ejecutar la descarga para reanudarla"
+        )
+    # Concatenamos una sola vez, en el orden de ids
+    orden = [(year, smi) for year, smi, _ in paginas if (year, smi) in fragmentos]
+    complete_table = (
+        pd.concat([fragmentos[k] for k in orden], ignore_index=True)
+        if orden
+        else pd.DataFrame()
+    )
+    resumen = {
+        "paginas": len(paginas),
+        "cache": de_cache,
+        "descargadas": len(fragmentos) - de_cache,
+        "fallos": fallos,
+    }
+    return complete_table, resumen
+
+
+@contextlib.contextmanager
+def servidor_fixture(directorio, puerto=0, peticiones=None):
+    """
+    Sirve un directorio local de páginas HTML ({year}/{id}.html) en un hilo, para usarlo en
+    lugar de la web de la AEAT en pruebas. Devuelve la plantilla de URL para `descargar_aeat`.
+    Si se pasa una lista en `peticiones`, se añade a ella la ruta de cada petición recibida.
+
+    Ejemplo:
+    with servidor_fixture("fixtures_aeat") as url_base:
+        tabla, resumen = descargar_aeat(ids, url_base=url_base, ruta_cache=tmp)
+    """
+    import functools
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Silencioso(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            if peticiones is not None:
+                peticiones.append(self.path)
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(
+        ("127.0.0.1", puerto),
+        functools.partial(_Silencioso, directory=directorio),
+    )
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_address[1]}/{{year}}/{{id}}.html"
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
@@ -1,101 +1,156 @@
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
-import math
-import seaborn as sns
 import warnings
-from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
-from sklearn.inspection import permutation_importance
 from pandas.errors import SettingWithCopyWarning
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
+from joblib import Parallel, delayed, effective_n_jobs
+from importancia import importancia_variable_interes
 
 warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 
-def obtener_importancia_variables_rf(
+def _ajustar_importancia_objetivo(X, y_col, tipo, n_estimadores, metodo, n_jobs=1):
+    # Ajusta el bosque de una variable objetivo y calcula la importancia de sus variables.
+    # n_jobs es la parte de los procesos que corresponde a esta variable objetivo y se usa en
+    # el ajuste del bosque y en las repeticiones de la permutación
+    from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
+    from sklearn.inspection import permutation_importance
+
+    if tipo == "regresion":
+        modelo = RandomForestRegressor(
+            n_estimators=n_estimadores, random_state=42, n_jobs=n_jobs
+        )
+    else:
+        modelo = RandomForestClassifier(
+            n_estimators=n_estimadores, random_state=42, n_jobs=n_jobs
+        )
+    modelo.fit(X, y_col)
+    if metodo == "importancia_nativa":
+        return modelo.feature_importances_
+    result = permutation_importance(
+        modelo, X, y_col, n_repeats=10, random_state=42, n_jobs=n_jobs
+    )
+    return result.importances_mean
+
+
+def _r2_columnas(y_real, y_pred):
+    # R² de cada columna (y_real y y_pred de forma filas × columnas)
+    residuo = ((y_real - y_pred) ** 2).sum(axis=0)
+    total = ((y_real - y_real.mean(axis=0)) ** 2).sum(axis=0)
+    return 1 - residuo / total
+
+
+def _permutacion_multisalida(modelo, X, Y, n_repeats=10, random_state=42):
+    # Importancia por permutación de un modelo multisalida: cada permutación se predice una
+    # sola vez y se puntúa para todas las variables objetivo a la vez. Las repeticiones de
+    # cada columna se apilan en una única llamada a predict.
+    rng = np.random.RandomState(random_state)
+    X_np = X.to_numpy()
+    Y_np = Y.to_numpy(dtype=float)
+    n = X_np.shape[0]
+    base = _r2_columnas(Y_np, modelo.predict(X))
+    importancias = np.zeros((Y_np.shape[1], X_np.shape[1]))
+    for j in range(X_np.shape[1]):
+        apilado = np.tile(X_np, (n_repeats, 1))
+        for r in range(n_repeats):
+            apilado[r * n : (r + 1) * n, j] = X_np[rng.permutation(n), j]
+        pred = modelo.predict(pd.DataFrame(apilado, columns=X.columns))
+        scores = np.array(
+            [
+                _r2_columnas(Y_np, pred[r * n : (r + 1) * n])
+                for r in range(n_repeats)
+            ]
+        )
+        importancias[:, j] = (base - scores).mean(axis=0)
+    return importancias
+
+
+def _seleccionar_variables(importancias, columnas, umbral_importancia, num_variables):
+    # Variables que cubren el umbral de importancia acumulada (o las num_variables primeras)
+    importancia_acumulada = np.cumsum(np.sort(importancias)[::-1])
+    total_importancia = importancia_acumulada[-1]
+    variables_seleccionadas = columnas[np.argsort(importancias)[::-1]]
+    if num_variables:
+        return variables_seleccionadas[:num_variables]
+    return variables_seleccionadas[
+        importancia_acumulada / total_importancia <= umbral_importancia
+    ]
+
+
+def calcular_importancia_variables_rf(
     X,
     y,
     tipo="regresion",
     n_estimadores=100,
     metodo="importancia_nativa",
     top_variables=None,
-    mostrar_subplots=False,
-    columnas_subplots=4,
     umbral_importancia=0.8,
     num_variables=None,
     variables_forzadas=None,
+    n_jobs=-1,
+    multisalida=False,
 ):
     """
-    Obtiene la importancia de variables usando Random Forest para problemas multioutput.
-    Ajusta un modelo independiente para cada variable objetivo.
+    Calcula la importancia de variables usando Random Forest para problemas multioutput, sin
+    generar gráficos. Los modelos de cada variable objetivo se ajustan en paralelo.
 
     Parámetros:
-    - X: DataFrame de características
-    - y: DataFrame de variables objetivo
-    - tipo: 'regresion' o 'clasificacion'
-    - n_estimadores: número de árboles en el Random Forest
-    - metodo: 'importancia_nativa' o 'permutacion'
-    - top_variables: número de variables top a mostrar
-    - mostrar_subplots: Si es True, muestra un subplot por cada variable objetivo
-    - columnas_subplots: Número de columnas para los subplots
-    - umbral_importancia: porcentaje de importancia acumulada para seleccionar variables (por defecto 0.8)
-    - num_variables: número máximo de variables a seleccionar (se seleccionan hasta que se alcanza el umbral o hasta llegar a este número)
-    - variables_forzadas: Lista de nombres de variables que deben ser seleccionadas independientemente de los umbrales
+    - X, y, tipo, n_estimadores, metodo, top_variables, umbral_importancia, num_variables,
+      variables_forzadas: ver obtener_importancia_variables_rf
+    - n_jobs: número de procesos a utilizar (-1 para usar todos los disponibles)
+    - multisalida: Si es True (y tipo='regresion'), ajusta un único Random Forest multisalida
+      para todas las variables objetivo, que comparten predictores. Con la importancia nativa
+      todas las variables objetivo reciben la misma importancia; con permutación cada
+      permutación se predice una sola vez y se puntúa para todas las variables objetivo.
 
     Retorna:
     - DataFrame con la importancia promedio de las variables
     - Diccionario con importancia de variables por cada variable objetivo
     - Diccionario con las variables que cubren el umbral de importancia
     """
-    importancias_por_variable = {}
-    importancia_promedio = np.zeros(X.shape[1])
-    variables_importancia_umbral = {}
+    if metodo not in ("importancia_nativa", "permutacion"):
+        raise ValueError("Método debe ser 'importancia_nativa' o 'permutacion'")
 
     # Convertir variables_forzadas en un conjunto para facilitar la búsqueda
     if variables_forzadas is not None:
         variables_forzadas = set(variables_forzadas)
 
-    # Iterar sobre las variables objetivo y ajustar un modelo independiente
-    for col in y.columns:
-        # Seleccionar el modelo apropiado
-        if tipo == "regresion":
-            modelo = RandomForestRegressor(n_estimators=n_estimadores, random_state=42)
-        else:
-            modelo = RandomForestClassifier(n_estimators=n_estimadores, random_state=42)
+    if multisalida and tipo == "regresion":
+        from sklearn.ensemble import RandomForestRegressor
 
-        # Ajustar el modelo para la variable objetivo actual
-        modelo.fit(X, y[col])
-
-        # Calcular importancia de variables
+        # Un único bosque multisalida en lugar de uno por variable objetivo
+        modelo = RandomForestRegressor(
+            n_estimators=n_estimadores, random_state=42, n_jobs=n_jobs
+        )
+        modelo.fit(X, y)
         if metodo == "importancia_nativa":
-            importancias_por_variable[col] = modelo.feature_importances_
-        elif metodo == "permutacion":
-            result = permutation_importance(
-                modelo, X, y[col], n_repeats=10, random_state=42
-            )
-            importancias_por_variable[col] = result.importances_mean
+            importancias = [modelo.feature_importances_] * len(y.columns)
         else:
-            raise ValueError("Método debe ser 'importancia_nativa' o 'permutacion'")
-
-        # Acumular las importancias para calcular el promedio
-        importancia_promedio += importancias_por_variable[col]
-
-        # Calcular variables que cubren el umbral de importancia (80%)
-        importancia_acumulada = np.cumsum(np.sort(importancias_por_variable[col])[::-1])
-        total_importancia = importancia_acumulada[-1]
-        variables_seleccionadas = X.columns[
-            np.argsort(importancias_por_variable[col])[::-1]
-        ]
+            importancias = list(_permutacion_multisalida(modelo, X, y))
+    else:
+        # Un modelo independiente por variable objetivo, ajustados en paralelo. Los procesos se
+        # reparten entre las variables objetivo y, dentro de cada una, entre los árboles y las
+        # repeticiones de la permutación, sin superar n_jobs en total
+        total = effective_n_jobs(n_jobs)
+        procesos_objetivo = max(1, min(total, len(y.columns)))
+        importancias = Parallel(n_jobs=procesos_objetivo)(
+            delayed(_ajustar_importancia_objetivo)(
+                X,
+                y[col],
+                tipo,
+                n_estimadores,
+                metodo,
+                max(1, total // procesos_objetivo),
+            )
+            for col in y.columns
+        )
+    importancias_por_variable = dict(zip(y.columns, importancias))
 
-        # Filtrar las variables que cubren el umbral o hasta alcanzar el número máximo de variables
-        if num_variables:
-            variables_importancia_umbral[col] = variables_seleccionadas[:num_variables]
-        else:
-            variables_importancia_umbral[col] = variables_seleccionadas[
-                importancia_acumulada / total_importancia <= umbral_importancia
-            ]
+    variables_importancia_umbral = {}
+    for col in y.columns:
+        variables_importancia_umbral[col] = _seleccionar_variables(
+            importancias_por_variable[col], X.columns, umbral_importancia, num_variables
+        )
 
         # Asegurar que las variables forzadas estén en las seleccionadas
         if variables_forzadas:
@@ -108,7 +163,9 @@ def obtener_importancia_variables_rf(
                         )
 
     # Calcular el promedio de las importancias
-    importancia_promedio /= len(y.columns)
+    importancia_promedio = np.mean(
+        [importancias_por_variable[col] for col in y.columns], axis=0
+    )
 
     # Crear DataFrame de importancia promedio
     df_importancia = pd.DataFrame(
@@ -119,6 +176,24 @@ def obtener_importancia_variables_rf(
     if top_variables:
         df_importancia = df_importancia.head(top_variables)
 
+    return df_importancia, importancias_por_variable, variables_importancia_umbral
+
+
+def graficar_importancia_variables_rf(
+    X,
+    y,
+    df_importancia,
+    importancias_por_variable,
+    mostrar_subplots=False,
+    columnas_subplots=4,
+):
+    """
+    Grafica la importancia promedio de las variables y, opcionalmente, un subplot por cada
+    variable objetivo, a partir de los resultados de calcular_importancia_variables_rf.
+    """
+    import math
+    import matplotlib.pyplot as plt
+
     # Graficar importancia promedio
     plt.figure(figsize=(10, 6))
     plt.bar(df_importancia["Variable"], df_importancia["Importancia"])
@@ -155,44 +230,180 @@ def obtener_importancia_variables_rf(
         plt.tight_layout()
         plt.show()
 
+
+def obtener_importancia_variables_rf(
+    X,
+    y,
+    tipo="regresion",
+    n_estimadores=100,
+    metodo="importancia_nativa",
+    top_variables=None,
+    mostrar_subplots=False,
+    columnas_subplots=4,
+    umbral_importancia=0.8,
+    num_variables=None,
+    variables_forzadas=None,
+    n_jobs=-1,
+    multisalida=False,
+    graficar=True,
+):
+    """
+    Obtiene la importancia de variables usando Random Forest para problemas multioutput.
+    Ajusta un modelo independiente para cada variable objetivo (en paralelo).
+
+    Parámetros:
+    - X: DataFrame de características
+    - y: DataFrame de variables objetivo
+    - tipo: 'regresion' o 'clasificacion'
+    - n_estimadores: número de árboles en el Random Forest
+    - metodo: 'importancia_nativa' o 'permutacion'
+    - top_variables: número de variables top a mostrar
+    - mostrar_subplots: Si es True, muestra un subplot por cada variable objetivo
+    - columnas_subplots: Número de columnas para los subplots
+    - umbral_importancia: porcentaje de importancia acumulada para seleccionar variables (por defecto 0.8)
+    - num_variables: número máximo de variables a seleccionar (se seleccionan hasta que se alcanza el umbral o hasta llegar a este número)
+    - variables_forzadas: Lista de nombres de variables que deben ser seleccionadas independientemente de los umbrales
+    - n_jobs: número de procesos a utilizar (-1 para usar todos los disponibles)
+    - multisalida: Si es True, ajusta un único Random Forest multisalida (ver calcular_importancia_variables_rf)
+    - graficar: Si es False, no se generan gráficos
+
+    Retorna:
+    - DataFrame con la importancia promedio de las variables
+    - Diccionario con importancia de variables por cada variable objetivo
+    - Diccionario con las variables que cubren el umbral de importancia
+    """
+    df_importancia, importancias_por_variable, variables_importancia_umbral = (
+        calcular_importancia_variables_rf(
+            X,
+            y,
+            tipo=tipo,
+            n_estimadores=n_estimadores,
+            metodo=metodo,
+            top_variables=top_variables,
+            umbral_importancia=umbral_importancia,
+            num_variables=num_variables,
+            variables_forzadas=variables_forzadas,
+            n_jobs=n_jobs,
+            multisalida=multisalida,
+        )
+    )
+    if graficar:
+        graficar_importancia_variables_rf(
+            X,
+            y,
+            df_importancia,
+            importancias_por_variable,
+            mostrar_subplots=mostrar_subplots,
+            columnas_subplots=columnas_subplots,
+        )
     return df_importancia, importancias_por_variable, variables_importancia_umbral
 
 
-def obtener_importancia_variables(X, umbral_varianza=0.95):
+def _bloque(X, inicio, fin):
+    # Filas [inicio, fin) de un DataFrame o de un array (por ejemplo un np.memmap)
+    filas = X.iloc[inicio:fin] if hasattr(X, "iloc") else X[inicio:fin]
+    return np.asarray(filas, dtype=float)
+
+
+def _limites_bloques(n_filas, tam_bloque, minimo):
+    # Límites de los bloques; el último se une al anterior si tiene menos de `minimo` filas
+    limites = list(range(0, n_filas, tam_bloque)) + [n_filas]
+    if len(limites) > 2 and limites[-1] - limites[-2] < minimo:
+        del limites[-2]
+    return limites
+
+
+def _componentes_pca(X, umbral_varianza, metodo, tam_bloque):
+    # Devuelve la proporción de varianza explicada y los loadings de los componentes
+    # calculados, que incluyen al menos los necesarios para alcanzar el umbral
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.decomposition import PCA, IncrementalPCA
+
+    n_filas, n_variables = X.shape
+    if metodo == "completo":
+        pca = PCA()
+        pca.fit(StandardScaler().fit_transform(X))
+        return pca.explained_variance_ratio_, pca.components_
+
+    if metodo == "aleatorio":
+        # SVD aleatorizada con cada vez más componentes hasta alcanzar el umbral
+        X_escalado = StandardScaler().fit_transform(X)
+        maximo = min(n_filas, n_variables)
+        k = min(10, maximo)
+        while True:
+            pca = PCA(n_components=k, svd_solver="randomized", random_state=42)
+            pca.fit(X_escalado)
+            if pca.explained_variance_ratio_.sum() >= umbral_varianza or k >= maximo:
+                return pca.explained_variance_ratio_, pca.components_
+            k = min(2 * k, maximo)
+
+    if metodo == "incremental":
+        # Dos pasadas por bloques: medias y varianzas para estandarizar y después PCA
+        n_componentes = min(n_variables, tam_bloque, n_filas)
+        limites = _limites_bloques(n_filas, tam_bloque, n_componentes)
+        scaler = StandardScaler()
+        for inicio, fin in zip(limites[:-1], limites[1:]):
+            scaler.partial_fit(_bloque(X, inicio, fin))
+        pca = IncrementalPCA(n_components=n_componentes)
+        for inicio, fin in zip(limites[:-1], limites[1:]):
+            pca.partial_fit(scaler.transform(_bloque(X, inicio, fin)))
+        return pca.explained_variance_ratio_, pca.components_
+
+    raise ValueError("metodo debe ser 'completo', 'aleatorio' o 'incremental'")
+
+
+def obtener_importancia_variables(
+    X,
+    umbral_varianza=0.95,
+    metodo="completo",
+    tam_bloque=1000,
+    columnas=None,
+    graficar=True,
+):
     """
     Obtiene la importancia de las variables originales usando los loadings
     de los componentes principales que explican un umbral de varianza
 
     Parámetros:
-    - X: DataFrame de datos con características
+    - X: DataFrame de datos con características (o array, por ejemplo un np.memmap,
+      indicando los nombres en `columnas`)
     - umbral_varianza: Porcentaje de varianza acumulada a preservar (defecto 95%)
+    - metodo: 'completo' (PCA con todos los componentes), 'aleatorio' (SVD aleatorizada
+      que añade componentes hasta alcanzar el umbral) o 'incremental' (IncrementalPCA por
+      bloques de filas, para matrices que no caben en memoria)
+    - tam_bloque: Número de filas de cada bloque en el método incremental
+    - columnas: Nombres de las variables si X no es un DataFrame
+    - graficar: Si es True se muestra el gráfico de importancias
 
     Retorna:
     - DataFrame con la importancia de cada variable original
     """
-    # Estandarizar los datos
-    scaler = StandardScaler()
-    X_escalado = scaler.fit_transform(X)
+    if columnas is None:
+        columnas = X.columns
 
-    # Realizar PCA inicial para determinar número de componentes
-    pca = PCA()
-    pca.fit(X_escalado)
+    # Calcular los componentes principales (estandarizando los datos)
+    ratio_varianza, componentes = _componentes_pca(
+        X, umbral_varianza, metodo, tam_bloque
+    )
 
     # Calcular varianza acumulada
-    varianza_acumulada = np.cumsum(pca.explained_variance_ratio_)
+    varianza_acumulada = np.cumsum(ratio_varianza)
 
     # Determinar número de componentes a preservar
-    num_componentes = np.argmax(varianza_acumulada >= umbral_varianza) + 1
+    if varianza_acumulada[-1] >= umbral_varianza:
+        num_componentes = np.argmax(varianza_acumulada >= umbral_varianza) + 1
+    else:
+        num_componentes = len(varianza_acumulada)
 
     print(f"Número de componentes seleccionados: {num_componentes}")
     print("Varianza explicada por estos componentes:")
-    varianza_componentes = pca.explained_variance_ratio_[:num_componentes]
+    varianza_componentes = ratio_varianza[:num_componentes]
     for i, var in enumerate(varianza_componentes):
         print(f"Componente {i+1}: {var*100:.2f}%")
     print(f"Varianza acumulada: {varianza_acumulada[num_componentes-1]*100:.2f}%")
 
     # Obtener los loadings de los componentes seleccionados
-    loadings = pca.components_[:num_componentes]
+    loadings = componentes[:num_componentes]
 
     # Calcular la importancia de las variables
     # Usar la suma de los cuadrados de los loadings para cada variable
@@ -203,9 +414,14 @@ def obtener_importancia_variables(X, umbral_varianza=0.95):
 
     # Crear DataFrame con la importancia de las variables
     df_importancia = pd.DataFrame(
-        {"Variable": X.columns, "Importancia": importancia_variables}
+        {"Variable": columnas, "Importancia": importancia_variables}
     ).sort_values("Importancia", ascending=False)
 
+    if not graficar:
+        return df_importancia
+
+    import matplotlib.pyplot as plt
+
     # Graficar la importancia de las variables
     plt.figure(figsize=(10, 6))
     plt.bar(df_importancia["Variable"], df_importancia["Importancia"])
@@ -225,42 +441,15 @@ def obtener_importancia_variables(X, umbral_varianza=0.95):
 
 
 def plot_importancia(best_models, X, y, variables_importantes):
-    variable_interes = "INC_SMI_REAL"  # Sustituir por el nombre de la variable
-
-    # Diccionario para almacenar los resultados
-    importances_list = []
-
-    # Calcular la importancia para cada modelo
-    for target_variable, model in best_models.items():
-        # Obtener la importancia de las variables para el modelo
-        result = permutation_importance(
-            model,
-            X[variables_importantes[target_variable]],
-            y[target_variable],
-            n_repeats=30,
-            random_state=42,
-        )
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-        # Buscar la importancia de la variable de interés
-        if variable_interes in X[variables_importantes[target_variable]].columns:
-            temp_df = pd.DataFrame(
-                {
-                    "Variable": [variable_interes],
-                    "Importancia": [
-                        result.importances_mean[
-                            X[variables_importantes[target_variable]].columns.get_loc(
-                                variable_interes
-                            )
-                        ]
-                    ],
-                    "Modelo": [target_variable],
-                }
-            )
-            # Añadir el resultado a la lista
-            importances_list.append(temp_df)
+    variable_interes = "INC_SMI_REAL"  # Sustituir por el nombre de la variable
 
-    # Combinar todos los DataFrames en uno solo
-    importances_df = pd.concat(importances_list, ignore_index=True)
+    # Calcular la importancia de la variable de interés para cada modelo
+    importances_df = importancia_variable_interes(
+        best_models, X, y, variables_importantes, variable_interes
+    )
 
     # Crear un gráfico de barras
     plt.figure(figsize=(8, 6))
@@ -0,0 +1,199 @@
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from joblib import Parallel, delayed
+from cache_resultados import huella_datos
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+
+def _puntuar(model, X_var, y_var, kf):
+    # R² medio en validación cruzada de un subconjunto de variables
+    from sklearn.model_selection import cross_val_score
+
+    return cross_val_score(model, X_var, y_var, cv=kf, scoring="r2")
+
+
+def _evaluar_subconjuntos(
+    subconjuntos, model, X, y_var, kf, memoria, cache, huella, target, n_jobs
+):
+    # Devuelve el R² de cada subconjunto, evaluando en paralelo solo los que no están ya en la
+    # memoria (por frozenset) ni en la caché en disco
+    pendientes = []
+    claves = {}
+    for s in subconjuntos:
+        if s in memoria or s in claves:
+            continue
+        columnas = [c for c in X.columns if c in s]
+        if cache is not None:
+            clave = cache.clave(X[columnas], y_var, model, kf)
+            scores = cache.obtener(clave)
+            if scores is not None:
+                memoria[s] = float(np.mean(scores))
+                continue
+            claves[s] = clave
+        else:
+            claves[s] = None
+        pendientes.append((s, columnas))
+
+    resultados = Parallel(n_jobs=n_jobs)(
+        delayed(_puntuar)(model, X[columnas], y_var, kf) for _, columnas in pendientes
+    )
+    for (s, _), scores in zip(pendientes, resultados):
+        memoria[s] = float(np.mean(scores))
+        if cache is not None:
+            cache.guardar(claves[s], scores, huella, target, model)
+    return [memoria[s] for s in subconjuntos], len(pendientes)
+
+
+def seleccion_secuencial(
+    X,
+    y,
+    objetivos,
+    model,
+    candidatas=None,
+    direccion="forward",
+    variables_forzadas=("INC_SMI_REAL",),
+    max_variables=None,
+    min_mejora=0.001,
+    n_jobs=-1,
+    cache=None,
+):
+    """
+    Selecciona las variables predictoras de cada variable objetivo optimizando directamente el
+    R² en validación cruzada (KFold de 5 pliegues, como en evaluacion_modelo). En cada paso se
+    evalúan en paralelo todas las variables que se pueden añadir (forward) o quitar (backward)
+    y se aplica el mejor cambio. Las puntuaciones se guardan por subconjunto de variables, de
+    modo que los subconjuntos ya evaluados no se repiten, y opcionalmente también en una
+    cache_resultados.CacheResultados para reutilizarlas entre sesiones.
+
+    La búsqueda se detiene cuando el mejor cambio mejora el R² menos de `min_mejora` (forward)
+    o lo empeora más de `min_mejora` (backward).
+
+    Parameters
+    ----------
+    X : pandas.DataFrame
+        Conjunto de datos con las variables predictoras.
+    y : pandas.DataFrame
+        Conjunto de datos con las variables objetivo.
+    objetivos : list o dict
+        Variables objetivo. Si se pasa un diccionario variables_importantes, en la búsqueda
+        backward se parte de sus variables.
+    model : sklearn.Model
+        Modelo con el que se evalúa cada subconjunto.
+    candidatas : list, optional
+        Variables entre las que se selecciona. Por defecto todas las columnas de X.
+    direccion : str
+        'forward' (añadir variables) o 'backward' (quitar variables).
+    variables_forzadas : tuple
+        Variables que siempre se incluyen, como INC_SMI_REAL.
+    max_variables : int, optional
+        Número máximo de variables en la búsqueda forward.
+    min_mejora : float
+        Cambio mínimo de R² para continuar la búsqueda.
+    n_jobs : int
+        Número de procesos para evaluar los candidatos de cada paso.
+    cache : cache_resultados.CacheResultados, optional
+        Caché en disco de las puntuaciones.
+
+    Returns
+    -------
+    dict
+        Diccionario variables_importantes con las variables seleccionadas para cada variable
+        objetivo, listo para evaluacion_modelo.
+    pandas.DataFrame
+        Historial de la búsqueda con el cambio aplicado en cada paso, el R² obtenido y el
+        número de subconjuntos evaluados (los recuperados de memoria no cuentan).
+    """
+    from sklearn.model_selection import KFold
+
+    if direccion not in ("forward", "backward"):
+        raise ValueError("direccion debe ser 'forward' o 'backward'")
+    kf = KFold(n_splits=5, shuffle=True, random_state=42)
+    if candidatas is None:
+        candidatas = list(X.columns)
+    huella = None
+    if cache is not None:
+        huella = huella_datos(X, y)
+        cache.expirar(huella)
+
+    seleccion = {}
+    historial = []
+    for target_variable in objetivos:
+        y_var = y[target_variable]
+        forzadas = frozenset(v for v in variables_forzadas if v in X.columns)
+        if direccion == "forward":
+            actual = forzadas
+        elif isinstance(objetivos, dict):
+            actual = frozenset(objetivos[target_variable]) | forzadas
+        else:
+            actual = frozenset(candidatas) | forzadas
+        memoria = {}
+        puntuacion = -np.inf
+        if actual:
+            (puntuacion,), _ = _evaluar_subconjuntos(
+                [actual],
+                model,
+                X,
+                y_var,
+                kf,
+                memoria,
+                cache,
+                huella,
+                target_variable,
+                n_jobs,
+            )
+
+        paso = 0
+        while True:
+            if direccion == "forward":
+                if max_variables is not None and len(actual) >= max_variables:
+                    break
+                cambios = [v for v in candidatas if v not in actual]
+                subconjuntos = [actual | {v} for v in cambios]
+            else:
+                cambios = [v for v in X.columns if v in actual and v not in forzadas]
+                if len(actual) <= 1:
+                    cambios = []
+                subconjuntos = [actual - {v} for v in cambios]
+            if not cambios:
+                break
+
+            puntuaciones, evaluadas = _evaluar_subconjuntos(
+                subconjuntos,
+                model,
+                X,
+                y_var,
+                kf,
+                memoria,
+                cache,
+                huella,
+                target_variable,
+                n_jobs,
+            )
+            mejor = int(np.argmax(puntuaciones))
+            mejora = puntuaciones[mejor] - puntuacion
+            if (direccion == "forward" and mejora < min_mejora) or (
+                direccion == "backward" and mejora < -min_mejora
+            ):
+                break
+            actual = subconjuntos[mejor]
+            puntuacion = puntuaciones[mejor]
+            historial.append(
+                {
+                    "Variable Objetivo": target_variable,
+                    "Paso": paso,
+                    "Acción": "añadir" if direccion == "forward" else "quitar",
+                    "Variable": cambios[mejor],
+                    "R2": puntuacion,
+                    "Número de variables": len(actual),
+                    "Evaluaciones": evaluadas,
+                }
+            )
+            paso += 1
+        seleccion[target_variable] = [c for c in X.columns if c in actual]
+    if cache is not None:
+        cache.volcar()
+    return seleccion, pd.DataFrame(historial)
@@ -0,0 +1,433 @@
+"""
+Servicio HTTP local de simulación. Carga una vez el registro de modelos y el panel de estados
+(comunidad × periodo) y responde a peticiones JSON:
+
+    GET  /salud          estado del servicio y versión del registro
+    GET  /estadisticas   peticiones, lotes y filas predichas
+    POST /prediccion     {"ccaa", "periodo", "inc"}: incrementos predichos para uno o varios
+                         incrementos del SMI
+    POST /optimo         {"ccaa", "periodo", "pesos", "min_inc", "max_inc", "pasos",
+                         "n_puntos"}: incremento óptimo en cada paso, como simulacion_smi
+    POST /barrido        {"ccaa", "periodo", "min_inc", "max_inc", "n_puntos", "tam_bloque"}:
+                         curva de predicciones por incremento, enviada por bloques (NDJSON)
+
+Las peticiones concurrentes que llegan dentro de una ventana corta (`ventana`, 2 ms por
+defecto) se agrupan en un único lote, con una sola llamada a predict por variable objetivo. La
+predicción se hace en un hilo aparte para que el servicio siga recibiendo peticiones (y
+formando el siguiente lote) mientras tanto.
+
+Objetivos de rendimiento con el registro del trabajo (17 comunidades, modelos de árboles) en
+una máquina de 4 núcleos y 64 clientes concurrentes, comprobados por
+benchmarks/carga_servicio.py:
+    - /prediccion: latencia p95 ≤ 50 ms y al menos 500 peticiones por segundo.
+    - /barrido de 150 incrementos: primer bloque en ≤ 20 ms y curva completa en ≤ 200 ms.
+
+Uso (desde este directorio):
+    python servicio_simulacion.py --registro ../../../../modelos --panel panel.csv
+Sin --panel se usa el panel imputado de la última ejecución de pipeline.py.
+"""
+
+import json
+import asyncio
+import argparse
+from urllib.parse import urlsplit
+import pandas as pd
+import numpy as np
+import warnings
+from pandas.errors import SettingWithCopyWarning
+from panel import AlmacenPanel
+
+warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+OBJETIVO_P95_MS = 50
+OBJETIVO_PETICIONES_S = 500
+OBJETIVO_PRIMER_BLOQUE_MS = 20
+OBJETIVO_BARRIDO_MS = 200
+
+class _FlujoInterrumpido(Exception):
+    # Error en una respuesta por bloques cuya cabecera 200 ya se ha enviado: no se puede
+    # responder con otro código y la conexión se cierra para que el cliente vea la respuesta
+    # incompleta
+    pass
+
+
+_ESTADOS_HTTP = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class Lotes:
+    """
+    Agrupa las predicciones pedidas de forma concurrente. Cada petición aporta un DataFrame de
+    filas (estado e INC_SMI_REAL ya fijado) y recibe un diccionario {objetivo: array} con las
+    predicciones de sus filas.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo de cada variable objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    ventana : float
+        Segundos que se espera a otras peticiones desde la primera de un lote.
+    max_filas : int
+        Número máximo de filas por lote.
+    """
+
+    def __init__(self, best_models, variables_importantes, ventana=0.002, max_filas=50000):
+        self.best_models = best_models
+        self.variables_importantes = variables_importantes
+        self.ventana = ventana
+        self.max_filas = max_filas
+        self.estadisticas = {"peticiones": 0, "lotes": 0, "filas": 0}
+        self._cola = None
+        self._tarea = None
+
+    def iniciar(self):
+        self._cola = asyncio.Queue()
+        self._tarea = asyncio.get_running_loop().create_task(self._bucle())
+
+    async def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+
+    async def predecir(self, filas):
+        futuro = asyncio.get_running_loop().create_future()
+        await self._cola.put((filas, futuro))
+        return await futuro
+
+    def _predecir(self, datos):
+        return {
+            target: np.asarray(
+                model.predict(datos[self.variables_importantes[target]]), dtype=float
+            ).ravel()
+            for target, model in self.best_models.items()
+        }
+
+    async def _bucle(self):
+        bucle = asyncio.get_running_loop()
+        while True:
+            lote = [await self._cola.get()]
+            n_filas = len(lote[0][0])
+            limite = bucle.time() + self.ventana
+            while n_filas < self.max_filas:
+                restante = limite - bucle.time()
+                if restante <= 0:
+                    break
+                try:
+                    elemento = await asyncio.wait_for(self._cola.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+                lote.append(elemento)
+                n_filas += len(elemento[0])
+
+            datos = pd.concat([filas for filas, _ in lote], ignore_index=True)
+            self.estadisticas["peticiones"] += len(lote)
+            self.estadisticas["lotes"] += 1
+            self.estadisticas["filas"] += n_filas
+            try:
+                predicciones = await bucle.run_in_executor(None, self._predecir, datos)
+            except Exception as error:
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(error)
+                continue
+
+            inicio = 0
+            for filas, futuro in lote:
+                fin = inicio + len(filas)
+                if not futuro.done():
+                    futuro.set_result(
+                        {t: p[inicio:fin] for t, p in predicciones.items()}
+                    )
+                inicio = fin
+
+
+class ServicioSimulacion:
+    """
+    Servicio de simulación sobre un registro de modelos y un panel de estados.
+
+    Parameters
+    ----------
+    best_models : dict
+        Diccionario con el modelo de cada variable objetivo.
+    variables_importantes : dict
+        Diccionario con las variables predictoras de cada variable objetivo.
+    panel : pd.DataFrame or AlmacenPanel
+        Panel con las columnas ccaa, periodo y las variables de estado.
+    version : str, optional
+        Versión del registro, informada en /salud.
+    ventana : float
+        Ventana de agrupación de peticiones en segundos.
+    """
+
+    def __init__(
+        self, best_models, variables_importantes, panel, version=None, ventana=0.002
+    ):
+        self.lotes = Lotes(best_models, variables_importantes, ventana)
+        self.version = version
+        self.objetivos = list(best_models)
+        if not isinstance(panel, AlmacenPanel):
+            panel = AlmacenPanel.desde_dataframe(panel)
+        self.panel = panel.instantanea()
+        self._servidor = None
+
+    @classmethod
+    def desde_registro(cls, ruta, panel, version=None, ventana=0.002):
+        from registro_modelos import cargar_registro
+
+        best_models, variables_importantes, manifiesto = cargar_registro(ruta, version)
+        return cls(
+            best_models, variables_importantes, panel, manifiesto["version"], ventana
+        )
+
+    # ----------------------------------------------------------------------------------------
+    # Simulaciones
+    # ----------------------------------------------------------------------------------------
+
+    def estado(self, ccaa, periodo):
+        return self.panel.estado(ccaa, int(periodo))
+
+    async def _predecir_incrementos(self, estado, incrementos):
+        # Una fila del estado por incremento; se agrupa con las demás peticiones en curso
+        filas = estado.iloc[np.zeros(len(incrementos), dtype=int)].reset_index(drop=True)
+        filas["INC_SMI_REAL"] = incrementos
+        return await self.lotes.predecir(filas)
+
+    async def prediccion(self, ccaa, periodo, inc):
+        incrementos = np.atleast_1d(np.asarray(inc, dtype=float))
+        predicciones = await self._predecir_incrementos(
+            self.estado(ccaa, periodo), incrementos
+        )
+        return {
+            "inc": incrementos.tolist(),
+            "predicciones": {t: p.tolist() for t, p in predicciones.items()},
+        }
+
+    async def optimo(
+        self, ccaa, periodo, pesos, min_inc=0.0, max_inc=0.1, pasos=5, n_puntos=150
+    ):
+        # Igual que simulacion.simulacion_smi con una función objetivo ponderada
+        from simulacion import increase_vars
+
+        desconocidos = set(pesos) - set(self.objetivos)
+        if desconocidos:
+            raise ValueError(f"Variables objetivo desconocidas: {sorted(desconocidos)}")
+        incrementos = np.linspace(min_inc, max_inc, n_puntos)
+        df_temp = self.estado(ccaa, periodo)
+        evolucion = []
+        for paso in range(pasos):
+            predicciones = await self._predecir_incrementos(df_temp, incrementos)
+            valor = sum(peso * predicciones[t] for t, peso in pesos.items())
+            mejor = int(np.argmax(valor))
+            df_temp["INC_SMI_REAL"] = incrementos[mejor]
+            evolucion.append(
+                {"paso": paso, "valor": float(valor[mejor]), **df_temp.iloc[0].to_dict()}
+            )
+            df_temp = increase_vars(
+                {t: p[mejor] for t, p in predicciones.items()}, df_temp
+            )
+        return {"evolucion": evolucion}
+
+    async def barrido(
+        self, ccaa, periodo, min_inc=-0.05, max_inc=0.15, n_puntos=150, tam_bloque=25
+    ):
+        # Generador de bloques de la curva (listas de filas); cada bloque se pide en cuanto se
+        # ha enviado el anterior
+        estado = self.estado(ccaa, periodo)
+        incrementos = np.linspace(min_inc, max_inc, n_puntos)
+        for inicio in range(0, n_puntos, tam_bloque):
+            bloque = incrementos[inicio : inicio + tam_bloque]
+            predicciones = await self._predecir_incrementos(estado, bloque)
+            yield [
+                {"inc": float(inc), **{t: float(p[i]) for t, p in predicciones.items()}}
+                for i, inc in enumerate(bloque)
+            ]
+
+    # ----------------------------------------------------------------------------------------
+    # HTTP
+    # ----------------------------------------------------------------------------------------
+
+    async def _responder(self, escritor, codigo, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode()
+        escritor.write(
+            (
+                f"HTTP/1.1 {codigo} {_ESTADOS_HTTP[codigo]}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(cuerpo)}\r\n\r\n"
+            ).encode()
+            + cuerpo
+        )
+        await escritor.drain()
+
+    async def _responder_flujo(self, escritor, generador):
+        # Transfer-Encoding: chunked, un trozo por bloque y una línea JSON por incremento
+        escritor.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        try:
+            async for bloque in generador:
+                trozo = "".join(json.dumps(f, ensure_ascii=False) + "\n" for f in bloque)
+                trozo = trozo.encode()
+                escritor.write(f"{len(trozo):X}\r\n".encode() + trozo + b"\r\n")
+                await escritor.drain()
+        except ConnectionError:
+            raise
+        except Exception as error:
+            raise _FlujoInterrumpido(repr(error)) from error
+        escritor.write(b"0\r\n\r\n")
+        await escritor.drain()
+
+    async def _atender(self, metodo, ruta, cuerpo, escritor):
+        if ruta == "/salud":
+            return await self._responder(
+                escritor,
+                200,
+                {"estado": "ok", "version": self.version, "objetivos": self.objetivos},
+            )
+        if ruta == "/estadisticas":
+            estadisticas = dict(self.lotes.estadisticas)
+            lotes = estadisticas["lotes"]
+            estadisticas["peticiones_por_lote"] = (
+                estadisticas["peticiones"] / lotes if lotes else None
+            )
+            return await self._responder(escritor, 200, estadisticas)
+        if ruta not in ("/prediccion", "/optimo", "/barrido"):
+            return await self._responder(escritor, 404, {"error": "Ruta desconocida"})
+        if metodo != "POST":
+            return await self._responder(escritor, 405, {"error": "Use POST"})
+
+        parametros = json.loads(cuerpo or b"{}")
+        if ruta == "/prediccion":
+            return await self._responder(
+                escritor, 200, await self.prediccion(**parametros)
+            )
+        if ruta == "/optimo":
+            return await self._responder(escritor, 200, await self.optimo(**parametros))
+        generador = self.barrido(**parametros)
+        # El primer bloque se calcula antes de enviar la cabecera para poder devolver un error
+        primero = await generador.__anext__()
+
+        async def completo():
+            yield primero
+            async for bloque in generador:
+                yield bloque
+
+        return await self._responder_flujo(escritor, completo())
+
+    @staticmethod
+    async def _leer_peticion(lector):
+        # Devuelve (método, ruta, cabeceras, cuerpo), None si el cliente ha cerrado la conexión
+        # o ValueError si la petición está mal formada
+        linea = await lector.readline()
+        if not linea:
+            return None
+        partes = linea.decode("latin-1").split(" ", 2)
+        if len(partes) != 3:
+            raise ValueError("Línea de petición mal formada")
+        metodo, objetivo, _ = partes
+        cabeceras = {}
+        while True:
+            cabecera = await lector.readline()
+            if cabecera in (b"\r\n", b"\n", b""):
+                break
+            nombre, _, valor = cabecera.decode("latin-1").partition(":")
+            cabeceras[nombre.strip().lower()] = valor.strip()
+        longitud = int(cabeceras.get("content-length", 0))
+        if longitud < 0:
+            raise ValueError("Content-Length negativo")
+        cuerpo = await lector.readexactly(longitud) if longitud else b""
+        return metodo, urlsplit(objetivo).path, cabeceras, cuerpo
+
+    async def _conexion(self, lector, escritor):
+        # Conexiones persistentes (keep-alive) con peticiones HTTP/1.1 sencillas
+        try:
+            while True:
+                try:
+                    peticion = await self._leer_peticion(lector)
+                except ValueError as error:
+                    # No se sabe dónde empieza la siguiente petición: se cierra la conexión
+                    await self._responder(escritor, 400, {"error": str(error)})
+                    break
+                if peticion is None:
+                    break
+                metodo, ruta, cabeceras, cuerpo = peticion
+                try:
+                    await self._atender(metodo, ruta, cuerpo, escritor)
+                except _FlujoInterrumpido:
+                    break
+                except KeyError as error:
+                    await self._responder(escritor, 404, {"error": str(error.args[0])})
+                except (ValueError, TypeError, StopAsyncIteration) as error:
+                    await self._responder(escritor, 400, {"error": str(error)})
+                except Exception as error:
+                    await self._responder(escritor, 500, {"error": repr(error)})
+                if cabeceras.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def iniciar(self, host="127.0.0.1", puerto=8765):
+        """
+        Inicia el servicio y devuelve el puerto en el que escucha (útil con puerto=0).
+        """
+        self.lotes.iniciar()
+        self._servidor = await asyncio.start_server(self._conexion, host, puerto)
+        return self._servidor.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+        await self.lotes.detener()
+
+
+async def _servir(servicio, host, puerto):
+    puerto = await servicio.iniciar(host, puerto)
+    print(f"Servicio de simulación en http://{host}:{puerto} (registro {servicio.version})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servicio.detener()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio HTTP local de simulación")
+    parser.add_argument("--registro", required=True, help="directorio del registro")
+    parser.add_argument("--version", help="versión del registro (la actual por defecto)")
+    parser.add_argument("--panel", help="CSV con el panel (ccaa, periodo, estados)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--ventana", type=float, default=2.0, help="ventana en ms")
+    args = parser.parse_args()
+
+    if args.panel:
+        panel = pd.read_csv(args.panel)
+    else:
+        from pipeline import cargar_resultado
+
+        panel = cargar_resultado("imputacion")
+    servicio = ServicioSimulacion.desde_registro(
+        args.registro, panel, args.version, args.ventana / 1000
+    )
+    try:
+        asyncio.run(_servir(servicio, args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
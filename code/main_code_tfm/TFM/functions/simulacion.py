@@ -1,13 +1,14 @@
-from scipy.optimize import minimize
 import pandas as pd
 import numpy as np
 import warnings
 from pandas.errors import SettingWithCopyWarning
+from telemetria import instrumentar
 
 warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
 warnings.filterwarnings("ignore", category=RuntimeWarning)
 
 
+@instrumentar
 def model_prediction(inc_smi, data, best_models, variables_importantes):
     # Creamos la prediccion para todos los valores
     results = {}
@@ -20,6 +21,7 @@ def model_prediction(inc_smi, data, best_models, variables_importantes):
     return results
 
 
+@instrumentar
 def increase_vars(inc_values, data):
     # Recorremos los valores incrementales y seleccionamos la variable para aumentar el valor correspondiente
 
@@ -34,6 +36,7 @@ def increase_vars(inc_values, data):
     return data
 
 
+@instrumentar
 def simulacion_smi(
     min_inc,
     max_inc,
@@ -92,3 +95,314 @@ def simulacion_smi(
         df_temp = increase_vars(increases, df_temp)
     evol_df = pd.concat(evolution)
     return evol_df
+
+
+@instrumentar
+def model_prediction_batch(inc_values, data, best_models, variables_importantes):
+    """
+    Calcula la predicción de todos los modelos para cada fila de data y cada incremento del
+    salario mínimo, con una única llamada a predict por variable objetivo.
+
+    Parameters
+    ----------
+    inc_values : array-like
+        Incrementos del salario mínimo a evaluar
+    data : pd.DataFrame
+        DataFrame con un estado por fila (por ejemplo una fila por comunidad autónoma)
+    best_models : dict
+        Diccionario con los modelos de prediccion para cada variable objetivo
+    variables_importantes : dict
+        Diccionario con las variables importantes para cada variable objetivo
+
+    Returns
+    -------
+    dict
+        Diccionario con un array (filas × incrementos) de predicciones para cada variable objetivo
+    """
+    inc_values = np.atleast_1d(np.asarray(inc_values, dtype=float))
+    n_filas, n_inc = len(data), len(inc_values)
+    data_rep = data.iloc[np.repeat(np.arange(n_filas), n_inc)].copy()
+    data_rep["INC_SMI_REAL"] = np.tile(inc_values, n_filas)
+    results = {}
+    for target_val, best_model in best_models.items():
+        results[target_val] = np.asarray(
+            best_model.predict(data_rep[variables_importantes[target_val]]),
+            dtype=float,
+        ).reshape(n_filas, n_inc)
+    return results
+
+
+@instrumentar
+def increase_vars_batch(inc_values, data):
+    # Igual que increase_vars, pero con un incremento distinto para cada fila de data
+    for col in data.columns:
+        for inc in inc_values:
+            if col in inc:
+                if col != "CARENCIA":
+                    data[col] *= 1 + np.asarray(inc_values[inc])
+                else:
+                    data[col] += np.asarray(inc_values[inc])
+                break
+    return data
+
+
+@instrumentar
+def optimizacion_nacional(
+    min_inc,
+    max_inc,
+    df_regiones,
+    fun,
+    best_models,
+    variables_importantes,
+    pesos=None,
+    restricciones=None,
+    pasos=1,
+    n_puntos=150,
+):
+    """
+    Busca el incremento único (nacional) del salario mínimo que maximiza un objetivo agregado
+    sobre todas las comunidades autónomas, ponderado por ejemplo por ocupados o población, y
+    que cumple unas cotas por variable en todas las comunidades. En cada paso se predicen a la
+    vez todas las comunidades y todos los incrementos candidatos (una llamada a predict por
+    variable objetivo), por lo que el coste es similar al de simular una sola comunidad.
+
+    Parameters
+    ----------
+    min_inc : float
+        Valor minimo de aumento del salario minimo permitido
+    max_inc : float
+        Valor maximo de aumento del salario minimo permitido
+    df_regiones : pd.DataFrame
+        DataFrame con el estado de partida de cada comunidad (una fila por comunidad)
+    fun : funcion
+        Funcion que recibe un diccionario {variable objetivo: array (comunidades × candidatos)}
+        y devuelve el valor a maximizar para cada comunidad y candidato. Por ejemplo
+        lambda x: 0.5 * x["PIB_CAPITA_delta1"] - 0.5 * x["IPC_delta1"]
+    best_models : dict
+        Diccionario con los modelos de prediccion para cada variable objetivo
+    variables_importantes : dict
+        Diccionario con las variables importantes para cada variable objetivo
+    pesos : str o array-like, optional
+        Peso de cada comunidad en el objetivo agregado: nombre de una columna de df_regiones o
+        un valor por fila. Por defecto todas las comunidades pesan igual.
+    restricciones : dict, optional
+        Diccionario {variable objetivo: (minimo, maximo)} con las cotas que deben cumplirse en
+        todas las comunidades (None para no acotar), por ejemplo {"PARO_25_delta1": (None, 0)}
+    pasos : int
+        Numero de pasos que se realizan en la simulacion
+    n_puntos : int
+        Numero de incrementos candidatos entre min_inc y max_inc
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame con la evolucion del estado de cada comunidad en cada paso (columna 'paso')
+    pd.DataFrame
+        Resumen por paso con el incremento elegido, el valor del objetivo agregado y el número
+        de candidatos que cumplen las restricciones
+    """
+    if pesos is None:
+        pesos = np.ones(len(df_regiones))
+    elif isinstance(pesos, str):
+        pesos = df_regiones[pesos].to_numpy(dtype=float)
+    pesos = np.asarray(pesos, dtype=float)
+    pesos = pesos / pesos.sum()
+    candidatos = np.linspace(min_inc, max_inc, n_puntos)
+
+    evolution = []
+    resumen = []
+    df_temp = df_regiones.copy()
+    for step in range(pasos):
+        predicciones = model_prediction_batch(
+            candidatos, df_temp, best_models, variables_importantes
+        )
+        # Objetivo agregado de cada candidato
+        valores = pesos @ np.asarray(fun(predicciones), dtype=float)
+
+        # Descartamos los candidatos que incumplen alguna cota en alguna comunidad
+        factible = np.ones(n_puntos, dtype=bool)
+        for target_val, (minimo, maximo) in (restricciones or {}).items():
+            if minimo is not None:
+                factible &= (predicciones[target_val] >= minimo).all(axis=0)
+            if maximo is not None:
+                factible &= (predicciones[target_val] <= maximo).all(axis=0)
+        if not factible.any():
+            raise ValueError(
+                f"Ningún incremento entre {min_inc} y {max_inc} cumple las restricciones "
+                f"en el paso {step}"
+            )
+        best = int(np.argmax(np.where(factible, valores, -np.inf)))
+        best_inc = candidatos[best]
+        resumen.append(
+            {
+                "paso": step,
+                "INC_SMI_REAL": best_inc,
+                "objetivo": valores[best],
+                "candidatos_factibles": int(factible.sum()),
+            }
+        )
+
+        # Aplicamos el incremento elegido usando las predicciones ya calculadas
+        df_temp["INC_SMI_REAL"] = best_inc
+        estado = df_temp.copy()
+        estado["paso"] = step
+        evolution.append(estado)
+        increases = {t: p[:, best] for t, p in predicciones.items()}
+        df_temp = increase_vars_batch(increases, df_temp)
+    return pd.concat(evolution), pd.DataFrame(resumen)
+
+
+@instrumentar
+def ajustar_sustituto(
+    data, best_models, variables_importantes, min_inc, max_inc, n_nodos=25
+):
+    """
+    Ajusta una aproximación lineal a trozos de la respuesta de cada variable objetivo al
+    incremento del salario mínimo, alrededor del estado actual (una fila). Solo requiere una
+    llamada a predict por variable objetivo sobre n_nodos incrementos.
+
+    Returns
+    -------
+    dict
+        Diccionario con el estado de anclaje, los nodos de la rejilla y las predicciones en
+        los nodos para cada variable objetivo
+    """
+    nodos = np.linspace(min_inc, max_inc, n_nodos)
+    valores = model_prediction_batch(nodos, data, best_models, variables_importantes)
+    return {
+        "ancla": data.iloc[0].copy(),
+        "nodos": nodos,
+        "valores": {t: v[0] for t, v in valores.items()},
+    }
+
+
+def evaluar_sustituto(sustituto, inc_values):
+    # Predicciones aproximadas (1 × incrementos) por interpolación lineal entre los nodos
+    inc_values = np.atleast_1d(np.asarray(inc_values, dtype=float))
+    return {
+        t: np.interp(inc_values, sustituto["nodos"], v)[None, :]
+        for t, v in sustituto["valores"].items()
+    }
+
+
+def deriva_sustituto(sustituto, data, variable="INC_SMI_REAL", atol=1.0):
+    # Mayor cambio de las variables de estado respecto al estado de anclaje, relativo a
+    # |referencia| + atol: relativo en las variables grandes y absoluto en las cercanas a 0
+    # (incrementos *_delta1), que con un cambio puramente relativo forzarían un reajuste en
+    # cada paso. atol puede ser un número o un valor por columna (por ejemplo su rango en el
+    # panel de entrenamiento, X.max() - X.min())
+    ancla = sustituto["ancla"]
+    columnas = [
+        c for c in data.columns if c != variable and pd.api.types.is_numeric_dtype(data[c])
+    ]
+    actual = data.iloc[0][columnas].to_numpy(dtype=float)
+    referencia = ancla[columnas].to_numpy(dtype=float)
+    if isinstance(atol, (dict, pd.Series)):
+        atol = np.array([atol.get(c, 1.0) for c in columnas], dtype=float)
+    cambio = np.abs(actual - referencia) / (np.abs(referencia) + atol)
+    return float(np.nanmax(cambio)) if len(cambio) else 0.0
+
+
+@instrumentar
+def simulacion_smi_sustituto(
+    min_inc,
+    max_inc,
+    df,
+    fun,
+    best_models,
+    variables_importantes,
+    pasos=5,
+    n_puntos=150,
+    top_k=5,
+    n_nodos=25,
+    radio=0.05,
+    atol=1.0,
+):
+    """
+    Versión de simulacion_smi que usa un modelo sustituto para acelerar la búsqueda del
+    incremento óptimo. En cada paso los n_puntos candidatos se puntúan con una aproximación
+    lineal a trozos de la respuesta de los modelos y solo los top_k mejores se comprueban con
+    los modelos reales, de los que se elige el mejor. El sustituto se vuelve a ajustar cuando
+    alguna variable de estado se aleja más de `radio` del estado en el que se ajustó (región de
+    confianza), con el cambio medido como |actual - ancla| / (|ancla| + atol).
+
+    Parameters
+    ----------
+    min_inc : float
+        Valor minimo de aumento del salario minimo permitido
+    max_inc : float
+        Valor maximo de aumento del salario minimo permitido
+    df : pd.DataFrame
+        DataFrame con los datos base
+    fun : funcion
+        Funcion que recibe un diccionario {variable objetivo: array (1 × candidatos)} y
+        devuelve el valor a maximizar de cada candidato, como en optimizacion_nacional
+    best_models : dict
+        Diccionario con los modelos de prediccion para cada variable objetivo
+    variables_importantes : dict
+        Diccionario con las variables importantes para cada variable objetivo
+    pasos : int
+        Numero de pasos que se realizan en la simulacion
+    top_k : int
+        Numero de candidatos que se comprueban con los modelos reales en cada paso
+    n_nodos : int
+        Numero de nodos de la aproximación lineal a trozos
+    radio : float
+        Cambio relativo máximo del estado antes de volver a ajustar el sustituto
+    atol : float o dict
+        Tolerancia absoluta del cambio, global o por columna (por ejemplo el rango de cada
+        variable en el panel de entrenamiento). Evita que las variables con valor de
+        referencia 0 fuercen un reajuste en cada paso
+
+    Returns
+    -------
+    pd.DataFrame
+        DataFrame con la evolucion de las variables en cada paso
+    pd.DataFrame
+        Resumen por paso con el incremento elegido, el valor del objetivo, si se reajustó el
+        sustituto y su error máximo en los candidatos comprobados
+    """
+    candidatos = np.linspace(min_inc, max_inc, n_puntos)
+    evolution = []
+    resumen = []
+    df_temp = df.copy()
+    sustituto = None
+    for step in range(pasos):
+        reajuste = (
+            sustituto is None
+            or deriva_sustituto(sustituto, df_temp, atol=atol) > radio
+        )
+        if reajuste:
+            sustituto = ajustar_sustituto(
+                df_temp, best_models, variables_importantes, min_inc, max_inc, n_nodos
+            )
+
+        # Cribado con el sustituto y comprobación de los mejores candidatos
+        aproximado = np.ravel(fun(evaluar_sustituto(sustituto, candidatos)))
+        mejores = candidatos[np.argsort(-aproximado)[:top_k]]
+        predicciones = model_prediction_batch(
+            mejores, df_temp, best_models, variables_importantes
+        )
+        valores = np.ravel(fun(predicciones))
+        best = int(np.argmax(valores))
+        best_inc = mejores[best]
+        error = max(
+            np.abs(evaluar_sustituto(sustituto, mejores)[t] - p).max()
+            for t, p in predicciones.items()
+        )
+        resumen.append(
+            {
+                "paso": step,
+                "INC_SMI_REAL": best_inc,
+                "objetivo": valores[best],
+                "reajuste": reajuste,
+                "error_sustituto": error,
+            }
+        )
+
+        # Apply the best increase
+        df_temp["INC_SMI_REAL"] = best_inc
+        evolution.append(df_temp.copy())
+        increases = {t: p[0, best] for t, p in predicciones.items()}
+        df_temp = increase_vars(increases, df_temp)
+    return pd.concat(evolution), pd.DataFrame(resumen)
@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
+
+# Instrumentación ligera del flujo de trabajo: tramos (spans) con su duración y el pico de
+# memoria del proceso, contadores (llamadas a predict, filas predichas, aciertos de caché) y
+# exportación a JSON o al formato de trazas de Chrome (chrome://tracing, Perfetto).
+#
+# Está desactivada por defecto; en ese caso los decoradores solo comprueban una variable
+# global y `tramo` devuelve un contexto vacío. Se activa con activar() o con la variable de
+# entorno IMPACTO_SMI_TELEMETRIA=1.
+
+_ACTIVA = os.environ.get("IMPACTO_SMI_TELEMETRIA", "") not in ("", "0")
+_bloqueo = threading.Lock()
+_local = threading.local()
+_tramos = []
+_contadores = {}
+_inicio = time.perf_counter_ns()
+_VACIO = contextlib.nullcontext()
+
+
+def activar():
+    """
+    Activa la recogida de tramos y contadores.
+    """
+    global _ACTIVA
+    _ACTIVA = True
+
+
+def desactivar():
+    global _ACTIVA
+    _ACTIVA = False
+
+
+def activa():
+    return _ACTIVA
+
+
+def reiniciar():
+    """
+    Elimina los tramos y contadores recogidos.
+    """
+    global _inicio
+    with _bloqueo:
+        _tramos.clear()
+        _contadores.clear()
+        _inicio = time.perf_counter_ns()
+
+
+def _rss_pico_mb():
+    # Pico de memoria residente del proceso (None si no está disponible, p. ej. en Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    return pico / 2**20 if sys.platform == "darwin" else pico / 2**10
+
+
+@contextlib.contextmanager
+def _tramo_activo(nombre, atributos):
+    pila = getattr(_local, "pila", None)
+    if pila is None:
+        pila = _local.pila = []
+    padre = pila[-1] if pila else None
+    pila.append(nombre)
+    rss_inicial = _rss_pico_mb()
+    inicio = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        fin = time.perf_counter_ns()
+        pila.pop()
+        rss_final = _rss_pico_mb()
+        registro = {
+            "nombre": nombre,
+            "padre": padre,
+            "inicio_us": (inicio - _inicio) / 1000,
+            "duracion_us": (fin - inicio) / 1000,
+            "pid": os.getpid(),
+            "hilo": threading.get_ident(),
+            "rss_pico_mb": rss_final,
+            "rss_incremento_mb": (
+                rss_final - rss_inicial if rss_final is not None else None
+            ),
+            "atributos": atributos,
+        }
+        with _bloqueo:
+            _tramos.append(registro)
+
+
+def tramo(nombre, **atributos):
+    """
+    Contexto que mide un tramo del flujo de trabajo:
+
+    with telemetria.tramo("imputacion", filas=len(df)):
+        ...
+    """
+    if not _ACTIVA:
+        return _VACIO
+    return _tramo_activo(nombre, atributos)
+
+
+def instrumentar(func=None, nombre=None):
+    """
+    Decorador que mide cada llamada a la función como un tramo con el nombre
+    modulo.funcion (o el indicado). Se puede usar como @instrumentar o @instrumentar(nombre=...).
+    """
+    if func is None:
+        return functools.partial(instrumentar, nombre=nombre)
+    nombre = nombre or f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def envoltura(*args, **kwargs):
+        if not _ACTIVA:
+            return func(*args, **kwargs)
+        with _tramo_activo(nombre, {}):
+            return func(*args, **kwargs)
+
+    return envoltura
+
+
+def contar(nombre, valor=1):
+    """
+    Suma `valor` al contador indicado (sin efecto si la telemetría está desactivada).
+    """
+    if not _ACTIVA:
+        return
+    with _bloqueo:
+        _contadores[nombre] = _contadores.get(nombre, 0) + valor
+
+
+def contadores():
+    with _bloqueo:
+        return dict(_contadores)
+
+
+def tasas_acierto():
+    """
+    Tasa de aciertos de cada caché a partir de los contadores <caché>.aciertos y
+    <caché>.fallos.
+    """
+    actuales = contadores()
+    tasas = {}
+    for clave, aciertos in actuales.items():
+        if not clave.endswith(".aciertos"):
+            continue
+        cache = clave[: -len(".aciertos")]
+        total = aciertos + actuales.get(f"{cache}.fallos", 0)
+        tasas[cache] = aciertos / total if total else None
+    return tasas
+
+
+class ModeloInstrumentado:
+    """
+    Envoltura de un modelo que cuenta las llamadas a predict y las filas predichas (contadores
+    predict.llamadas y predict.filas, y también por nombre). El resto de atributos se delegan
+    en el modelo.
+    """
+
+    def __init__(self, modelo, nombre=None):
+        self.modelo = modelo
+        self.nombre = nombre or type(modelo).__name__
+
+    def predict(self, X):
+        if _ACTIVA:
+            n = len(X)
+            contar("predict.llamadas")
+            contar("predict.filas", n)
+            contar(f"predict.{self.nombre}.llamadas")
+            contar(f"predict.{self.nombre}.filas", n)
+        return self.modelo.predict(X)
+
+    def __getattr__(self, atributo):
+        if atributo.startswith("__") or "modelo" not in self.__dict__:
+            raise AttributeError(atributo)
+        return getattr(self.__dict__["modelo"], atributo)
+
+
+def instrumentar_modelos(best_models):
+    """
+    Envuelve los modelos de best_models para contar sus predicciones por variable objetivo.
+    """
+    return {t: ModeloInstrumentado(m, t) for t, m in best_models.items()}
+
+
+def resumen():
+    """
+    Resumen de los tramos por nombre: número de llamadas, tiempo total, medio y máximo (ms) y
+    el mayor pico de memoria residente alcanzado.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    import pandas as pd
+
+    with _bloqueo:
+        tramos = pd.DataFrame(_tramos)
+    if tramos.empty:
+        return pd.DataFrame(
+            columns=["Tramo", "Llamadas", "Total (ms)", "Medio (ms)", "Máximo (ms)"]
+        )
+    tramos["ms"] = tramos["duracion_us"] / 1000
+    return (
+        tramos.groupby("nombre")
+        .agg(
+            Llamadas=("ms", "size"),
+            Total=("ms", "sum"),
+            Medio=("ms", "mean"),
+            Maximo=("ms", "max"),
+            RSS=("rss_pico_mb", "max"),
+        )
+        .sort_values("Total", ascending=False)
+        .reset_index()
+        .rename(
+            columns={
+                "nombre": "Tramo",
+                "Total": "Total (ms)",
+                "Medio": "Medio (ms)",
+                "Maximo": "Máximo (ms)",
+                "RSS": "RSS pico (MB)",
+            }
+        )
+    )
+
+
+def exportar_json(ruta):
+    """
+    Guarda los tramos, los contadores y las tasas de acierto de las cachés en un JSON.
+    """
+    with _bloqueo:
+        datos = {"tramos": list(_tramos), "contadores": dict(_contadores)}
+    datos["tasas_acierto"] = tasas_acierto()
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, indent=1, ensure_ascii=False, default=str)
+    return ruta
+
+
+def exportar_chrome(ruta):
+    """
+    Guarda los tramos en el formato de trazas de Chrome (eventos completos 'X') y los
+    contadores como eventos 'C', para abrirlos en chrome://tracing o Perfetto.
+    """
+    with _bloqueo:
+        tramos = list(_tramos)
+        actuales = dict(_contadores)
+    eventos = [
+        {
+            "name": t["nombre"],
+            "cat": t["nombre"].split(".")[0],
+            "ph": "X",
+            "ts": t["inicio_us"],
+            "dur": t["duracion_us"],
+            "pid": t["pid"],
+            "tid": t["hilo"],
+            "args": {
+                **{k: str(v) for k, v in t["atributos"].items()},
+                "rss_pico_mb": t["rss_pico_mb"],
+            },
+        }
+        for t in tramos
+    ]
+    fin = max((t["inicio_us"] + t["duracion_us"] for t in tramos), default=0)
+    eventos += [
+        {"name": nombre, "ph": "C", "ts": fin, "pid": os.getpid(), "args": {"valor": v}}
+        for nombre, v in actuales.items()
+    ]
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": eventos, "displayTimeUnit": "ms"}, f)
+    return ruta
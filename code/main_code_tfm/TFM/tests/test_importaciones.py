@@ -0,0 +1,36 @@
+import os
+import sys
+import json
+import subprocess
+
+FUNCIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions")
+
+# Dependencias pesadas que no deben cargarse al importar los módulos de simulación, formato y
+# registro (un proceso que solo simula o carga el registro no las necesita)
+PESADAS = ["sklearn", "scipy", "matplotlib", "seaborn", "statsmodels"]
+
+
+def _modulos_cargados(*modulos):
+    # Importa los módulos en un intérprete nuevo y devuelve los paquetes que quedan cargados
+    codigo = (
+        "import sys, json; sys.path.insert(0, sys.argv[1]); "
+        f"import {', '.join(modulos)}; "
+        "print(json.dumps(sorted({m.split('.')[0] for m in sys.modules})))"
+    )
+    salida = subprocess.run(
+        [sys.executable, "-c", codigo, FUNCIONES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(json.loads(salida.stdout.strip().splitlines()[-1]))
+
+
+def test_simulacion_formato_y_registro_no_cargan_dependencias_pesadas():
+    cargados = _modulos_cargados("simulacion", "data_format", "registro_modelos")
+    assert [m for m in PESADAS if m in cargados] == []
+
+
+def test_plots_no_carga_matplotlib_al_importarse():
+    cargados = _modulos_cargados("plots")
+    assert [m for m in PESADAS if m in cargados] == []
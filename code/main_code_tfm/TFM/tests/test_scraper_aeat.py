@@ -0,0 +1,123 @@
+import os
+import sys
+
+FUNCIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "functions")
+sys.path.insert(0, FUNCIONES)
+
+import pytest  # noqa: E402
+import scraper_aeat as sa  # noqa: E402
+
+IDS = {
+    2008: {"Total": "pagina_a", "0-0.5": "pagina_b"},
+    2009: {"Total": "pagina_c"},
+}
+VALORES = {"pagina_a": "1.234,5", "pagina_b": "2.000,0", "pagina_c": "3,25"}
+
+
+def _escribir_pagina(directorio, year, id_):
+    os.makedirs(os.path.join(directorio, str(year)), exist_ok=True)
+    html = (
+        "<html><body><table><tr><th>Comunidad</th><th>Valor</th></tr>"
+        f"<tr><td>Madrid</td><td>{VALORES[id_]}</td></tr></table></body></html>"
+    )
+    with open(os.path.join(directorio, str(year), f"{id_}.html"), "wb") as f:
+        f.write(html.encode(sa._CODIFICACION))
+
+
+@pytest.fixture
+def paginas(tmp_path):
+    directorio = str(tmp_path / "fixtures")
+    for year, smis in IDS.items():
+        for id_ in smis.values():
+            _escribir_pagina(directorio, year, id_)
+    return directorio
+
+
+def _descargar(url_base, ruta_cache):
+    return sa.descargar_aeat(
+        IDS, url_base=url_base, ruta_cache=ruta_cache, reintentos=0, espera=0
+    )
+
+
+def test_concatena_en_orden_de_ids(paginas, tmp_path):
+    with sa.servidor_fixture(paginas) as url_base:
+        tabla, resumen = _descargar(url_base, str(tmp_path / "cache"))
+
+    assert resumen["fallos"] == {}
+    assert list(zip(tabla["year"], tabla["smi"])) == [
+        (2008, "Total"),
+        (2008, "0-0.5"),
+        (2009, "Total"),
+    ]
+    assert tabla["Valor"].tolist() == [1234.5, 2000.0, 3.25]
+
+
+def test_reanuda_solo_las_paginas_que_faltan(paginas, tmp_path):
+    cache = str(tmp_path / "cache")
+    # Fallo inyectado: la página b no está disponible en la primera ejecución
+    os.remove(os.path.join(paginas, "2008", "pagina_b.html"))
+    peticiones = []
+    with sa.servidor_fixture(paginas, peticiones=peticiones) as url_base:
+        with pytest.warns(UserWarning):
+            tabla, resumen = _descargar(url_base, cache)
+        assert list(resumen["fallos"]) == [(2008, "0-0.5")]
+        assert len(tabla) == 2
+
+        _escribir_pagina(paginas, 2008, "pagina_b")
+        peticiones.clear()
+        tabla, resumen = _descargar(url_base, cache)
+
+    assert peticiones == ["/2008/pagina_b.html"]
+    assert resumen["fallos"] == {}
+    assert resumen["cache"] == 2 and resumen["descargadas"] == 1
+    assert len(tabla) == 3
+
+
+def test_reutiliza_las_paginas_de_la_cache(paginas, tmp_path):
+    cache = str(tmp_path / "cache")
+    peticiones = []
+    with sa.servidor_fixture(paginas, peticiones=peticiones) as url_base:
+        primera, _ = _descargar(url_base, cache)
+        assert len(peticiones) == 3
+        peticiones.clear()
+        segunda, resumen = _descargar(url_base, cache)
+
+    assert peticiones == []
+    assert resumen["cache"] == 3 and resumen["descargadas"] == 0
+    assert segunda.equals(primera)
+
+
+def test_vuelve_a_descargar_paginas_corruptas(paginas, tmp_path):
+    cache = str(tmp_path / "cache")
+    peticiones = []
+    with sa.servidor_fixture(paginas, peticiones=peticiones) as url_base:
+        _descargar(url_base, cache)
+        url = url_base.format(year=2009, id="pagina_c")
+        fichero = sa.CacheHTML(cache)._fichero(sa.CacheHTML(cache)._indice[url])
+        # Copia truncada en la caché
+        with open(fichero, "r+b") as f:
+            f.truncate(20)
+        peticiones.clear()
+        tabla, resumen = _descargar(url_base, cache)
+
+    assert peticiones == ["/2009/pagina_c.html"]
+    assert resumen["fallos"] == {}
+    assert tabla["Valor"].tolist() == [1234.5, 2000.0, 3.25]
+
+
+def test_descarta_paginas_de_la_cache_que_no_se_pueden_leer(paginas, tmp_path):
+    cache = str(tmp_path / "cache")
+    peticiones = []
+    with sa.servidor_fixture(paginas, peticiones=peticiones) as url_base:
+        # Página guardada íntegra (la huella coincide) pero sin ninguna tabla
+        url = url_base.format(year=2009, id="pagina_c")
+        sa.CacheHTML(cache).guardar(url, b"<html><body>sin tabla</body></html>")
+        tabla, resumen = _descargar(url_base, cache)
+
+    assert sorted(peticiones) == [
+        "/2008/pagina_a.html",
+        "/2008/pagina_b.html",
+        "/2009/pagina_c.html",
+    ]
+    assert resumen["fallos"] == {}
+    assert tabla["Valor"].tolist() == [1234.5, 2000.0, 3.25]
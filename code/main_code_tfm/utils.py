@@ -1,30 +1,56 @@
 # Here we allocate all the necessary functions to run the main code
+#
+# The dependencies are loaded lazily: importing this module is immediate and each one is
+# imported the first time it is accessed (u.sns, u.PCA, from utils import KNNImputer, ...).
 
-import pandas as pd
-import sklearn as sk
-import numpy as np
-import math
-import statsmodels.api as sm
+import importlib
 import warnings
 from pandas.errors import SettingWithCopyWarning
 
 warnings.simplefilter(action="ignore", category=SettingWithCopyWarning)
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.dates import AutoDateLocator
-import matplotlib.dates as mdates
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import (
-    RandomForestRegressor,
-    RandomForestClassifier,
-    GradientBoostingRegressor,
-)
-from sklearn.inspection import permutation_importance
-from sklearn.model_selection import cross_val_score
-from sklearn.linear_model import LinearRegression, Lasso, LassoCV
-from sklearn.model_selection import KFold, GridSearchCV
-from sklearn.tree import DecisionTreeRegressor
-from sklearn.svm import SVR
-from sklearn.inspection import permutation_importance
-from sklearn.impute import KNNImputer
+
+# name -> (module, attribute or None for the module itself)
+_LAZY = {
+    "pd": ("pandas", None),
+    "sk": ("sklearn", None),
+    "np": ("numpy", None),
+    "math": ("math", None),
+    "sm": ("statsmodels.api", None),
+    "sns": ("seaborn", None),
+    "plt": ("matplotlib.pyplot", None),
+    "AutoDateLocator": ("matplotlib.dates", "AutoDateLocator"),
+    "mdates": ("matplotlib.dates", None),
+    "PCA": ("sklearn.decomposition", "PCA"),
+    "StandardScaler": ("sklearn.preprocessing", "StandardScaler"),
+    "RandomForestRegressor": ("sklearn.ensemble", "RandomForestRegressor"),
+    "RandomForestClassifier": ("sklearn.ensemble", "RandomForestClassifier"),
+    "GradientBoostingRegressor": ("sklearn.ensemble", "GradientBoostingRegressor"),
+    "permutation_importance": ("sklearn.inspection", "permutation_importance"),
+    "cross_val_score": ("sklearn.model_selection", "cross_val_score"),
+    "LinearRegression": ("sklearn.linear_model", "LinearRegression"),
+    "Lasso": ("sklearn.linear_model", "Lasso"),
+    "LassoCV": ("sklearn.linear_model", "LassoCV"),
+    "KFold": ("sklearn.model_selection", "KFold"),
+    "GridSearchCV": ("sklearn.model_selection", "GridSearchCV"),
+    "DecisionTreeRegressor": ("sklearn.tree", "DecisionTreeRegressor"),
+    "SVR": ("sklearn.svm", "SVR"),
+    "KNNImputer": ("sklearn.impute", "KNNImputer"),
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module, attribute = _LAZY[name]
+    value = importlib.import_module(module)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    # Cache it so later accesses do not go through __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))